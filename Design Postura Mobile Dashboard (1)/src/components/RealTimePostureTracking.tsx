@@ -20,7 +20,7 @@ export function RealTimePostureTracking() {
 
   // Connect to WebSocket for real-time updates
   useEffect(() => {
-    const ws = new WebSocket('ws://localhost:8000/ws');
+    const ws = new WebSocket('ws://localhost:8000/ws?fields=score,status&max_rate=10');
     
     ws.onopen = () => {
       console.log('Connected to posture tracking WebSocket');
@@ -29,26 +29,11 @@ export function RealTimePostureTracking() {
     ws.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
-        const az = data.az || 0;
-        
-        // Convert az value (expected in range 60-128) to percentage (0-100)
-        // Mapping: 60 -> 100% (very straight), 128 -> 0% (fully slouched).
-        // Clamp out-of-range values to [0,100].
-        const percentage = (() => {
-          const raw = Number(isNaN(Number(az)) ? 0 : az);
-          if (raw <= 18) return 100;
-          if (raw >= 128) return 0;
-          return Math.round(((128 - raw) / (128 - 18)) * 100);
-        })();
-        let status: PostureStatus;
-        
-        if (percentage >= 75) {
-          status = "excellent";
-        } else if (percentage >= 50) {
-          status = "warning";
-        } else {
-          status = "poor";
-        }
+        // The server derives the score and status once per sample
+        // (see detectors.posture_score), so we only display them here.
+        const percentage = Number(data.score) || 0;
+        const status: PostureStatus =
+          data.status === "excellent" || data.status === "warning" ? data.status : "poor";
 
         setPostureData({
           percentage,
@@ -0,0 +1,180 @@
+"""Slouch alert engine.
+
+Turns the per-sample slouching state from the detectors into alert events:
+
+- an alert fires once the wearer has been slouching for `sustain_s` seconds
+  (derived from `sensitivity` unless set explicitly);
+- straightening up only re-arms the engine after `debounce_s` seconds of good
+  posture, so brief corrections don't restart the timer;
+- alerts are at least `cooldown_s` apart, repeating while the slouch lasts.
+
+Alerts are fanned out to asyncio.Queue listeners (the /ws/alerts channel),
+kept in a short history, and may trigger a vibration command written back to
+the device. Every alert records the latency from the arrival of the sample
+that triggered it to the moment it was published.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List
+
+# Writable characteristic for vibration commands. The stock firmware has none,
+# so vibration feedback stays off unless this is configured.
+VIBRATE_CHAR_UUID = os.environ.get("BLE_VIBRATE_CHAR") or None
+
+
+@dataclass
+class AlertConfig:
+    enabled: bool = True
+    sensitivity: int = 60            # 0-100; higher alerts sooner
+    sustain_s: float | None = None   # explicit override of the sensitivity mapping
+    debounce_s: float = 3.0
+    cooldown_s: float = 60.0
+    vibrate: bool = True
+    vibration_strength: int = 60     # 0-100, sent to the device as one byte
+
+    def effective_sustain(self) -> float:
+        if self.sustain_s is not None:
+            return max(0.0, self.sustain_s)
+        # 100 -> 2 s, 0 -> 30 s
+        return 2.0 + (100 - max(0, min(100, self.sensitivity))) * 0.28
+
+
+class AlertEngine:
+    def __init__(self, config: AlertConfig | None = None) -> None:
+        self.config = config or AlertConfig()
+        self.reset()
+
+    def reset(self) -> None:
+        self._slouch_since: float | None = None
+        self._straight_since: float | None = None
+        self._last_alert: float | None = None
+
+    def feed(self, now: float, slouching: bool) -> dict | None:
+        """Advance the state machine by one sample; return an alert or None."""
+        cfg = self.config
+        if slouching:
+            self._straight_since = None
+            if self._slouch_since is None:
+                self._slouch_since = now
+        elif self._slouch_since is not None:
+            if self._straight_since is None:
+                self._straight_since = now
+            if now - self._straight_since >= cfg.debounce_s:
+                self._slouch_since = None
+                self._straight_since = None
+            return None
+        else:
+            return None
+
+        if not cfg.enabled:
+            return None
+        held = now - self._slouch_since
+        if held < cfg.effective_sustain():
+            return None
+        if self._last_alert is not None and now - self._last_alert < cfg.cooldown_s:
+            return None
+        self._last_alert = now
+        return {"type": "slouch", "t": now, "held_s": round(held, 3)}
+
+
+engine = AlertEngine()
+
+# Recent alerts (newest last) and end-to-end latency samples in milliseconds.
+recent: deque = deque(maxlen=100)
+_latencies_ms: deque = deque(maxlen=1000)
+
+# Listeners for the /ws/alerts channel, same contract as ble_service listeners.
+_listeners: list[asyncio.Queue] = []
+
+
+async def register_listener(maxsize: int = 100) -> asyncio.Queue:
+    q: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+    _listeners.append(q)
+    return q
+
+
+async def unregister_listener(q: asyncio.Queue) -> None:
+    try:
+        _listeners.remove(q)
+    except ValueError:
+        pass
+
+
+def publish(alert: dict) -> None:
+    """Record `alert` and fan it out to listeners (non-blocking)."""
+    recent.append(alert)
+    for q in list(_listeners):
+        try:
+            q.put_nowait(alert)
+        except asyncio.QueueFull:
+            pass
+
+
+def check(now: float, slouching: bool, received_ns: int, client: Any = None) -> dict | None:
+    """Feed one sample into the engine; publish and return an alert if one fires.
+
+    `received_ns` is the perf_counter_ns() stamp taken when the triggering
+    sample arrived. `client` is the connected BleakClient (or a fake) used for
+    vibration feedback.
+    """
+    alert = engine.feed(now, slouching)
+    if alert is None:
+        return None
+    cfg = engine.config
+    if cfg.vibrate and client is not None and VIBRATE_CHAR_UUID:
+        _vibrate(client, cfg.vibration_strength)
+        alert["vibrated"] = True
+    alert["latency_ms"] = round((time.perf_counter_ns() - received_ns) / 1e6, 3)
+    _latencies_ms.append(alert["latency_ms"])
+    publish(alert)
+    return alert
+
+
+def _vibrate(client: Any, strength: int) -> None:
+    """Fire-and-forget vibration write; never blocks the ingest callback."""
+    payload = bytes([max(0, min(100, int(strength)))])
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(client.write_gatt_char(VIBRATE_CHAR_UUID, payload, response=False))
+    task.add_done_callback(_log_write_error)
+
+
+def _log_write_error(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print("Vibration write failed:", task.exception())
+
+
+def update_config(**changes: Any) -> AlertConfig:
+    """Apply config changes (unknown keys raise KeyError)."""
+    cfg = engine.config
+    for key, value in changes.items():
+        if not hasattr(cfg, key):
+            raise KeyError(key)
+        setattr(cfg, key, value)
+    return cfg
+
+
+def config_dict() -> Dict[str, Any]:
+    out = asdict(engine.config)
+    out["effective_sustain_s"] = engine.config.effective_sustain()
+    return out
+
+
+def latency_stats() -> Dict[str, Any]:
+    """p50/p99/max of sample-to-alert latency over the recent window."""
+    data: List[float] = sorted(_latencies_ms)
+    if not data:
+        return {"count": 0}
+
+    def pct(p: float) -> float:
+        return data[min(len(data) - 1, int(p / 100.0 * len(data)))]
+
+    return {"count": len(data), "p50_ms": pct(50), "p99_ms": pct(99), "max_ms": data[-1]}
@@ -11,6 +11,16 @@ Usage:
   python api_client.py            # try ws, fallback to polling
   python api_client.py --poll     # force HTTP polling
   python api_client.py --ws      # force WebSocket
+  python api_client.py --ws --binary          # binary /ws subprotocol
+  python api_client.py --record session.rec   # record every sample to a file
+
+Recording mode subscribes to `/ws` (binary subprotocol when the server
+offers it) and appends each sample to a binary file of fixed 16-byte
+records (see `Recorder`), written through a large buffer.
+Samples the stream missed, either while reconnecting or because the server
+dropped them for a slow client, are fetched afterwards from `/db/samples`
+by their `t` range and appended with the BACKFILLED flag. A summary line
+reports live, backfilled and estimated lost samples.
 
 This script is intentionally small and dependency-light. It attempts to do
 the right thing with minimal setup.
@@ -21,13 +31,40 @@ from __future__ import annotations
 import argparse
 import asyncio
 import json
+import struct
 import time
 import sys
+import urllib.parse
+import urllib.request
 
 
 DEFAULT_HTTP = "http://localhost:8000/data/latest"
 DEFAULT_WS = "ws://localhost:8000/ws"
 
+# Binary /ws subprotocol (see server.WS_BINARY_PROTOCOL): frames of 16-byte
+# records laid out like Recorder.RECORD, and {"start_ts": ...} text frames
+# giving the epoch time of the records' t = 0.
+BINARY_PROTOCOL = "posture.bin.v1"
+_AXES = ("ax", "ay", "az", "gx", "gy", "gz")
+
+
+def decode_frame(data: bytes) -> list:
+    """Decode one binary /ws frame into sample dicts."""
+    out = []
+    for t, ax, ay, az, gx, gy, gz, score, _flags in struct.iter_unpack("<d6bBB", data):
+        out.append({"t": t, "ax": ax, "ay": ay, "az": az, "gx": gx, "gy": gy, "gz": gz,
+                    "score": None if score == 255 else score})
+    return out
+
+
+def _messages(msg) -> list:
+    """Samples carried by one /ws message, whichever format it is in."""
+    if isinstance(msg, bytes):
+        return decode_frame(msg)
+    sample = json.loads(msg)
+    # a binary stream's session announcement carries no sample
+    return [sample] if "t" in sample else []
+
 
 def print_sample(sample: dict) -> None:
     # compact one-line output with timestamp
@@ -42,7 +79,7 @@ def print_sample(sample: dict) -> None:
     print(f"{ts}  ax={ax:3} ay={ay:3} az={az:3} | gx={gx:3} gy={gy:3} gz={gz:3}")
 
 
-async def ws_client(uri: str) -> None:
+async def ws_client(uri: str, binary: bool = False) -> None:
     try:
         import websockets
     except Exception:
@@ -51,18 +88,243 @@ async def ws_client(uri: str) -> None:
 
     print(f"Connecting WebSocket {uri}...")
     try:
-        async with websockets.connect(uri) as ws:
+        async with websockets.connect(uri, subprotocols=[BINARY_PROTOCOL] if binary else None) as ws:
             async for msg in ws:
                 try:
-                    sample = json.loads(msg)
+                    samples = _messages(msg)
                 except Exception:
-                    print("received non-json message:", msg)
+                    print("received undecodable message:", msg[:80])
                     continue
-                print_sample(sample)
+                for sample in samples:
+                    print_sample(sample)
     except Exception as exc:
         print("WebSocket error:", exc)
 
 
+class Recorder:
+    """Append-only recording file.
+
+    Layout: an 8-byte magic, then RECORD-sized records (little-endian):
+    t float64, ax ay az gx gy gz int8, score uint8 (255 = unknown), flags.
+    Load it with `load_recording()` or numpy directly:
+
+        np.fromfile(path, dtype=RECORD_DTYPE, offset=8)
+
+    Backfilled records are appended when they are fetched, so they follow
+    later live samples in the file; sort by t (within a server session) to
+    get sample order.
+    """
+
+    MAGIC = b"POSREC01"
+    RECORD = struct.Struct("<d6bBB")
+    BACKFILLED = 0x01
+
+    def __init__(self, path: str, buffer_size: int = 1 << 20) -> None:
+        self.path = path
+        self._f = open(path, "ab", buffering=buffer_size)
+        if self._f.tell() == 0:
+            self._f.write(self.MAGIC)
+        self.live = 0
+        self.backfilled = 0
+
+    def write_frame(self, data: bytes) -> None:
+        """Append a binary /ws frame as-is (its records use this layout)."""
+        self._f.write(data)
+        self.live += len(data) // self.RECORD.size
+
+    def write(self, sample: dict, flags: int = 0) -> None:
+        score = sample.get("score")
+        self._f.write(self.RECORD.pack(
+            float(sample["t"]),
+            *(max(-128, min(127, int(sample.get(k) or 0))) for k in ("ax", "ay", "az", "gx", "gy", "gz")),
+            255 if score is None else max(0, min(100, int(score))),
+            flags,
+        ))
+        if flags & self.BACKFILLED:
+            self.backfilled += 1
+        else:
+            self.live += 1
+
+    def flush(self) -> None:
+        self._f.flush()
+
+    def close(self) -> None:
+        self._f.close()
+
+
+RECORD_DTYPE = [("t", "<f8"), ("ax", "i1"), ("ay", "i1"), ("az", "i1"),
+                ("gx", "i1"), ("gy", "i1"), ("gz", "i1"), ("score", "u1"), ("flags", "u1")]
+
+
+def load_recording(path: str):
+    """Read a recording into a numpy structured array (one field per column)."""
+    import numpy as np
+
+    with open(path, "rb") as f:
+        if f.read(len(Recorder.MAGIC)) != Recorder.MAGIC:
+            raise ValueError(f"{path} is not a recording")
+    return np.fromfile(path, dtype=RECORD_DTYPE, offset=len(Recorder.MAGIC))
+
+
+def _http_base(ws_uri: str) -> str:
+    parts = urllib.parse.urlsplit(ws_uri)
+    scheme = "https" if parts.scheme == "wss" else "http"
+    return f"{scheme}://{parts.netloc}"
+
+
+def _fetch_range(http_base: str, lo: float, hi: float, page: int = 5000) -> list:
+    """Samples strictly between epoch times lo and hi from /db/samples
+    (blocking; run in a thread)."""
+    out: list = []
+    offset = 0
+    # lo and hi are live samples' times; a binary stream's start_ts + t can be
+    # a microsecond off what was stored, so keep clear of the bounds themselves
+    lo_us, hi_us = int(lo * 1e6) + 1000, int(hi * 1e6) - 1000
+    while True:
+        query = urllib.parse.urlencode({"start_ts": lo, "end_ts": hi, "limit": page, "offset": offset})
+        with urllib.request.urlopen(f"{http_base}/db/samples?{query}", timeout=10) as r:
+            rows = json.loads(r.read())["samples"]
+        out.extend(row for row in rows if lo_us < row["ts_us"] < hi_us)
+        if len(rows) < page:
+            return out
+        offset += page
+
+
+class _Gaps:
+    """Finds holes in the live stream and fills them from the DB.
+
+    Works on samples' epoch times (`ts`), which unlike `t` don't start over
+    when the server restarts.
+    """
+
+    # A jump in ts of more than GAP_FACTOR typical intervals is a hole.
+    GAP_FACTOR = 3.0
+    # Give the server time to persist a hole's samples before fetching them.
+    DELAY_S = 1.5
+
+    def __init__(self, recorder: Recorder, http_base: str) -> None:
+        self.recorder = recorder
+        self.http_base = http_base
+        self.interval: float | None = None  # running estimate of the sample spacing
+        self.last_ts: float | None = None
+        self.lost = 0
+        self.holes = 0
+        self._tasks: set[asyncio.Task] = set()
+
+    def live(self, ts: float) -> None:
+        last = self.last_ts
+        if last is not None and ts > last:
+            dt = ts - last
+            if self.interval is not None and dt > self.GAP_FACTOR * self.interval:
+                self.fill(last, ts)
+            else:
+                self.interval = dt if self.interval is None else 0.95 * self.interval + 0.05 * dt
+        self.last_ts = ts
+
+    def reconnected(self, first_ts: float) -> None:
+        """The stream resumed at `first_ts` after a disconnect.
+
+        Everything stored in between is missing, whether the server kept
+        running or restarted (then the old session's tail and the new one's
+        head both fall in the hole).
+        """
+        last = self.last_ts
+        if last is None:
+            return
+        if first_ts > last:
+            self.fill(last, first_ts)
+        self.last_ts = None
+
+    def fill(self, lo: float, hi: float) -> None:
+        self.holes += 1
+        task = asyncio.get_running_loop().create_task(self._fill(lo, hi))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _fill(self, lo: float, hi: float) -> None:
+        await asyncio.sleep(self.DELAY_S)
+        expected = max(0, round((hi - lo) / self.interval) - 1) if self.interval else 0
+        try:
+            rows = await asyncio.to_thread(_fetch_range, self.http_base, lo, hi)
+        except Exception as exc:
+            print(f"backfill of ({time.ctime(lo)}, {time.ctime(hi)}) failed: {exc}")
+            rows = []
+        for row in rows:
+            self.recorder.write(row, Recorder.BACKFILLED)
+        self.lost += max(0, expected - len(rows))
+
+    async def drain(self) -> None:
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+def _report(recorder: Recorder, gaps: _Gaps) -> None:
+    print(f"recorded {recorder.live} live + {recorder.backfilled} backfilled samples, "
+          f"{gaps.holes} holes, ~{gaps.lost} lost -> {recorder.path}")
+
+
+async def record(uri: str, path: str, report_every: float = 10.0) -> None:
+    """Record the /ws stream to `path` until interrupted, filling holes."""
+    try:
+        import websockets
+    except Exception:
+        print("'websockets' package not installed; cannot record.")
+        return
+
+    recorder = Recorder(path)
+    gaps = _Gaps(recorder, _http_base(uri))
+    loop = asyncio.get_running_loop()
+    next_flush = next_report = loop.time()
+    backoff = 0.5
+    try:
+        while True:
+            try:
+                async with websockets.connect(uri, max_queue=None, subprotocols=[BINARY_PROTOCOL]) as ws:
+                    print(f"Recording {uri} -> {path} ({'binary' if ws.subprotocol else 'json'})")
+                    backoff = 0.5
+                    first = True
+                    start_ts = None  # binary: epoch time of the records' t = 0
+                    async for msg in ws:
+                        if isinstance(msg, bytes):
+                            # binary frames are stored verbatim; only t is decoded
+                            recorder.write_frame(msg)
+                            if start_ts is None:
+                                continue
+                            times = [start_ts + r[0] for r in struct.iter_unpack("<d8x", msg)]
+                        else:
+                            sample = json.loads(msg)
+                            if isinstance(sample.get("start_ts"), (int, float)):
+                                start_ts = sample["start_ts"]
+                                continue
+                            if not isinstance(sample.get("t"), (int, float)):
+                                continue
+                            recorder.write(sample)
+                            if not isinstance(sample.get("ts"), (int, float)):
+                                continue
+                            times = [sample["ts"]]
+                        for ts in times:
+                            if first:
+                                gaps.reconnected(ts)
+                                first = False
+                            gaps.live(ts)
+                        now = loop.time()
+                        if now >= next_flush:
+                            recorder.flush()
+                            next_flush = now + 1.0
+                        if now >= next_report:
+                            _report(recorder, gaps)
+                            next_report = now + report_every
+            except (OSError, ValueError, websockets.WebSocketException) as exc:
+                print(f"WebSocket error ({exc}); reconnecting in {backoff:.1f}s")
+            recorder.flush()
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, 10.0)
+    finally:
+        await gaps.drain()
+        recorder.close()
+        _report(recorder, gaps)
+
+
 def poll_http(url: str, interval: float = 1.0) -> None:
     try:
         import requests
@@ -93,8 +355,18 @@ def main() -> None:
     p.add_argument("--ws", action="store_true", help="force WebSocket mode")
     p.add_argument("--poll", action="store_true", help="force HTTP polling mode")
     p.add_argument("--url", default=None, help="custom URL for HTTP polling or WS (prefix ws:// for WS)")
+    p.add_argument("--record", metavar="PATH", default=None, help="record the /ws stream to a binary file")
+    p.add_argument("--binary", action="store_true", help="ask /ws for the binary subprotocol")
     args = p.parse_args()
 
+    if args.record:
+        uri = args.url if args.url and args.url.startswith(("ws://", "wss://")) else DEFAULT_WS
+        try:
+            asyncio.run(record(uri, args.record))
+        except KeyboardInterrupt:
+            pass
+        return
+
     if args.url:
         if args.url.startswith("ws://") or args.url.startswith("wss://"):
             uri = args.url
@@ -114,7 +386,7 @@ def main() -> None:
 
     if mode == "ws":
         ws_uri = uri or DEFAULT_WS
-        asyncio.run(ws_client(ws_uri))
+        asyncio.run(ws_client(ws_uri, args.binary))
         return
 
     if mode == "poll":
@@ -125,7 +397,7 @@ def main() -> None:
     # Auto mode: prefer WebSocket if websockets installed
     try:
         import websockets  # type: ignore
-        asyncio.run(ws_client(DEFAULT_WS))
+        asyncio.run(ws_client(DEFAULT_WS, args.binary))
         return
     except Exception:
         # fall back to requests polling
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""Columnar archive of closed days of samples.
+
+Each finished day partition (see `ble_service`) is written out as one NumPy
+`.npy` file per column under `BLE_ARCHIVE_DIR` (default ./archive):
+
+    archive/2025-10-25/
+        meta.json   {"day": ..., "count": ..., "columns": {...}}
+        id.npy t.npy ax.npy ay.npy az.npy gx.npy gy.npy gz.npy pitch.npy created_at.npy ts_us.npy
+
+Axes are stored as int8 (the device only sends 8 bits), `created_at` as epoch
+seconds, `ts_us` as epoch microseconds (0 where unknown; days archived before
+the column existed load it as zeros). Analytics code opens days with `load_day()` / `load_range()`, which
+memory-map the files, so months of history can be scanned without touching
+the live SQLite DB or copying into Python lists.
+
+A closed day that gains rows afterwards (a bulk upload from the device) is
+archived again on the next run; once its partition is dropped, uploads for
+that day are refused.
+
+Usage:
+  python archive.py            # archive every closed day not archived yet (or changed since)
+  python archive.py --drop     # ... and drop the archived DB partitions
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+from typing import Dict, List
+
+import numpy as np
+
+
+ARCHIVE_DIR = os.environ.get("BLE_ARCHIVE_DIR", "archive")
+
+COLUMNS: Dict[str, str] = {
+    "id": "int64",
+    "t": "float64",
+    "ax": "int8",
+    "ay": "int8",
+    "az": "int8",
+    "gx": "int8",
+    "gy": "int8",
+    "gz": "int8",
+    "pitch": "float32",
+    "created_at": "int64",
+    "ts_us": "int64",
+}
+
+
+def day_dir(day: str) -> str:
+    return os.path.join(ARCHIVE_DIR, day)
+
+
+def is_archived(day: str) -> bool:
+    return os.path.exists(os.path.join(day_dir(day), "meta.json"))
+
+
+def archived_days() -> List[str]:
+    """Return archived days, oldest first."""
+    if not os.path.isdir(ARCHIVE_DIR):
+        return []
+    return sorted(d for d in os.listdir(ARCHIVE_DIR) if is_archived(d))
+
+
+def archive_day(db_path: str, day: str) -> int:
+    """Write one day partition to the archive. Returns number of rows written.
+
+    Files are written into a temporary directory which is renamed into place
+    once complete, so readers never see a half-written day.
+    """
+    import ble_service
+
+    table = ble_service._partition_table(day)
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(
+            f"SELECT id, t, ax, ay, az, gx, gy, gz, COALESCE(pitch, 'NaN'), "
+            f"COALESCE(CAST(strftime('%s', created_at) AS INTEGER), 0), COALESCE(ts_us, 0) FROM {table} ORDER BY id ASC"
+        ).fetchall()
+    finally:
+        conn.close()
+
+    data = np.array(rows, dtype=np.float64).reshape(-1, len(COLUMNS))
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp = day_dir(day) + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for i, (name, dtype) in enumerate(COLUMNS.items()):
+        col = data[:, i]
+        if dtype == "int8":
+            col = np.clip(col, -128, 127)
+        np.save(os.path.join(tmp, f"{name}.npy"), col.astype(dtype))
+    meta = {
+        "day": day,
+        "count": int(data.shape[0]),
+        "min_id": int(data[0, 0]) if data.size else None,
+        "max_id": int(data[-1, 0]) if data.size else None,
+        "columns": COLUMNS,
+        "archived_at": int(time.time()),
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    shutil.rmtree(day_dir(day), ignore_errors=True)
+    os.replace(tmp, day_dir(day))
+    return meta["count"]
+
+
+def _is_current(conn: sqlite3.Connection, day: str) -> bool:
+    """Does the archive of `day` hold what its partition holds now?
+
+    Bulk uploads can add rows to a closed day after it was archived; they
+    change the row count and the highest id.
+    """
+    import ble_service
+
+    if not is_archived(day):
+        return False
+    count, max_id = conn.execute(f"SELECT COUNT(*), MAX(id) FROM {ble_service._partition_table(day)}").fetchone()
+    with open(os.path.join(day_dir(day), "meta.json")) as f:
+        meta = json.load(f)
+    return meta["count"] == count and meta.get("max_id") == max_id
+
+
+def archive_closed_days(db_path: str | None = None, drop: bool = False) -> List[str]:
+    """Archive every day partition before today whose archive is missing or
+    out of date (the day gained rows from a bulk upload since).
+
+    With `drop=True` the archived partitions are dropped from the DB afterwards.
+    """
+    import ble_service
+
+    db_path = db_path or ble_service.DB_PATH
+    ble_service.DB_PATH = db_path
+    conn = ble_service._open_db()
+    today = time.strftime("%Y-%m-%d")
+    done = []
+    for day in list(ble_service._partitions):
+        if day >= today:
+            continue
+        if not _is_current(conn, day):
+            again = is_archived(day)
+            n = archive_day(db_path, day)
+            print(f"{'Re-archived' if again else 'Archived'} {day}: {n} samples")
+        done.append(day)
+        if drop:
+            with ble_service._db_lock:
+                # hold the write lock from the check to the drop, so an upload
+                # in another process can't slip rows in between
+                conn.execute("BEGIN IMMEDIATE")
+                if _is_current(conn, day):
+                    ble_service._drop_partition(conn, day)
+                    conn.commit()
+                else:
+                    conn.rollback()
+                    print(f"Kept {day} in the DB: it changed while being archived")
+    return done
+
+
+def load_day(day: str, columns: List[str] | None = None) -> Dict[str, np.ndarray]:
+    """Memory-map an archived day. Raises FileNotFoundError if not archived."""
+    if not is_archived(day):
+        raise FileNotFoundError(day)
+    names = columns or list(COLUMNS)
+    out = {}
+    for c in names:
+        path = os.path.join(day_dir(day), f"{c}.npy")
+        if not os.path.exists(path) and c in COLUMNS:
+            # archived before this column existed
+            with open(os.path.join(day_dir(day), "meta.json")) as f:
+                out[c] = np.zeros(json.load(f)["count"], dtype=COLUMNS[c])
+            continue
+        out[c] = np.load(path, mmap_mode="r")
+    return out
+
+
+def load_range(start: str, end: str, columns: List[str] | None = None) -> Dict[str, np.ndarray]:
+    """Concatenate archived days start..end (inclusive, 'YYYY-MM-DD').
+
+    Each day is memory-mapped; only the concatenation allocates. Use
+    `load_day` directly to stream day by day without any copy.
+    """
+    days = [d for d in archived_days() if start <= d <= end]
+    names = columns or list(COLUMNS)
+    parts = [load_day(d, names) for d in days]
+    return {c: np.concatenate([p[c] for p in parts]) if parts else np.empty(0, dtype=COLUMNS[c]) for c in names}
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", default=os.environ.get("BLE_DB_PATH", "ble_data.db"))
+    p.add_argument("--drop", action="store_true", help="drop DB partitions once archived")
+    args = p.parse_args()
+    if not os.path.exists(args.db):
+        print(f"DB not found: {args.db}")
+        return
+    days = archive_closed_days(args.db, drop=args.drop)
+    print(f"{len(days)} closed days in {ARCHIVE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""Throughput of bulk uploads (POST /ingest/bulk) for each storage engine.
+
+Simulates a necklace that spent --hours away from the gateway, buffering at
+--rate Hz, and then uploads its buffer in bodies of --batch samples. Each
+body repeats the last --overlap of the previous one (the device resends
+what it never saw acknowledged), and the first --live of the period was
+also stored live before the link dropped, so both kinds of dedupe are hit.
+Every engine in ble_service.ENGINES runs in its own process with a
+throwaway DB, through the real endpoint (FastAPI's TestClient, no network).
+
+Reported per engine:
+- decode samples/s: packets.decode_bulk alone;
+- upload samples/s: bodies received per second, end to end (decode,
+  dedupe, recount, one append per body);
+- stored/s: newly stored samples per second;
+- reupload samples/s: the whole buffer sent again, all duplicates;
+- check: every sample stored exactly once, and the recounted hours' slouch
+  and straight ticks add up to the samples stored in them.
+
+Usage:
+  python bench_bulk.py
+  python bench_bulk.py --engines sqlite --hours 8 --batch 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict
+
+import numpy as np
+
+
+def _buffer(args: argparse.Namespace) -> tuple[int, np.ndarray, np.ndarray]:
+    """(t0_us, ticks in ms, (N, 6) samples) of the device's offline buffer."""
+    n = int(args.hours * 3600 * args.rate)
+    # ended an hour ago, so the live path's "today" isn't involved
+    t0_us = int((time.time() - 3600 - args.hours * 3600) * 1e6)
+    ticks = (np.arange(n) * (1000.0 / args.rate)).astype(np.uint32)
+    rng = np.random.default_rng(0)
+    # slow posture drift with some slouched stretches, plus sensor noise
+    az = 55 + 25 * np.sin(np.arange(n) / (args.rate * 240.0)) + rng.normal(0, 4, n)
+    vals = np.column_stack([rng.integers(-30, 30, n), rng.integers(-30, 30, n), az,
+                            rng.integers(-8, 8, (n, 3))]).clip(-128, 127).astype(np.int16)
+    return t0_us, ticks, vals
+
+
+def run_engine(args: argparse.Namespace) -> None:
+    """Child process: upload the buffer through the endpoint, print one JSON line."""
+    from fastapi.testclient import TestClient
+
+    import ble_service
+    import packets
+    import server
+    import storage
+
+    client = TestClient(server.app)
+    t0_us, ticks, vals = _buffer(args)
+    n = len(ticks)
+    ts_us = t0_us + ticks.astype(np.int64) * 1000
+    out: Dict[str, str] = {}
+
+    # what the live path stored before the link dropped
+    live = int(n * args.live)
+    if live:
+        step = ble_service.SPOOL_BATCH
+        for a in range(0, live, step):
+            b = min(live, a + step)
+            rows = list(zip(ts_us[a:b].tolist(), (np.arange(a, b) / args.rate).tolist(), *vals[a:b].T.tolist()))
+            counts: storage.Counts = {}
+            for ts in ts_us[a:b].tolist():
+                lt = time.localtime(ts / 1e6)
+                c = counts.setdefault((time.strftime("%Y-%m-%d", lt), lt.tm_hour), {"straight_time": 0})
+                c["straight_time"] += 1
+            ble_service.store.append(rows, counts)
+
+    bodies = []
+    step = max(1, int(args.batch * (1 - args.overlap)))
+    for a in range(0, n, step):
+        b = min(n, a + args.batch)
+        bodies.append(packets.encode_bulk(t0_us, 1000, ticks[a:b], vals[a:b]))
+        if b == n:
+            break
+    sent = sum((len(body) - packets.BULK_HEADER.size) // packets.BULK_SAMPLE_SIZE for body in bodies)
+
+    start = time.perf_counter()
+    for body in bodies:
+        packets.decode_bulk(body)
+    out["decode samples/s"] = f"{sent / (time.perf_counter() - start):,.0f}"
+
+    stored = duplicates = 0
+    start = time.perf_counter()
+    for body in bodies:
+        r = client.post("/ingest/bulk", content=body, headers={"content-type": "application/octet-stream"})
+        r.raise_for_status()
+        stored += r.json()["stored"]
+        duplicates += r.json()["duplicates"]
+    elapsed = time.perf_counter() - start
+    out["bodies"] = str(len(bodies))
+    out["upload samples/s"] = f"{sent / elapsed:,.0f}"
+    out["stored/s"] = f"{stored / elapsed:,.0f}"
+
+    start = time.perf_counter()
+    again = 0
+    for body in bodies:
+        again += client.post("/ingest/bulk", content=body).json()["stored"]
+    out["reupload samples/s"] = f"{sent / (time.perf_counter() - start):,.0f}"
+
+    problems = []
+    if stored != n - live or again:
+        problems.append(f"stored {stored} (+{again} on reupload), want {n - live}")
+    if duplicates != sent - stored:
+        problems.append(f"{duplicates} duplicates of {sent} sent")
+    window = ble_service.store.window(ts_us[0] / 1e6, ts_us[-1] / 1e6)
+    if not np.array_equal(window["ts_us"], ts_us):
+        problems.append(f"{len(window['ts_us'])} samples in the window, want {n}")
+    # the hours the samples landed in, from one localtime() per second
+    stored_by_hour: Dict[tuple, int] = {}
+    secs, per_sec = np.unique(window["ts_us"] // 1_000_000, return_counts=True)
+    for sec, count in zip(secs.tolist(), per_sec.tolist()):
+        lt = time.localtime(sec)
+        key = (time.strftime("%Y-%m-%d", lt), lt.tm_hour)
+        stored_by_hour[key] = stored_by_hour.get(key, 0) + count
+    days = sorted({d for d, _ in stored_by_hour})
+    ticks_by_hour: Dict[tuple, int] = {}
+    for r in ble_service.store.counters(days[0], days[-1], hourly=True):
+        if r["name"] in ("slouch_time", "straight_time"):
+            key = (r["date"], r["hour"])
+            ticks_by_hour[key] = ticks_by_hour.get(key, 0) + r["value"]
+    if {k: ticks_by_hour.get(k, 0) for k in stored_by_hour} != stored_by_hour:
+        problems.append("hourly slouch+straight ticks differ from stored samples")
+    for problem in problems:
+        print(f"  {args.engine}: FAIL {problem}", file=sys.stderr)
+    out["check"] = "FAIL" if problems else "pass"
+    print(json.dumps(out))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--engines", nargs="+", default=None, help="default: all in ble_service.ENGINES")
+    p.add_argument("--hours", type=float, default=4.0, help="length of the offline buffer")
+    p.add_argument("--rate", type=float, default=50.0, help="sample rate in Hz")
+    p.add_argument("--batch", type=int, default=200_000, help="samples per upload body")
+    p.add_argument("--overlap", type=float, default=0.05, help="fraction of each body resent in the next")
+    p.add_argument("--live", type=float, default=0.1, help="fraction of the period already stored live")
+    p.add_argument("--engine", help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.engine:
+        run_engine(args)
+        return
+
+    if args.engines is None:
+        import ble_service
+
+        args.engines = list(ble_service.ENGINES)
+    rows = {}
+    for engine in args.engines:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, BLE_DB_PATH=os.path.join(tmp, "bench.db"), BLE_STORAGE=engine, BLE_INGEST_MODE="local")
+            cmd = [sys.executable, __file__, "--engine", engine, "--hours", str(args.hours), "--rate", str(args.rate),
+                   "--batch", str(args.batch), "--overlap", str(args.overlap), "--live", str(args.live)]
+            proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, text=True)
+            lines = proc.stdout.strip().splitlines()
+            rows[engine] = json.loads(lines[-1]) if proc.returncode == 0 and lines else {"check": "crashed"}
+    cols = list(dict.fromkeys(k for r in rows.values() for k in r))
+    n = int(args.hours * 3600 * args.rate)
+    print(f"{n:,} samples ({args.hours:g} h at {args.rate:g} Hz), bodies of {args.batch:,}, "
+          f"{args.overlap:.0%} resent, {args.live:.0%} stored live")
+    print(f"{'engine':<8}" + "".join(f" {c:>18}" for c in cols))
+    for engine, r in rows.items():
+        print(f"{engine:<8}" + "".join(f" {r.get(c, '-'):>18}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""Load-test the chat path offline.
+
+Starts three processes on a throwaway DB seeded with 30 days of counters:
+fake_llm.py (the OpenAI-compatible stub), posture_mcp_server and
+`uvicorn server:app`. The server is pointed at the stub and the MCP server
+through LLM_BASE_URL/MCP_SERVER_URL. The driver then fires concurrent
+requests at /api/chat (or /mcp/summary), through the whole chain: FastAPI ->
+mcp_client -> stub (plan) -> MCP server -> posture API -> stub (answer).
+
+Reports latency p50/p99, throughput and errors. For /api/chat it also
+reports where the time went, from the Server-Timing header: MCP connect
+(initialize + tools/list), the two LLM calls, the tool call and the rest.
+By default the stub calls get_posture_data, so each turn reaches
+/db/description; use --tool for another tool.
+
+--provider-rps/--error-rate make the stub answer like a rate-limited or
+flaky provider (429 with Retry-After, 503). The server's LLM scheduler
+(mcp_client.LLMScheduler) is configured with --max-in-flight/--rate, or
+effectively switched off with --no-scheduler. Shed requests (503 from the
+server) are counted apart from errors; req/s counts successful ones only.
+
+Usage:
+  python bench_chat.py
+  python bench_chat.py --concurrency 1 8 32 --requests 200 --latency 0.3
+  python bench_chat.py --endpoint summary
+  python bench_chat.py --provider-rps 5 --rate 4 --concurrency 32
+  python bench_chat.py --provider-rps 5 --no-scheduler --concurrency 32
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, Iterator, List
+
+import httpx
+
+STAGES = ["mcp_connect", "llm_plan", "tool", "llm_answer"]
+
+
+def _ready(port: int, path: str) -> bool:
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=0.5)
+        conn.request("GET", path)
+        return conn.getresponse().status < 500
+    except OSError:
+        return False
+
+
+@contextlib.contextmanager
+def stack(args: argparse.Namespace) -> Iterator[str]:
+    """Run stub, MCP server and API server; yield the API base URL."""
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "ble_data.db")
+        os.environ["BLE_DB_PATH"] = db_path
+        from bench_mcp_tokens import seed
+
+        seed()
+        api = f"http://127.0.0.1:{args.port}"
+        env = dict(
+            os.environ,
+            BLE_DB_PATH=db_path,
+            GROQ_API_KEY="fake",
+            LLM_BASE_URL=f"http://127.0.0.1:{args.port + 1}/v1",
+            MCP_SERVER_URL=f"http://127.0.0.1:{args.port + 2}",
+            POSTURE_API_URL=api,
+            FAKE_LLM_LATENCY=str(args.latency),
+            FAKE_LLM_TOKENS_PER_S=str(args.tokens_per_s),
+            FAKE_LLM_COMPLETION_TOKENS=str(args.completion_tokens),
+            FAKE_LLM_TOOL=args.tool,
+            FAKE_LLM_RPS=str(args.provider_rps),
+            FAKE_LLM_ERROR_RATE=str(args.error_rate),
+        )
+        if args.no_scheduler:
+            env.update(LLM_MAX_IN_FLIGHT="1000000", LLM_RATE_PER_S="0", LLM_MAX_QUEUE="1000000", LLM_MAX_RETRIES="0")
+        else:
+            env.update(LLM_MAX_IN_FLIGHT=str(args.max_in_flight), LLM_RATE_PER_S=str(args.rate))
+        procs = []
+        try:
+            for module, port, probe in (
+                ("fake_llm:app", args.port + 1, "/stats"),
+                ("posture_mcp_server:app", args.port + 2, "/mcp"),
+                ("server:app", args.port, "/status"),
+            ):
+                procs.append(subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", module, "--port", str(port), "--log-level", "warning"],
+                    env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                ))
+                deadline = time.monotonic() + 30
+                while not _ready(port, probe):
+                    if time.monotonic() > deadline or procs[-1].poll() is not None:
+                        raise RuntimeError(f"{module} did not start on port {port}")
+                    time.sleep(0.05)
+            yield api
+        finally:
+            for proc in procs:
+                proc.terminate()
+                proc.wait()
+
+
+def _server_timing(header: str) -> Dict[str, float]:
+    out = {}
+    for part in header.split(","):
+        name, _, dur = part.strip().partition(";dur=")
+        if dur:
+            out[name] = float(dur) / 1000
+    return out
+
+
+async def load(api: str, endpoint: str, concurrency: int, requests: int) -> Dict[str, object]:
+    latencies: List[float] = []
+    timings: List[Dict[str, float]] = []
+    errors = shed = 0
+    remaining = iter(range(requests))
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        nonlocal errors, shed
+        for _ in remaining:
+            t0 = time.perf_counter()
+            try:
+                if endpoint == "summary":
+                    resp = await client.get("/mcp/summary")
+                else:
+                    resp = await client.post("/api/chat", json={"message": "Am I improving compared to yesterday?"})
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            if resp.status_code == 503:
+                shed += 1
+                continue
+            # chat_with_tools reports other failures as an "Error: ..." reply
+            if resp.status_code != 200 or (endpoint == "chat" and str(resp.json().get("response", "")).startswith("Error:")):
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - t0)
+            if "server-timing" in resp.headers:
+                timings.append(_server_timing(resp.headers["server-timing"]))
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=api, timeout=120, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    return {"latencies": sorted(latencies), "timings": timings, "errors": errors, "shed": shed, "elapsed": elapsed}
+
+
+def _pct(values: List[float], q: float) -> float:
+    return values[min(len(values) - 1, int(q * len(values)))] if values else float("nan")
+
+
+def report(concurrency: int, result: Dict[str, object]) -> None:
+    lat = result["latencies"]
+    print(
+        f"{concurrency:>5} {len(lat):>6} {result['shed']:>6} {result['errors']:>6} {len(lat) / result['elapsed']:>8.1f} "
+        f"{_pct(lat, 0.5) * 1000:>8.0f} {_pct(lat, 0.99) * 1000:>8.0f}",
+        end="",
+    )
+    timings = result["timings"]
+    if timings:
+        means = {s: sum(t.get(s, 0.0) for t in timings) / len(timings) for s in STAGES + ["total"]}
+        other = means["total"] - sum(means[s] for s in STAGES)
+        client_side = sum(lat) / len(lat) - means["total"]
+        print("".join(f" {means[s] * 1000:>10.0f}" for s in STAGES) + f" {other * 1000:>8.0f} {client_side * 1000:>8.0f}")
+    else:
+        print()
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--endpoint", choices=["chat", "summary"], default="chat")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    p.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    p.add_argument("--port", type=int, default=8870, help="API port; the stub and MCP server use the next two")
+    p.add_argument("--latency", type=float, default=0.2, help="stub seconds per LLM call before tokens")
+    p.add_argument("--tokens-per-s", type=float, default=500)
+    p.add_argument("--completion-tokens", type=int, default=60)
+    p.add_argument("--tool", default="get_posture_data", help="tool the stub calls")
+    p.add_argument("--provider-rps", type=float, default=0, help="stub answers 429 above this rate (0: unlimited)")
+    p.add_argument("--error-rate", type=float, default=0, help="share of stub requests failed with 503")
+    p.add_argument("--max-in-flight", type=int, default=8, help="scheduler cap on concurrent LLM calls")
+    p.add_argument("--rate", type=float, default=0, help="scheduler LLM calls/s (0: no token bucket)")
+    p.add_argument("--no-scheduler", action="store_true", help="no caps, queue limit or retries")
+    args = p.parse_args()
+
+    with stack(args) as api:
+        print(f"endpoint /{'api/chat' if args.endpoint == 'chat' else 'mcp/summary'}, stub latency {args.latency}s, "
+              f"{args.tokens_per_s:g} tok/s, {args.completion_tokens} completion tokens, tool {args.tool}")
+        print(f"{'conc':>5} {'ok':>6} {'shed':>6} {'errors':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}", end="")
+        if args.endpoint == "chat":
+            print("".join(f" {s:>10}" for s in STAGES) + f" {'other':>8} {'client':>8}")
+        else:
+            print()
+        for concurrency in args.concurrency:
+            report(concurrency, asyncio.run(load(api, args.endpoint, concurrency, args.requests)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""Measure swinging-door compression on replayed sessions.
+
+Replays the sessions stored in the DB (or a synthetic one) through
+`compression.SwingingDoor` at several tolerances and reports, per tolerance:
+how many samples would be stored, the compression ratio, and the
+reconstruction error of linear interpolation at the original timestamps
+(max and RMS over all axes). The max error never exceeds the tolerance.
+
+Usage:
+  python bench_compression.py                       # default DB
+  python bench_compression.py --db other.db --tol 0.5 1 2 4
+  python bench_compression.py --synthetic 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import time
+
+import numpy as np
+
+import compression
+from bench_detectors import load_sessions
+
+
+def synthetic_sessions(n: int, seed: int = 0) -> list:
+    """Mostly still wearer: long steady stretches with +-1 sensor noise,
+    occasional posture changes, 20 Hz."""
+    rng = np.random.default_rng(seed)
+    level = np.cumsum(np.where(rng.random((n, 6)) < 0.002, rng.integers(-20, 21, size=(n, 6)), 0), axis=0)
+    noise = rng.integers(-1, 2, size=(n, 6)) * (rng.random((n, 6)) < 0.3)
+    values = np.clip(level + noise, -128, 127).astype(np.float64)
+    session = {"t": np.arange(n) * 0.05}
+    session.update({k: values[:, i] for i, k in enumerate(compression.AXES)})
+    return [session]
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", default=os.environ.get("BLE_DB_PATH", "ble_data.db"))
+    p.add_argument("--synthetic", type=int, default=0, help="use N synthetic samples instead of the DB")
+    p.add_argument("--tol", type=float, nargs="+", default=[0.5, 1, 2, 4, 8])
+    p.add_argument("--max-interval", type=float, default=10.0)
+    args = p.parse_args()
+
+    sessions = synthetic_sessions(args.synthetic) if args.synthetic else load_sessions(args.db)
+    sessions = [s for s in sessions if s["t"].size]
+    total = sum(s["t"].size for s in sessions)
+    if not total:
+        print("no samples to replay")
+        return
+    print(f"{len(sessions)} sessions, {total} samples")
+    print(f"{'tol':>5} {'stored':>10} {'ratio':>8} {'max err':>8} {'rms err':>8} {'samples/s':>12}")
+    for tol in args.tol:
+        stored = 0
+        max_err = 0.0
+        sq = 0.0
+        elapsed = 0.0
+        for s in sessions:
+            values = np.column_stack([s[k] for k in compression.AXES])
+            t0 = time.perf_counter()
+            keep = compression.compress(s["t"], values, tol, args.max_interval)
+            elapsed += time.perf_counter() - t0
+            stored += int(keep.sum())
+            err = np.abs(compression.reconstruct(s["t"][keep], values[keep], s["t"]) - values)
+            max_err = max(max_err, float(err.max()))
+            sq += float((err ** 2).sum())
+        rms = (sq / (total * len(compression.AXES))) ** 0.5
+        print(f"{tol:>5g} {stored:>10} {total / stored:>7.1f}x {max_err:>8.3f} {rms:>8.3f} {total / elapsed:>12,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Benchmark BLE notification decoding.
+
+Decodes synthetic notifications in the legacy one-sample format and in the
+packed v1 format at several batch sizes, and compares the NumPy bulk decode
+used by `packets.PacketDecoder` with a `struct.iter_unpack` loop. Reports
+samples/s (decoding only, no detection or persistence), and checks loss
+accounting by dropping a known share of packed notifications.
+
+Usage:
+  python bench_decoder.py                     # 200k samples
+  python bench_decoder.py --samples 1000000 --batch 10 20 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import struct
+import time
+
+import numpy as np
+
+import packets
+
+
+def synthetic(n: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return np.clip(np.cumsum(rng.integers(-3, 4, size=(n, 6)), axis=0), -128, 127)
+
+
+def bench_legacy(samples: np.ndarray) -> float:
+    payloads = [bytearray((row + 128).astype(np.uint8).tobytes()) for row in samples]
+    dec = packets.PacketDecoder()
+    t0 = time.perf_counter()
+    for p in payloads:
+        dec.decode(p, 0.0)
+    return len(payloads) / (time.perf_counter() - t0)
+
+
+def packed_payloads(samples: np.ndarray, batch: int) -> list:
+    return [
+        bytearray(packets.encode(seq, seq * batch * 20, 20, samples[i:i + batch]))
+        for seq, i in enumerate(range(0, len(samples) - batch + 1, batch))
+    ]
+
+
+def bench_packed(samples: np.ndarray, batch: int) -> float:
+    payloads = packed_payloads(samples, batch)
+    dec = packets.PacketDecoder()
+    t0 = time.perf_counter()
+    for i, p in enumerate(payloads):
+        dec.decode(p, i * batch * 0.02)
+    return len(payloads) * batch / (time.perf_counter() - t0)
+
+
+def bench_iter_unpack(samples: np.ndarray, batch: int) -> float:
+    """Same payloads, decoded with struct.iter_unpack into Python tuples."""
+    payloads = packed_payloads(samples, batch)
+    header = packets.HEADER
+    t0 = time.perf_counter()
+    for p in payloads:
+        header.unpack_from(p)
+        rows = [tuple(v - 128 for v in r) for r in struct.iter_unpack("6B", memoryview(p)[header.size:])]
+    return len(payloads) * batch / (time.perf_counter() - t0)
+
+
+def check_loss(samples: np.ndarray, batch: int, every: int) -> None:
+    payloads = packed_payloads(samples, batch)
+    dec = packets.PacketDecoder()
+    dropped = 0
+    for i, p in enumerate(payloads):
+        if i % every == every - 1:
+            dropped += 1
+            continue
+        dec.decode(p, i * batch * 0.02)
+    s = dec.summary()
+    ok = s["lost_packets"] == dropped - (1 if (len(payloads) - 1) % every == every - 1 else 0)
+    print(f"loss check: dropped {dropped} notifications, decoder counted {s['lost_packets']} packets / "
+          f"{s['lost_samples']} samples (loss ratio {s['loss_ratio']:.4f}) {'ok' if ok else 'MISMATCH'}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--samples", type=int, default=200_000)
+    p.add_argument("--batch", type=int, nargs="+", default=[1, 10, 20, 40])
+    args = p.parse_args()
+
+    samples = synthetic(args.samples)
+    print(f"{'format':<22} {'samples/s':>14}")
+    print(f"{'legacy (6 B)':<22} {bench_legacy(samples):>14,.0f}")
+    for batch in args.batch:
+        print(f"{f'packed x{batch} numpy':<22} {bench_packed(samples, batch):>14,.0f}")
+        print(f"{f'packed x{batch} iter_unpack':<22} {bench_iter_unpack(samples, batch):>14,.0f}")
+    check_loss(samples, 20, every=50)
+
+
+if __name__ == "__main__":
+    main()
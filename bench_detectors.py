@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Replay stored sessions through every slouch detector.
+
+Reads the `samples` table from the SQLite DB (BLE_DB_PATH or --db), splits it
+into sessions wherever `t` goes backwards (the service restarted), and runs
+each detector over every session in batches. Reports throughput and how many
+slouch transitions / slouched samples each detector finds, which makes it easy
+to compare a new rule against the current one before switching devices over.
+
+Usage:
+  python bench_detectors.py                  # all detectors, default DB
+  python bench_detectors.py --db other.db --batch 1
+  python bench_detectors.py --synthetic 1000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import time
+from typing import Dict, List
+
+import numpy as np
+
+import detectors
+
+
+def load_sessions(db_path: str) -> List[Dict[str, np.ndarray]]:
+    conn = sqlite3.connect(db_path)
+    cur = conn.execute("SELECT t, ax, ay, az, gx, gy, gz FROM samples ORDER BY id ASC")
+    rows = np.array(cur.fetchall(), dtype=np.float64).reshape(-1, 7)
+    conn.close()
+    if rows.size == 0:
+        return []
+    # A new session starts whenever the process-relative clock resets.
+    cuts = np.flatnonzero(np.diff(rows[:, 0]) < 0) + 1
+    sessions = []
+    for part in np.split(rows, cuts):
+        sessions.append({k: part[:, i] for i, k in enumerate(("t",) + detectors.AXES)})
+    return sessions
+
+
+def synthetic_sessions(n: int, seed: int = 0) -> List[Dict[str, np.ndarray]]:
+    """One long random-walk session, clamped to the int8 range like the device."""
+    rng = np.random.default_rng(seed)
+    cols = {"t": np.arange(n, dtype=np.float64) * 0.05}
+    for k in detectors.AXES:
+        walk = np.cumsum(rng.integers(-3, 4, size=n))
+        cols[k] = np.clip(walk, -128, 127).astype(np.float64)
+    return [cols]
+
+
+def run(sessions: List[Dict[str, np.ndarray]], batch: int) -> None:
+    total = sum(s["t"].size for s in sessions)
+    print(f"{len(sessions)} sessions, {total} samples, batch size {batch}")
+    print(f"{'detector':<12} {'samples/s':>14} {'transitions':>12} {'slouched %':>11}")
+    for name in detectors.available():
+        det = detectors.get_detector(name)
+        transitions = 0
+        over = 0
+        t0 = time.perf_counter()
+        for s in sessions:
+            det.reset()
+            n = s["t"].size
+            for i in range(0, n, batch):
+                chunk = {k: v[i:i + batch] for k, v in s.items()}
+                res = det.detect(chunk)
+                transitions += res.transitions
+                over += int(np.count_nonzero(res.over))
+        elapsed = time.perf_counter() - t0
+        rate = total / elapsed if elapsed > 0 else float("inf")
+        pct = 100.0 * over / total if total else 0.0
+        print(f"{name:<12} {rate:>14,.0f} {transitions:>12} {pct:>10.1f}%")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", default=os.environ.get("BLE_DB_PATH", "ble_data.db"))
+    p.add_argument("--batch", type=int, default=4096, help="samples per detect() call")
+    p.add_argument("--synthetic", type=int, default=0, help="replay N synthetic samples instead of the DB")
+    args = p.parse_args()
+
+    if args.synthetic:
+        sessions = synthetic_sessions(args.synthetic)
+    else:
+        if not os.path.exists(args.db):
+            print(f"DB not found: {args.db} (use --synthetic N to benchmark without one)")
+            return
+        sessions = load_sessions(args.db)
+    if not sessions:
+        print("No samples to replay.")
+        return
+    run(sessions, max(1, args.batch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""Benchmark the friends leaderboard with synthetic users.
+
+Fills a Leaderboard with N users and D days of random daily totals, then
+times live-style incremental updates and /leaderboard-style queries (top-k
+plus a user's neighbours) for both periods.
+
+Usage:
+  python bench_leaderboard.py                 # 5000 users, 14 days
+  python bench_leaderboard.py --users 20000 --days 30
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from datetime import date as Date, timedelta
+
+import leaderboard
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--users", type=int, default=5000)
+    p.add_argument("--days", type=int, default=14)
+    p.add_argument("--queries", type=int, default=20000)
+    p.add_argument("--updates", type=int, default=100000)
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    rng = random.Random(args.seed)
+    board = leaderboard.Leaderboard()
+    users = [f"user{i:05d}" for i in range(args.users)]
+    today = Date.today()
+    days = [(today - timedelta(days=n)).isoformat() for n in range(args.days - 1, -1, -1)]
+
+    t0 = time.perf_counter()
+    for day in days:
+        for u in users:
+            total = rng.randint(1000, 20000)
+            straight = int(total * rng.betavariate(5, 2))
+            board.add(u, day, straight=straight, slouch=total - straight, replace=True)
+    load = time.perf_counter() - t0
+    print(f"loaded {args.users} users x {args.days} days in {load:.2f}s")
+
+    day = days[-1]
+    t0 = time.perf_counter()
+    for _ in range(args.updates):
+        slouched = rng.random() < 0.3
+        board.add(rng.choice(users), day, straight=0 if slouched else 1, slouch=1 if slouched else 0)
+    upd = time.perf_counter() - t0
+    print(f"incremental update: {upd / args.updates * 1e6:8.2f} us/op")
+
+    for period in leaderboard.PERIODS:
+        t0 = time.perf_counter()
+        for _ in range(args.queries):
+            board.query(period, day, user=rng.choice(users), k=10, neighbors=2)
+        q = time.perf_counter() - t0
+        print(f"{period:<8} query:     {q / args.queries * 1e6:8.2f} us/op")
+
+    sample = board.query("weekly", day, user=users[0], k=3, neighbors=1)
+    print("top 3 this week:", [(e["user"], e["score"], e["streak"]) for e in sample["top"]])
+    print("user0:", sample["user"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""Count the prompt tokens the posture tools add to a chat turn.
+
+For each canned question, compares what `mcp_client` sends the model with
+the old single `get_posture_data` tool (its schema plus the whole
+/db/description text as the tool result) against the structured tools
+(all their schemas plus the compact JSON results of the calls a model
+would make for that question). The tools run in-process against
+`server.app`, on a throwaway DB seeded with 30 days of counters unless
+--db is given.
+
+Tokens are counted with tiktoken's cl100k_base when it is installed,
+otherwise estimated as characters / 4.
+
+Usage:
+  python bench_mcp_tokens.py
+  python bench_mcp_tokens.py --db ble_data.db
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import tempfile
+import time
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+def _days_ago(n: int) -> str:
+    return (datetime.date.today() - datetime.timedelta(days=n)).isoformat()
+
+
+# (question, can the old description answer it?, tool calls a model would
+# make with the structured tools). The description only has today's
+# counters and totals over all stored days.
+QUESTIONS = [
+    ("How did I do today?", True, [("get_daily_stats", {"start": "today"})]),
+    ("Am I improving compared to yesterday?", False, [("compare_periods", {"a_start": "yesterday", "b_start": "today"})]),
+    ("When during the day do I slouch the most?", False, [("get_hourly_breakdown", {"date": "today"})]),
+    ("How was my posture this week?", False, [("get_daily_stats", {"start": _days_ago(6), "end": "today"})]),
+    (
+        "Was this week better than last week?",
+        False,
+        [("compare_periods", {"a_start": _days_ago(13), "a_end": _days_ago(7), "b_start": _days_ago(6), "b_end": "today"})],
+    ),
+    ("Am I slouching right now?", False, [("get_live_sample", {})]),
+    ("Show my posture for the last 30 days.", True, [("get_daily_stats", {"start": _days_ago(29), "end": "today"})]),
+]
+
+
+def count_tokens(text: str) -> int:
+    if tiktoken is not None:
+        return len(tiktoken.get_encoding("cl100k_base").encode(text))
+    return (len(text) + 3) // 4
+
+
+def _schemas(tools: list) -> str:
+    # the `tools` argument mcp_client passes to chat.completions.create
+    return json.dumps([
+        {"type": "function", "function": {"name": t["name"], "description": t["description"], "parameters": t["inputSchema"]}}
+        for t in tools
+    ])
+
+
+def seed(days: int = 30, seed: int = 0) -> None:
+    """Fill the (empty) DB with plausible counters and one sample."""
+    import ble_service
+
+    rng = random.Random(seed)
+    conn = ble_service._open_db()
+    with ble_service._db_lock:
+        for d in range(days):
+            day = _days_ago(d)
+            for hour in range(8, 22):
+                if rng.random() < 0.2:
+                    continue
+                straight = rng.randint(20_000, 60_000)
+                slouch = rng.randint(2_000, 30_000)
+                ble_service._add_counters(
+                    conn, day, hour,
+                    slouch_frequency=rng.randint(0, 12), slouch_time=slouch,
+                    straight_time=straight, slouch_alerts=rng.randint(0, 3),
+                )
+        table = ble_service._ensure_partition(conn, _days_ago(0))
+        conn.execute(
+            f"INSERT INTO {table} (id, t, ax, ay, az, gx, gy, gz, pitch) VALUES (?, 12.5, 3, -60, 10, 0, 1, -1, 21.37)",
+            (ble_service._next_sample_id(),),
+        )
+        conn.commit()
+
+
+async def run() -> None:
+    import httpx
+    import posture_mcp_server
+    import server
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://posture") as client:
+        legacy_tool = [{
+            "name": "get_posture_data",
+            "description": "This function gets a descriptive string for posture frequency and slouch percentage by date.",
+            "inputSchema": {"type": "object", "properties": {}},
+        }]
+        legacy_schema = count_tokens(_schemas(legacy_tool))
+        tools_schema = count_tokens(_schemas(posture_mcp_server.TOOLS))
+        legacy = await posture_mcp_server.call_tool(client, "get_posture_data", {})
+        # the old client serialised results with json.dumps defaults
+        legacy_result = count_tokens(json.dumps(legacy.get("result", {})))
+
+        print(f"tokenizer: {'tiktoken cl100k_base' if tiktoken else 'estimate (chars / 4)'}")
+        print(f"tool schemas: legacy {legacy_schema}, structured {tools_schema}")
+        print(f"{'question':<44} {'legacy':>7} {'tools':>7} {'change':>7}  legacy answers it")
+        legacy_total = tools_total = 0
+        for question, answerable, calls in QUESTIONS:
+            result_tokens = 0
+            for name, args in calls:
+                reply = await posture_mcp_server.call_tool(client, name, args)
+                payload = reply["result"] if "result" in reply else {"error": reply["error"]["message"]}
+                result_tokens += count_tokens(json.dumps(payload, separators=(",", ":")))
+            old = legacy_schema + legacy_result
+            new = tools_schema + result_tokens
+            legacy_total += old
+            tools_total += new
+            print(f"{question:<44} {old:>7} {new:>7} {new / old - 1:>+7.0%}  {'yes' if answerable else 'no'}")
+        print(f"{'total':<44} {legacy_total:>7} {tools_total:>7} {tools_total / legacy_total - 1:>+7.0%}")
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", help="existing DB to answer from (default: seeded throwaway DB)")
+    args = p.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["BLE_DB_PATH"] = args.db or os.path.join(tmp, "ble_data.db")
+        if not args.db:
+            seed()
+        t0 = time.perf_counter()
+        asyncio.run(run())
+        print(f"done in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""Measure server cold start.
+
+Starts `uvicorn server:app` in a fresh process against a throwaway DB and
+reports, from process spawn:
+
+- time to first HTTP 200 (polling /status);
+- time to first sample persisted (polling the DB for a row). Without a
+  device this relies on the service's simulation mode (bleak not installed);
+  with a real device it measures time to the first BLE sample.
+
+Each run is repeated and the median reported. Use --warmup to pass
+SERVER_WARMUP through and see that background warm-up doesn't delay either.
+
+Usage:
+  python bench_startup.py
+  python bench_startup.py --runs 10 --warmup chat,leaderboard
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def _http_ok(port: int) -> bool:
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=0.5)
+        conn.request("GET", "/status")
+        return conn.getresponse().status == 200
+    except OSError:
+        return False
+
+
+def _has_sample(db_path: str) -> bool:
+    if not os.path.exists(db_path):
+        return False
+    try:
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=0.1)
+        try:
+            return conn.execute("SELECT 1 FROM samples LIMIT 1").fetchone() is not None
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return False
+
+
+def run_once(port: int, warmup: str, timeout: float) -> tuple[float | None, float | None]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "ble_data.db")
+        env = dict(os.environ, BLE_DB_PATH=db_path, SERVER_WARMUP=warmup)
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        first_200 = first_sample = None
+        try:
+            while time.perf_counter() - t0 < timeout and (first_200 is None or first_sample is None):
+                if first_200 is None and _http_ok(port):
+                    first_200 = time.perf_counter() - t0
+                if first_sample is None and _has_sample(db_path):
+                    first_sample = time.perf_counter() - t0
+                time.sleep(0.005)
+        finally:
+            proc.terminate()
+            proc.wait()
+        return first_200, first_sample
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--runs", type=int, default=5)
+    p.add_argument("--port", type=int, default=8865)
+    p.add_argument("--warmup", default="", help="value for SERVER_WARMUP")
+    p.add_argument("--timeout", type=float, default=30.0)
+    args = p.parse_args()
+
+    http_times, sample_times = [], []
+    for i in range(args.runs):
+        first_200, first_sample = run_once(args.port, args.warmup, args.timeout)
+        print(f"run {i + 1}: first HTTP 200 {_fmt(first_200)}, first sample persisted {_fmt(first_sample)}")
+        if first_200 is not None:
+            http_times.append(first_200)
+        if first_sample is not None:
+            sample_times.append(first_sample)
+    print(f"median: first HTTP 200 {_fmt(_median(http_times))}, first sample persisted {_fmt(_median(sample_times))}")
+
+
+def _median(values: list[float]) -> float | None:
+    return statistics.median(values) if values else None
+
+
+def _fmt(value: float | None) -> str:
+    return "timeout" if value is None else f"{value * 1000:.0f} ms"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""Conformance checks and timings for the storage engines (storage.py).
+
+Every engine in ble_service.ENGINES gets the same treatment, each in its own
+process with a throwaway DB path:
+
+1. conformance: a small data set spanning three local days, with a late
+   (out of order) sample, is appended and every Storage method is checked
+   against a plain-Python model of the expected results: scan order and
+   paging, time windows, after_id (id order across days, paged), t
+   filters, latest, days, counters (daily, hourly, reset), meta, user
+   stats, retention, column batches (append_columns), column windows, and
+   that a batch failing part-way is rolled back entirely.
+2. timings: --samples samples at 50 Hz over --days days are appended in
+   batches of --batch (with counter increments, like the spool writer),
+   then time-window scans, sync-style paging by id, latest, 7-day counter
+   reads and a prune of half the days are timed.
+
+A new engine only has to be added to ble_service.ENGINES to be compared.
+
+Usage:
+  python bench_storage.py
+  python bench_storage.py --engines memory --samples 1000000
+  python bench_storage.py --check-only
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+RATE_HZ = 50
+
+
+def _day_start(days_ago: int) -> float:
+    """Epoch seconds of local midnight `days_ago` days back."""
+    lt = time.localtime(time.time() - days_ago * 86400)
+    return time.mktime((lt.tm_year, lt.tm_mon, lt.tm_mday, 0, 0, 0, 0, 0, -1))
+
+
+def _sample(ts: float, t: float, v: int) -> tuple:
+    return (int(round(ts * 1e6)), t, v, -v, v % 50, 1, 2, 3)
+
+
+def check(store, storage) -> List[str]:
+    """Run the conformance checks; return the failures (empty when all pass)."""
+    failures: List[str] = []
+
+    def expect(what: str, got, want) -> None:
+        if got != want:
+            failures.append(f"{what}: got {got!r}, want {want!r}")
+
+    expect("empty scan", store.scan(), [])
+    expect("empty latest", store.latest(), None)
+    expect("empty counter", store.counter("slouch_time", "2000-01-01"), 0)
+
+    # three local days, 2 days ago .. today; the last sample of the first
+    # batch lands a second before midnight, one sample arrives late
+    base = [_day_start(2) + 3600, _day_start(1) - 1.0, _day_start(1) + 7200, _day_start(0) + 60]
+    batches = [
+        [_sample(base[0] + i * 0.5, i * 0.5, i) for i in range(20)] + [_sample(base[1], 100.0, 99)],
+        [_sample(base[2] + i * 0.5, i * 0.5, i + 20) for i in range(20)],
+        [_sample(base[3] + i * 0.5, i * 0.5, i + 40) for i in range(10)]
+        + [_sample(base[2] + 0.25, 0.25, 77)],  # late: inside day 1's range
+    ]
+    day2, day1, day0 = (storage.local_day(b) for b in (base[0], base[2], base[3]))
+    counts = {(day0, 9): {"slouch_time": 5, "straight_time": 7, "slouch_frequency": 1}, (day0, 10): {"slouch_time": 2}}
+    for i, batch in enumerate(batches):
+        store.append(batch, counts if i == 2 else None, {"checkpoint": str(i)})
+
+    # reference model: ids follow append order, days from ts
+    model = []
+    next_id = None
+    for batch in batches:
+        for s in batch:
+            model.append({"ts_us": s[0], "t": s[1], "ax": s[2], "day": storage.local_day(s[0] / 1e6)})
+    rows = store.scan(limit=None)
+    if len(rows) == len(model) and rows:
+        next_id = rows[0]["id"]
+        ids = sorted(r["id"] for r in rows)
+        expect("ids increase by one per sample", ids, list(range(next_id, next_id + len(model))))
+        for i, m in enumerate(model):
+            m["id"] = next_id + i
+    else:
+        failures.append(f"full scan returned {len(rows)} rows, want {len(model)}")
+        return failures
+
+    by_day_id = sorted(model, key=lambda m: (m["day"], m["id"]))
+    expect("scan order (day, id)", [r["id"] for r in rows], [m["id"] for m in by_day_id])
+    expect("fields", sorted(rows[0]), sorted(storage.SAMPLE_FIELDS))
+    first = next(r for r in rows if r["id"] == next_id)
+    expect("created_at", first["created_at"], time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(base[0])))
+    expect("values", (first["ts_us"], first["t"], first["ax"], first["ay"]), batches[0][0][:4])
+
+    lo, hi = base[2], base[2] + 2.0
+    want = sorted((m for m in model if lo * 1e6 <= m["ts_us"] <= hi * 1e6), key=lambda m: (m["ts_us"], m["id"]))
+    expect("time window (inclusive, ts order)", [r["id"] for r in store.scan(start_ts=lo, end_ts=hi, limit=None)],
+           [m["id"] for m in want])
+    lo = base[1] - 0.5
+    want = sorted((m for m in model if m["ts_us"] >= lo * 1e6), key=lambda m: (m["day"], m["ts_us"], m["id"]))
+    expect("open-ended window across days", [r["id"] for r in store.scan(start_ts=lo, limit=None)],
+           [m["id"] for m in want])
+    # the sync feed: id order across days, even where an older day got later ids
+    after = next_id + 25
+    expect("after_id (id order)", [r["id"] for r in store.scan(after_id=after, limit=None)],
+           [m["id"] for m in model if m["id"] > after])
+    pages = []
+    for offset in range(0, len(model), 4):
+        pages += [r["id"] for r in store.scan(after_id=after, limit=4, offset=offset)]
+    expect("paging after_id", pages, [m["id"] for m in model if m["id"] > after])
+    expect("t filter", [r["id"] for r in store.scan(start_t=2.0, end_t=3.0, limit=None)],
+           [m["id"] for m in by_day_id if 2.0 <= m["t"] <= 3.0])
+    pages = []
+    for offset in range(0, len(model) + 7, 7):
+        pages += [r["id"] for r in store.scan(limit=7, offset=offset)]
+    expect("paging", pages, [m["id"] for m in by_day_id])
+    window = [r["id"] for r in store.scan(start_ts=base[0], limit=5, offset=19)]
+    expect("paging a window", window, [m["id"] for m in sorted(model, key=lambda m: (m["day"], m["ts_us"], m["id"]))][19:24])
+
+    latest = store.latest()
+    expect("latest", latest and latest["id"], max(m["id"] for m in model if m["day"] == day0))
+    days = {d: last for d, last in store.days() if last is not None}
+    expect("days", days, {d: max(m["id"] for m in model if m["day"] == d) for d in (day2, day1, day0)})
+
+    expect("counter", store.counter("slouch_time", day0), 7)
+    daily = {(r["name"], r["date"]): r["value"] for r in store.counters(day2, day0)}
+    expect("daily counters", daily, {("slouch_time", day0): 7, ("straight_time", day0): 7, ("slouch_frequency", day0): 1})
+    hourly = {(r["name"], r["hour"]): r["value"] for r in store.counters(day0, day0, hourly=True)}
+    expect("hourly counters", hourly, {("slouch_time", 9): 5, ("slouch_time", 10): 2, ("straight_time", 9): 7, ("slouch_frequency", 9): 1})
+    store.set_counter("slouch_time", day0, 0)
+    expect("reset counter", store.counter("slouch_time", day0), 0)
+
+    expect("meta from append", store.get_meta("checkpoint"), "2")
+    store.set_meta("k", "v")
+    expect("meta", (store.get_meta("k"), store.get_meta("missing", "d")), ("v", "d"))
+
+    store.save_user_stats("ann", day1, 10, 5)
+    store.save_user_stats("ann", day1, 12, 3)
+    store.save_user_stats("bob", day2, 1, 1)
+    expect("user stats", [(r["user"], r["date"], r["straight"], r["slouch"]) for r in store.user_stats(day1)],
+           [("ann", day1, 12, 3)])
+
+    expect("prune", store.prune(day1), sum(1 for m in model if m["day"] == day2))
+    expect("after prune", sorted({storage.local_day(r["ts_us"] / 1e6) for r in store.scan(limit=None)}), [day1, day0])
+
+    # column batches across midnight: same ids, rows and counters as append()
+    last_id = max(r["id"] for r in store.scan(limit=None))
+    ts = np.array([_sample(base[3] - 60 - 1.5 + i * 0.5, 0.0, 0)[0] for i in range(6)], dtype=np.int64)
+    cols = {"ts_us": ts, "t": np.arange(6) * 0.5 + 200.0}
+    cols.update((k, np.arange(6) * (i + 1) - 3) for i, k in enumerate(storage.AXES))
+    store.append_columns(cols, {(day0, 11): {"slouch_time": 3}}, {"checkpoint": "cols"})
+    got = store.scan(start_ts=ts[0] / 1e6, end_ts=ts[-1] / 1e6, limit=None)
+    expect("append_columns ids", [r["id"] for r in got], list(range(last_id + 1, last_id + 7)))
+    expect("append_columns rows", [(r["ts_us"], r["t"], r["ax"], r["gz"]) for r in got],
+           [(int(ts[i]), 200.0 + i * 0.5, i - 3, 6 * i - 3) for i in range(6)])
+    expect("append_columns created_at", got[0]["created_at"], time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts[0] // 1_000_000)))
+    expect("append_columns days", [storage.local_day(r["ts_us"] / 1e6) for r in got], [day1] * 3 + [day0] * 3)
+    expect("append_columns counters", (store.counter("slouch_time", day0), store.get_meta("checkpoint")), (3, "cols"))
+
+    lo, hi = base[2], base[3] + 1.0
+    want = store.scan(start_ts=lo, end_ts=hi, limit=None)
+    win = store.window(lo, hi)
+    expect("window keys", sorted(win), sorted(("ts_us",) + storage.AXES))
+    expect("window rows", list(zip(*(win[k].tolist() for k in ("ts_us",) + storage.AXES))),
+           [tuple(r[k] for k in ("ts_us",) + storage.AXES) for r in want])
+    expect("empty window", len(store.window(base[0], base[0] + 1.0)["ts_us"]), 0)
+
+    # batches that fail part-way (a value no engine can store, in the second
+    # of two new days) must leave nothing behind: no rows, day, counter or meta
+    def state() -> tuple:
+        return ([r["id"] for r in store.scan(limit=None)], store.days(),
+                store.counter("straight_time", day0), store.get_meta("checkpoint"))
+
+    before = state()
+    next1, next2 = _day_start(-1) + 10, _day_start(-2) + 10
+    good = _sample(next1, 1.0, 1)
+    attempts = {
+        "append": lambda: store.append([good, _sample(next2, 2.0, 2)[:-1] + (object(),)],
+                                       {(day0, 12): {"straight_time": 5}}, {"checkpoint": "failed"}),
+        "append_columns": lambda: store.append_columns(
+            dict({k: np.array([v, v]) for k, v in zip(("t",) + storage.AXES[:-1], good[1:-1])},
+                 ts_us=np.array([good[0], _sample(next2, 2.0, 2)[0]]), gz=np.array([3, object()], dtype=object)),
+            {(day0, 12): {"straight_time": 5}}, {"checkpoint": "failed"}),
+    }
+    for what, attempt in attempts.items():
+        try:
+            attempt()
+            failures.append(f"failed {what}: did not raise")
+        except Exception:
+            pass
+        expect(f"failed {what} is rolled back", state(), before)
+    store.append([good])
+    expect("append to a day a failed batch created", [r["ts_us"] for r in store.scan(start_ts=next1 - 1, limit=None)], [good[0]])
+    return failures
+
+
+def _timed(fn: Callable[[], object], n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n
+
+
+def bench(store, storage, args: argparse.Namespace) -> Dict[str, str]:
+    rng = random.Random(0)
+    store.prune("9999-12-31")
+    start = _day_start(args.days - 1)
+    step = 1.0 / RATE_HZ
+    per_day = max(1, args.samples // args.days)
+    total = per_day * args.days
+    out: Dict[str, str] = {}
+
+    def samples():
+        i = 0
+        for d in range(args.days):
+            t0 = _day_start(args.days - 1 - d) + 8 * 3600
+            for k in range(per_day):
+                yield _sample(t0 + k * step, k * step, (i * 7) % 128)
+                i += 1
+
+    gen = samples()
+    appended = 0
+    elapsed = 0.0
+    while appended < total:
+        batch = [s for _, s in zip(range(args.batch), gen)]
+        counts = {(storage.local_day(batch[0][0] / 1e6), 8): {"slouch_time": len(batch) // 3, "straight_time": len(batch) - len(batch) // 3}}
+        t0 = time.perf_counter()
+        store.append(batch, counts, {"spool_checkpoint": str(appended)})
+        elapsed += time.perf_counter() - t0
+        appended += len(batch)
+    out["append/s"] = f"{appended / elapsed:,.0f}"
+
+    span = per_day * step
+    windows = [start + 8 * 3600 + rng.randrange(args.days) * 86400 + rng.random() * max(0.0, span - 60) for _ in range(50)]
+    it = iter(windows * 1000)
+    out["60s window ms"] = f"{_timed(lambda: store.scan(start_ts=(w := next(it)), end_ts=w + 60, limit=None), len(windows)) * 1e3:.2f}"
+
+    t0 = time.perf_counter()
+    after, n = 0, 0
+    while True:
+        page = store.scan(after_id=after, limit=5000)
+        if not page:
+            break
+        after = page[-1]["id"]
+        n += len(page)
+    out["sync rows/s"] = f"{n / (time.perf_counter() - t0):,.0f}"
+    out["latest us"] = f"{_timed(store.latest, 200) * 1e6:.0f}"
+    today = storage.local_day(time.time())
+    week_ago = storage.local_day(time.time() - 6 * 86400)
+    out["7d counters us"] = f"{_timed(lambda: store.counters(week_ago, today), 200) * 1e6:.0f}"
+    t0 = time.perf_counter()
+    store.prune(storage.local_day(start + (args.days // 2) * 86400 + 43200))
+    out["prune ms"] = f"{(time.perf_counter() - t0) * 1e3:.1f}"
+    return out
+
+
+def run_engine(args: argparse.Namespace) -> None:
+    """Child process: check and time one engine, print one result line."""
+    import ble_service
+    import storage
+
+    store = ble_service.ENGINES[args.engine]()
+    failures = check(store, storage)
+    for failure in failures:
+        print(f"  {args.engine}: FAIL {failure}", file=sys.stderr)
+    results = {"conformance": "FAIL" if failures else "pass"}
+    if not args.check_only:
+        results.update(bench(store, storage, args))
+    print(json.dumps(results))
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--engines", nargs="+", default=None, help="default: all in ble_service.ENGINES")
+    p.add_argument("--samples", type=int, default=300_000)
+    p.add_argument("--days", type=int, default=3)
+    p.add_argument("--batch", type=int, default=5000, help="samples per append (the spool writer's batch size)")
+    p.add_argument("--check-only", action="store_true")
+    p.add_argument("--engine", help=argparse.SUPPRESS)
+    args = p.parse_args()
+    if args.engine:
+        run_engine(args)
+        return
+
+    if args.engines is None:
+        import ble_service
+
+        args.engines = list(ble_service.ENGINES)
+    rows = {}
+    for engine in args.engines:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, BLE_DB_PATH=os.path.join(tmp, "bench.db"), BLE_STORAGE=engine, BLE_INGEST_MODE="local")
+            cmd = [sys.executable, __file__, "--engine", engine, "--samples", str(args.samples),
+                   "--days", str(args.days), "--batch", str(args.batch)] + (["--check-only"] if args.check_only else [])
+            proc = subprocess.run(cmd, env=env, stdout=subprocess.PIPE, text=True)
+            lines = proc.stdout.strip().splitlines()
+            rows[engine] = json.loads(lines[-1]) if proc.returncode == 0 and lines else {"conformance": "crashed"}
+    cols = list(dict.fromkeys(k for r in rows.values() for k in r))
+    print(f"{args.samples:,} samples over {args.days} days, batches of {args.batch}")
+    print(f"{'engine':<8}" + "".join(f" {c:>14}" for c in cols))
+    for engine, r in rows.items():
+        print(f"{engine:<8}" + "".join(f" {r.get(c, '-'):>14}" for c in cols))
+
+
+if __name__ == "__main__":
+    main()
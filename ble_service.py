@@ -1,10 +1,28 @@
 import asyncio
+import copy
+import heapq
+import json
+import math
 import os
+import random
 import sqlite3
 import threading
 import time
-from datetime import datetime, timedelta
-from typing import Dict, Any
+from array import array
+from collections import deque
+from itertools import chain, islice
+from typing import Callable, Dict, Any
+
+import numpy as np
+
+import alerts
+import compression
+import detectors
+import leaderboard
+import packets
+import spool
+import storage
+import tracing
 
 slouching = False
 
@@ -19,6 +37,13 @@ CHAR_UUID = "00002a58-0000-1000-8000-00805f9b34fb"
 # disable DB persistence (the service will still stream live samples).
 PERSIST_DATA = os.environ.get("BLE_PERSIST_DATA", "1") == "1"
 
+# Where BLE ingest runs. "local" (default): this process owns the BLE client
+# and the DB writer. "remote": a separate `python ingest.py` process does, and
+# this process only subscribes to its live samples through the broker socket
+# at BLE_BROKER. Use "remote" when running several web workers.
+INGEST_MODE = os.environ.get("BLE_INGEST_MODE", "local")
+BROKER_ADDR = os.environ.get("BLE_BROKER", "127.0.0.1:8765")
+
 # In-memory data_log is kept for compatibility but DB is the primary store when
 # persistence is enabled.
 data_log = {"t": [], "ax": [], "ay": [], "az": [], "gx": [], "gy": [], "gz": [], "pitch": []}
@@ -30,27 +55,231 @@ _db_lock = threading.Lock()
 _db_conn: sqlite3.Connection | None = None
 
 
+# Samples are stored in one table per local day (samples_YYYYMMDD), so that
+# retention is a DROP TABLE instead of a long DELETE. A `samples` view over all
+# partitions is kept for ad-hoc and offline readers; ids are global across
+# partitions and keep increasing. `sample_partitions` records each day.
+# `t` is seconds since the service started (it resets on restart); `ts_us`
+# is the sample's absolute time in integer epoch microseconds, indexed per
+# partition for time-window queries.
+SAMPLE_COLUMNS = "id, t, ax, ay, az, gx, gy, gz, pitch, created_at, ts_us"
+# SQLite caps compound SELECTs at 500 terms; the view only spans the newest days.
+_VIEW_MAX_PARTITIONS = 500
+_partitions: list[str] = []  # sorted local days ('YYYY-MM-DD') with a table
+_uncommitted_partitions: list[str] = []  # created in the open transaction
+_last_id = 0
+
+
+def _partition_table(day: str) -> str:
+    return "samples_" + day.replace("-", "")
+
+
+def _create_partition(conn: sqlite3.Connection, day: str) -> str:
+    table = _partition_table(day)
+    conn.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            t REAL,
+            ax INTEGER,
+            ay INTEGER,
+            az INTEGER,
+            gx INTEGER,
+            gy INTEGER,
+            gz INTEGER,
+            pitch REAL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            ts_us INTEGER
+        )
+        """
+    )
+    conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_ts ON {table}(ts_us)")
+    conn.execute(
+        "INSERT OR IGNORE INTO sample_partitions (day, table_name, first_id) VALUES (?, ?, ?)",
+        (day, table, _last_id + 1),
+    )
+    return table
+
+
+def _rebuild_samples_view(conn: sqlite3.Connection) -> None:
+    conn.execute("DROP VIEW IF EXISTS samples")
+    tables = [_partition_table(d) for d in _partitions[-_VIEW_MAX_PARTITIONS:]]
+    body = " UNION ALL ".join(f"SELECT {SAMPLE_COLUMNS} FROM {t}" for t in tables)
+    if not body:
+        # every partition pruned: an empty view with the same columns
+        body = "SELECT " + ", ".join(f"NULL AS {c}" for c in SAMPLE_COLUMNS.split(", ")) + " WHERE 0"
+    conn.execute(f"CREATE VIEW samples AS {body}")
+
+
+def _ensure_partition(conn: sqlite3.Connection, day: str) -> str:
+    """Return the partition table for `day`, creating it if needed.
+
+    Writers call this under `_db_lock` and commit or `_rollback()` it with
+    the rest of their batch: the DDL is part of the caller's transaction, so
+    a failed batch leaves no half-written day behind. A new partition means
+    the day rolled over, which is also when old counters are expired.
+    """
+    if day in _partitions:
+        return _partition_table(day)
+    # sqlite3 doesn't open a transaction for DDL by itself
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    table = _create_partition(conn, day)
+    _partitions.append(day)
+    _partitions.sort()
+    _uncommitted_partitions.append(day)
+    _rebuild_samples_view(conn)
+    # --- Optional cleanup: keep only the last COUNTER_KEEP_DAYS days of counters ---
+    conn.execute(f"DELETE FROM counters WHERE date < DATE('now', '-{storage.COUNTER_KEEP_DAYS} day', 'localtime')")
+    conn.execute(f"DELETE FROM hourly_counters WHERE date < DATE('now', '-{storage.COUNTER_KEEP_DAYS} day', 'localtime')")
+    return table
+
+
+def _commit(conn: sqlite3.Connection) -> None:
+    """Commit a batch that may have created partitions (`_db_lock` held)."""
+    conn.commit()
+    _uncommitted_partitions.clear()
+
+
+def _rollback(conn: sqlite3.Connection) -> None:
+    """Roll back a batch, forgetting the partitions it created (`_db_lock` held)."""
+    conn.rollback()
+    for day in _uncommitted_partitions:
+        if day in _partitions:
+            _partitions.remove(day)
+    _uncommitted_partitions.clear()
+
+
+def _drop_partition(conn: sqlite3.Connection, day: str) -> None:
+    """Drop a day partition (call with `_db_lock` held; caller commits)."""
+    conn.execute(f"DROP TABLE IF EXISTS {_partition_table(day)}")
+    conn.execute("DELETE FROM sample_partitions WHERE day = ?", (day,))
+    if day in _partitions:
+        _partitions.remove(day)
+    _rebuild_samples_view(conn)
+
+
+def _migrate_legacy_samples(conn: sqlite3.Connection) -> None:
+    """Move rows from the old single `samples` table into day partitions."""
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'samples'").fetchone()
+    if row is None:
+        return
+    day_expr = "COALESCE(DATE(created_at, 'localtime'), DATE('now', 'localtime'))"
+    days = [r[0] for r in conn.execute(f"SELECT DISTINCT {day_expr} FROM samples ORDER BY 1")]
+    legacy_columns = "id, t, ax, ay, az, gx, gy, gz, pitch, created_at"
+    for day in days:
+        table = _create_partition(conn, day)
+        conn.execute(f"INSERT INTO {table} ({legacy_columns}) SELECT {legacy_columns} FROM samples WHERE {day_expr} = ?", (day,))
+        conn.execute(f"UPDATE sample_partitions SET first_id = (SELECT MIN(id) FROM {table}) WHERE day = ?", (day,))
+        _backfill_ts_us(conn, table)
+    conn.execute("DROP TABLE samples")
+    print(f"Migrated legacy samples table into {len(days)} day partitions")
+
+
+def _backfill_ts_us(conn: sqlite3.Connection, table: str) -> int:
+    """Fill `ts_us` for rows written before it existed (caller commits).
+
+    Within one session (t increasing) the sample time is start + t for a
+    fixed start. `created_at` gives each row's time to the second, so every
+    row bounds start to a one-second window; the median of those windows'
+    centres is used for the whole session, keeping sub-second spacing and
+    order. Rows of sessions without any created_at stay NULL.
+    """
+    ids, ts, offsets = array("q"), array("d"), array("d")
+    updated = 0
+
+    def flush() -> int:
+        if not offsets:
+            return 0
+        start = sorted(offsets)[len(offsets) // 2] + 0.5
+        conn.executemany(
+            f"UPDATE {table} SET ts_us = ? WHERE id = ?",
+            ((int(round((start + t) * 1e6)), i) for i, t in zip(ids, ts)),
+        )
+        return len(ids)
+
+    prev_t = None
+    cur = conn.execute(f"SELECT id, t, CAST(strftime('%s', created_at) AS INTEGER) FROM {table} ORDER BY id")
+    for i, t, created in cur.fetchall():
+        if t is None:
+            continue
+        if prev_t is not None and t < prev_t:
+            updated += flush()
+            del ids[:], ts[:], offsets[:]
+        prev_t = t
+        ids.append(i)
+        ts.append(t)
+        if created is not None:
+            offsets.append(created - t)
+    return updated + flush()
+
+
+def _migrate_ts_us(conn: sqlite3.Connection) -> None:
+    """Add, backfill and index `ts_us` on partitions that predate it."""
+    migrated = 0
+    for day in _partitions:
+        table = _partition_table(day)
+        if any(r[1] == "ts_us" for r in conn.execute(f"PRAGMA table_info({table})")):
+            continue
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN ts_us INTEGER")
+        n = _backfill_ts_us(conn, table)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_ts ON {table}(ts_us)")
+        print(f"Backfilled absolute timestamps for {n} samples in {table}")
+        migrated += 1
+    if migrated:
+        _rebuild_samples_view(conn)
+
+
+def _partition_tables() -> list[str]:
+    """Snapshot of partition table names, oldest first.
+
+    In remote ingest mode another process creates and drops partitions, so the
+    list is re-read from the registry first.
+    """
+    if INGEST_MODE == "remote" and _db_conn is not None:
+        _partitions[:] = [r[0] for r in _db_conn.execute("SELECT day FROM sample_partitions ORDER BY day")]
+    return [_partition_table(d) for d in list(_partitions)]
+
+
+def _next_sample_id() -> int:
+    """Allocate the next global sample id (call with `_db_lock` held)."""
+    global _last_id
+    _last_id += 1
+    return _last_id
+
+
+def _next_sample_ids(n: int) -> range:
+    """Allocate `n` consecutive sample ids (call with `_db_lock` held)."""
+    global _last_id
+    _last_id += n
+    return range(_last_id - n + 1, _last_id + 1)
+
+
 def _open_db() -> sqlite3.Connection:
-    global _db_conn
+    global _db_conn, _last_id
     if _db_conn is not None:
         return _db_conn
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=10)
     conn.row_factory = sqlite3.Row
+    # WAL lets readers in other processes (web workers, offline jobs) run
+    # without blocking the ingest writer.
+    conn.execute("PRAGMA journal_mode=WAL")
     with conn:
-        # Samples table stores raw sensor samples
         conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS samples (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                t REAL,
-                ax INTEGER,
-                ay INTEGER,
-                az INTEGER,
-                gx INTEGER,
-                gy INTEGER,
-                gz INTEGER,
-                pitch REAL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            CREATE TABLE IF NOT EXISTS sample_partitions (
+            day TEXT PRIMARY KEY,
+            table_name TEXT NOT NULL,
+            first_id INTEGER NOT NULL
+            )
+            """
+        )
+        # Small key/value table for service bookkeeping (e.g. counters_epoch)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
             )
             """
         )
@@ -65,8 +294,54 @@ def _open_db() -> sqlite3.Connection:
             )
             """
         )
+        # Daily posture totals reported by friends' gateways (leaderboard)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS user_stats (
+            user TEXT NOT NULL,
+            date TEXT NOT NULL,
+            straight INTEGER NOT NULL DEFAULT 0,
+            slouch INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user, date)
+            )
+            """
+        )
+        # Hourly rollup of the same counters, for per-hour breakdowns
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS hourly_counters (
+            name TEXT NOT NULL,
+            date TEXT NOT NULL,
+            hour INTEGER NOT NULL,
+            value INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (name, date, hour)
+            )
+            """
+        )
+        if INGEST_MODE != "remote":
+            _migrate_legacy_samples(conn)
+
+        _partitions[:] = [r[0] for r in conn.execute("SELECT day FROM sample_partitions ORDER BY day")]
+        # Ids must never be reused, even if every partition was dropped. Bulk
+        # uploads put new ids into older days, so every partition is checked,
+        # and the high-water mark saved with each batch covers dropped days.
+        _last_id = conn.execute("SELECT COALESCE(MAX(first_id), 1) - 1 FROM sample_partitions").fetchone()[0]
+        saved = conn.execute("SELECT value FROM meta WHERE key = 'last_sample_id'").fetchone()
+        _last_id = max(_last_id, int(saved[0]) if saved else 0)
+        for day in _partitions:
+            newest = conn.execute(f"SELECT MAX(id) FROM {_partition_table(day)}").fetchone()[0]
+            _last_id = max(_last_id, newest or 0)
+        if INGEST_MODE != "remote":
+            _migrate_ts_us(conn)
         conn.commit()
     _db_conn = conn
+    if INGEST_MODE == "remote":
+        # the ingest process owns partition creation
+        return _db_conn
+    # Always have today's partition so the `samples` view is never empty.
+    with _db_lock:
+        _ensure_partition(conn, time.strftime("%Y-%m-%d"))
+        _commit(conn)
     return _db_conn
 
 
@@ -74,10 +349,41 @@ def persistence_enabled() -> bool:
     """Return True when persistent storage of samples is enabled."""
     return PERSIST_DATA
 
+# Name the local wearer appears under on the friends leaderboard.
+LOCAL_USER = os.environ.get("BLE_USER", "me")
+
 # Store the most recent sample for live access.
 last_sample: dict | None = None
 start_t = time.time()
 
+# Connection status of the BLE link (set by the runtime coroutine).
+_ble_connected = False
+_ble_device: str | None = None
+_ble_last_seen: float | None = None
+# The connected BleakClient, used to write feedback (vibration) to the device.
+_ble_client: Any = None
+
+# Reconnect tuning. After a disconnect a direct connect to the cached address
+# is tried first; if that fails, scan windows of SCAN_WINDOW_S are separated
+# by an exponential backoff between the MIN and MAX delays.
+DIRECT_CONNECT_TIMEOUT_S = 5.0
+SCAN_CONNECT_TIMEOUT_S = 10.0
+SCAN_WINDOW_S = 5.0
+SCAN_BACKOFF_MIN_S = 1.0
+SCAN_BACKOFF_MAX_S = 30.0
+
+# Last known address per device name (persisted in `meta` when enabled).
+_known_addresses: Dict[str, str] = {}
+
+# One entry per reconnect: how long the link took to come back (latency_s)
+# and how long the data stream was interrupted (gap_s, last sample before the
+# disconnect to first sample after it; None if none arrived).
+reconnect_events: deque = deque(maxlen=100)
+_disconnected_at: float | None = None
+_reconnect_pending: dict | None = None  # reconnected, waiting for the first sample
+# Called with each finished reconnect event (ingest.py forwards them).
+reconnect_callbacks: list[Callable[[dict], None]] = []
+
 # Internal control variables
 _stop_event: asyncio.Event | None = None
 _task: asyncio.Task | None = None
@@ -104,97 +410,495 @@ async def unregister_listener(q: asyncio.Queue) -> None:
         pass
 
 
-def handle_indication(_: Any, data: bytearray) -> None:
-    """Convert raw BLE bytes to signed values and append to data_log.
+def _cached_address(device_name: str) -> str | None:
+    address = _known_addresses.get(device_name)
+    if address is None and PERSIST_DATA:
+        address = get_meta("ble_address:" + device_name)
+        if address:
+            _known_addresses[device_name] = address
+    return address
 
-    This mirrors the logic in the provided client script, but doesn't do plotting.
-    """
-    global slouching
-    t = time.time() - start_t
-    vals = [int(x) - 128 for x in data]
-    # If the BLE payload ever changes size, ignore malformed payloads.
-    if len(vals) < 6:
-        return
-    ax, ay, az, gx, gy, gz = vals[:6]
-    # Prepare a lightweight sample payload for live streaming
-    sample = {
-        "t": t,
-        "ax": ax,
-        "ay": ay,
-        "az": az,
-        "gx": gx,
-        "gy": gy,
-        "gz": gz,
-    }
 
+def _remember_address(device_name: str, address: str | None) -> None:
+    if not address or _known_addresses.get(device_name) == address:
+        return
+    _known_addresses[device_name] = address
     if PERSIST_DATA:
         try:
-            conn = _open_db()
-            with _db_lock:
-                # store the raw sample
-                conn.execute(
-                    "INSERT INTO samples (t, ax, ay, az, gx, gy, gz) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                    (t, ax, ay, az, gx, gy, gz),
-                )
-                # If we detect transition into slouching, increment counter atomically
-                today = time.strftime("%Y-%m-%d")
-
-                # --- Slouching logic with per-day counters ---
-                if az > 64 and not slouching:
-                    slouching = True
-                    conn.execute(
-                        """
-                        INSERT INTO counters(name, date, value)
-                        VALUES ('slouch_frequency', ?, 1)
-                        ON CONFLICT(name, date)
-                        DO UPDATE SET value = value + 1
-                        """,
-                        (today,),
-                    )
-                elif az < 50 and slouching:
-                    slouching = False
-
-                # --- Time accumulation per posture state ---
-                if az > 64:
-                    conn.execute(
-                        """
-                        INSERT INTO counters(name, date, value)
-                        VALUES ('slouch_time', ?, 1)
-                        ON CONFLICT(name, date)
-                        DO UPDATE SET value = value + 1
-                        """,
-                        (today,),
-                    )
-                else:
-                    conn.execute(
-                        """
-                        INSERT INTO counters(name, date, value)
-                        VALUES ('straight_time', ?, 1)
-                        ON CONFLICT(name, date)
-                        DO UPDATE SET value = value + 1
-                        """,
-                        (today,),
+            store.set_meta("ble_address:" + device_name, address)
+        except Exception as exc:
+            print("Failed to store BLE device address in DB:", exc)
+
+
+def _close_reconnect_event(first_sample_at: float | None = None) -> None:
+    """Finish the pending reconnect event and hand it to the callbacks."""
+    global _reconnect_pending, _disconnected_at
+    event = _reconnect_pending
+    if event is None:
+        return
+    _reconnect_pending = None
+    _disconnected_at = None
+    last = event.pop("last_sample_at")
+    event["gap_s"] = round(first_sample_at - last, 3) if first_sample_at and last else None
+    reconnect_events.append(event)
+    for callback in list(reconnect_callbacks):
+        callback(event)
+
+
+def reconnect_stats() -> Dict[str, Any]:
+    """Recent reconnect events plus median/max latency and gap."""
+    events = list(reconnect_events)
+    out: Dict[str, Any] = {"count": len(events), "events": events}
+    for key in ("latency_s", "gap_s"):
+        values = sorted(e[key] for e in events if e.get(key) is not None)
+        if values:
+            out[key] = {"p50": values[len(values) // 2], "max": values[-1]}
+    return out
+
+
+def _add_counters(conn: sqlite3.Connection, date: str, hour: int | None = None, **increments: int) -> None:
+    """Add the given increments to the named per-day counters (caller commits).
+
+    When `hour` is given the hourly rollup is updated as well.
+    """
+    for name, value in increments.items():
+        if not value:
+            continue
+        conn.execute(
+            """
+            INSERT INTO counters(name, date, value)
+            VALUES (?, ?, ?)
+            ON CONFLICT(name, date)
+            DO UPDATE SET value = value + excluded.value
+            """,
+            (name, date, value),
+        )
+        if hour is not None:
+            conn.execute(
+                """
+                INSERT INTO hourly_counters(name, date, hour, value)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(name, date, hour)
+                DO UPDATE SET value = value + excluded.value
+                """,
+                (name, date, hour, value),
+            )
+
+
+# Rows per INSERT in bulk appends; 10 parameters each keeps a statement under
+# the 999-parameter limit of older SQLite builds.
+_INSERT_ROWS = 99
+_ROW_PARAMS = "(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+
+
+class SQLiteStorage(storage.Storage):
+    """The day-partitioned SQLite file at DB_PATH (the module state above).
+
+    Offline tools (archive.py, rescore.py) work on the same file through
+    `_open_db()` and the partition helpers directly.
+    """
+
+    name = "sqlite"
+
+    def __init__(self) -> None:
+        self._splitter = storage.DaySplitter()
+        self._created_s = -1
+        self._created = ""
+
+    def _created_at(self, ts_us: int) -> str:
+        # arrival time to the second, as CURRENT_TIMESTAMP would store it
+        sec = ts_us // 1_000_000
+        if sec != self._created_s:
+            self._created_s = sec
+            self._created = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(sec))
+        return self._created
+
+    def append(self, samples, counts=None, meta=None) -> None:
+        conn = _open_db()
+        with _db_lock:
+            try:
+                for day, rows in self._splitter.split(samples).items():
+                    table = _ensure_partition(conn, day)
+                    conn.executemany(
+                        f"INSERT INTO {table} (id, t, ax, ay, az, gx, gy, gz, created_at, ts_us) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(_next_sample_id(),) + r[1:] + (self._created_at(r[0]), r[0]) for r in rows],
                     )
+                self._finish(conn, counts, meta)
+            except Exception:
+                # ids handed out here are simply skipped; they are never reused
+                _rollback(conn)
+                raise
 
-                # --- Optional cleanup: keep only last 30 days of data ---
-                conn.execute(
-                    """
-                    DELETE FROM counters
-                    WHERE date < DATE('now', '-30 day', 'localtime')
-                    """
+    def append_columns(self, cols, counts=None, meta=None) -> None:
+        conn = _open_db()
+        ts = cols["ts_us"]
+        # created_at only has seconds: format each distinct second once
+        secs, first = np.unique(ts // 1_000_000, return_index=True)
+        stamps = np.repeat(
+            [time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(s)) for s in secs.tolist()],
+            np.diff(np.append(first, len(ts))),
+        ).tolist()
+        columns = [cols["t"].tolist()] + [cols[k].tolist() for k in storage.AXES] + [stamps, ts.tolist()]
+        with _db_lock:
+            try:
+                for day, a, b in self._splitter.ranges(ts):
+                    table = _ensure_partition(conn, day)
+                    insert = f"INSERT INTO {table} (id, t, ax, ay, az, gx, gy, gz, created_at, ts_us) VALUES "
+                    rows = list(zip(_next_sample_ids(b - a), *(c[a:b] for c in columns)))
+                    # multi-row VALUES: far fewer statement executions than executemany
+                    full = len(rows) - len(rows) % _INSERT_ROWS
+                    many = insert + ", ".join([_ROW_PARAMS] * _INSERT_ROWS)
+                    for i in range(0, full, _INSERT_ROWS):
+                        conn.execute(many, list(chain.from_iterable(rows[i:i + _INSERT_ROWS])))
+                    conn.executemany(insert + _ROW_PARAMS, rows[full:])
+                self._finish(conn, counts, meta)
+            except Exception:
+                _rollback(conn)
+                raise
+
+    @staticmethod
+    def _finish(conn: sqlite3.Connection, counts, meta) -> None:
+        """Add counters and meta to the open batch and commit it all."""
+        for (date, hour), increments in (counts or {}).items():
+            _add_counters(conn, date, hour, **increments)
+        for key, value in (meta or {}).items():
+            _set_meta(conn, key, value)
+        _set_meta(conn, "last_sample_id", str(_last_id))
+        _commit(conn)
+
+    def scan(self, start_ts=None, end_ts=None, after_id=None, start_t=None, end_t=None, limit=100, offset=0) -> list:
+        conn = _open_db()
+        params: list = []
+        clauses: list = []
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        if start_t is not None:
+            clauses.append("t >= ?")
+            params.append(start_t)
+        if end_t is not None:
+            clauses.append("t <= ?")
+            params.append(end_t)
+        tables = _partition_tables()
+        order = "id ASC"
+        if start_ts is not None or end_ts is not None:
+            order = "ts_us ASC, id ASC"
+            # partitions are local days of the sample time
+            if start_ts is not None:
+                clauses.append("ts_us >= ?")
+                params.append(math.ceil(start_ts * 1e6))
+                first = _partition_table(storage.local_day(start_ts))
+                tables = [t for t in tables if t >= first]
+            if end_ts is not None:
+                clauses.append("ts_us <= ?")
+                params.append(math.floor(end_ts * 1e6))
+                last = _partition_table(storage.local_day(end_ts))
+                tables = [t for t in tables if t <= last]
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        if after_id is not None and order == "id ASC":
+            return self._scan_by_id(conn, tables, where, params, limit, offset)
+        out: list = []
+        for table in tables:
+            if limit is not None and len(out) >= limit:
+                break
+            try:
+                if offset:
+                    # skip whole partitions that fall entirely inside the offset
+                    n = conn.execute(f"SELECT COUNT(*) FROM {table}{where}", params).fetchone()[0]
+                    if n <= offset:
+                        offset -= n
+                        continue
+                cur = conn.execute(
+                    f"SELECT {SAMPLE_COLUMNS} FROM {table}{where} ORDER BY {order} LIMIT ? OFFSET ?",
+                    params + [-1 if limit is None else limit - len(out), offset],
                 )
-                    
-                conn.commit()
+            except sqlite3.OperationalError:
+                # partition dropped by retention while we were reading
+                continue
+            offset = 0
+            out.extend(dict(r) for r in cur.fetchall())
+        return out
+
+    @staticmethod
+    def _scan_by_id(conn: sqlite3.Connection, tables: list, where: str, params: list, limit, offset: int) -> list:
+        """Rows of every partition merged into id order.
+
+        Bulk uploads give older days ids above newer days' rows, so walking
+        the partitions in day order would not be id order.
+        """
+        n = -1 if limit is None else limit + offset
+        runs = []
+        for table in tables:
+            try:
+                # a primary-key seek; partitions with nothing past after_id return at once
+                cur = conn.execute(f"SELECT {SAMPLE_COLUMNS} FROM {table}{where} ORDER BY id LIMIT ?", params + [n])
+            except sqlite3.OperationalError:
+                # partition dropped by retention while we were reading
+                continue
+            rows = cur.fetchall()
+            if rows:
+                runs.append(rows)
+        merged = heapq.merge(*runs, key=lambda r: r["id"])
+        return [dict(r) for r in islice(merged, offset, None if limit is None else limit + offset)]
 
-        except Exception as exc:
-            print("Failed to write sample or update slouch frequency in DB:", exc)
+    def window(self, start_ts: float, end_ts: float, fields=storage.WINDOW_FIELDS) -> dict:
+        conn = _open_db()
+        first = _partition_table(storage.local_day(start_ts))
+        last = _partition_table(storage.local_day(end_ts))
+        bounds = (math.ceil(start_ts * 1e6), math.floor(end_ts * 1e6))
+        cur = conn.cursor()
+        cur.row_factory = None  # plain tuples straight into numpy
+        rows: list = []
+        for table in _partition_tables():
+            if not first <= table <= last:
+                continue
+            try:
+                # a range seek on the partition's ts_us index (which alone covers ts_us)
+                rows += cur.execute(
+                    f"SELECT {', '.join(fields)} FROM {table} WHERE ts_us BETWEEN ? AND ? ORDER BY ts_us, id", bounds
+                ).fetchall()
+            except sqlite3.OperationalError:
+                continue
+        arr = np.array(rows, dtype=np.int64).reshape(-1, len(fields))
+        return {k: arr[:, i] for i, k in enumerate(fields)}
+
+    def latest(self) -> dict | None:
+        conn = _open_db()
+        # newest partition first; it may still be empty right after midnight
+        for table in reversed(_partition_tables()):
+            row = conn.execute(f"SELECT {SAMPLE_COLUMNS} FROM {table} ORDER BY id DESC LIMIT 1").fetchone()
+            if row is not None:
+                return dict(row)
+        return None
+
+    def days(self) -> list:
+        conn = _open_db()
+        _partition_tables()  # refresh the partition list in remote mode
+        out = []
+        for day in list(_partitions):
+            try:
+                row = conn.execute(f"SELECT MAX(id) FROM {_partition_table(day)}").fetchone()
+            except sqlite3.OperationalError:
+                continue
+            out.append((day, row[0]))
+        return out
+
+    def prune(self, before_day: str) -> int:
+        # a DROP TABLE per day instead of a long DELETE
+        conn = _open_db()
+        deleted = 0
+        with _db_lock:
+            for day in [d for d in _partitions if d < before_day]:
+                deleted += conn.execute(f"SELECT COUNT(*) FROM {_partition_table(day)}").fetchone()[0]
+                _drop_partition(conn, day)
+            conn.commit()
+        return deleted
+
+    def counter(self, name: str, date: str) -> int:
+        row = _open_db().execute("SELECT value FROM counters WHERE name = ? AND date = ?", (name, date)).fetchone()
+        return 0 if row is None else int(row["value"])
+
+    def set_counter(self, name: str, date: str, value: int) -> None:
+        conn = _open_db()
+        with _db_lock:
+            conn.execute(
+                """
+                INSERT INTO counters(name, date, value)
+                VALUES (?, ?, ?)
+                ON CONFLICT(name, date)
+                DO UPDATE SET value = excluded.value
+                """,
+                (name, date, value),
+            )
+            conn.commit()
 
+    def counters(self, start: str, end: str, hourly: bool = False) -> list:
+        table = "hourly_counters" if hourly else "counters"
+        cols = "name, date, hour, value" if hourly else "name, date, value"
+        cur = _open_db().execute(f"SELECT {cols} FROM {table} WHERE date BETWEEN ? AND ? ORDER BY date", (start, end))
+        return [dict(r) for r in cur.fetchall()]
 
+    def save_user_stats(self, user: str, date: str, straight: int, slouch: int) -> None:
+        conn = _open_db()
+        with _db_lock:
+            conn.execute(
+                """
+                INSERT INTO user_stats(user, date, straight, slouch)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(user, date)
+                DO UPDATE SET straight = excluded.straight, slouch = excluded.slouch
+                """,
+                (user, date, straight, slouch),
+            )
+            conn.commit()
+
+    def user_stats(self, since: str) -> list:
+        cur = _open_db().execute(
+            "SELECT user, date, straight, slouch FROM user_stats WHERE date >= ? ORDER BY date", (since,)
+        )
+        return [dict(r) for r in cur.fetchall()]
+
+    def get_meta(self, key: str, default: str | None = None) -> str | None:
+        row = _open_db().execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key: str, value: str) -> None:
+        conn = _open_db()
+        with _db_lock:
+            _set_meta(conn, key, value)
+            conn.commit()
+
+    def data_version(self) -> int:
+        # PRAGMA data_version only moves for other connections' commits
+        return _open_db().execute("PRAGMA data_version").fetchone()[0]
+
+
+def _set_meta(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        "INSERT INTO meta(key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
+# Storage engine (see storage.py): "sqlite" (default) or "memory", which
+# keeps everything in this process and loses it on restart. The memory
+# engine can't be shared with an ingest process, so remote mode needs sqlite.
+ENGINES: Dict[str, Callable[[], storage.Storage]] = {
+    SQLiteStorage.name: SQLiteStorage,
+    storage.MemoryStorage.name: storage.MemoryStorage,
+}
+STORAGE_ENGINE = os.environ.get("BLE_STORAGE", SQLiteStorage.name)
+if STORAGE_ENGINE not in ENGINES or (INGEST_MODE == "remote" and STORAGE_ENGINE != SQLiteStorage.name):
+    print(f"Storage engine '{STORAGE_ENGINE}' is unknown or unavailable in {INGEST_MODE} ingest mode; using sqlite")
+    STORAGE_ENGINE = SQLiteStorage.name
+store: storage.Storage = ENGINES[STORAGE_ENGINE]()
+
+
+# In-memory copy of the newest days' counters for the dashboard. This
+# process's own writes are applied to it as they happen; writes by other
+# processes (the ingest process in remote mode, rescore.py) change the
+# store's data_version, which makes the next read reload it.
+COUNTER_CACHE_DAYS = 7
+_counter_cache: Dict[str, Dict[str, int]] | None = None  # date -> name -> value
+_active_hours: Dict[str, set] = {}  # date -> hours with counted samples
+_counter_cache_data_version: int | None = None
+_counter_cache_version = 0
+# Held across a counter write and its cache update, so a reload can't
+# slip in between and count the write twice.
+_counter_cache_lock = threading.Lock()
+
+
+def _counter_cache_since() -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(time.time() - (COUNTER_CACHE_DAYS - 1) * 86400))
+
+
+def _load_counter_cache() -> None:
+    """(Re)read the cached days from the store (`_counter_cache_lock` held)."""
+    global _counter_cache, _counter_cache_data_version, _counter_cache_version
+    # read the version first: a commit racing the load just means another reload
+    _counter_cache_data_version = store.data_version()
+    since = _counter_cache_since()
+    days: Dict[str, Dict[str, int]] = {}
+    for r in store.counters(since, "9999-12-31"):
+        days.setdefault(r["date"], {})[r["name"]] = r["value"]
+    _active_hours.clear()
+    for r in store.counters(since, "9999-12-31", hourly=True):
+        if r["name"] in ("slouch_time", "straight_time") and r["value"] > 0:
+            _active_hours.setdefault(r["date"], set()).add(r["hour"])
+    _counter_cache = days
+    _counter_cache_version += 1
+
+
+def _cache_counter_increments(counts: storage.Counts) -> None:
+    """Apply stored (day, hour) increments to the cache (`_counter_cache_lock` held)."""
+    global _counter_cache_version
+    if _counter_cache is None or not counts:
+        return
+    for (day, hour), increments in counts.items():
+        totals = _counter_cache.setdefault(day, {})
+        for name, value in increments.items():
+            if value:
+                totals[name] = totals.get(name, 0) + value
+        if increments.get("slouch_time") or increments.get("straight_time"):
+            _active_hours.setdefault(day, set()).add(hour)
+    since = _counter_cache_since()
+    for day in [d for d in _counter_cache if d < since]:
+        del _counter_cache[day]
+        _active_hours.pop(day, None)
+    _counter_cache_version += 1
+
+
+def recent_counters() -> Dict[str, Any]:
+    """Counters of the last COUNTER_CACHE_DAYS days, from memory.
+
+    Returns {"version", "rows", "active_hours"}: `rows` has the shape of
+    get_counter_range() rows, `active_hours` maps a date to the number of
+    hours with counted samples, and `version` changes whenever either does.
+    The store is only asked for its data_version unless another process wrote.
+    """
+    if not PERSIST_DATA:
+        return {"version": 0, "rows": [], "active_hours": {}}
+    try:
+        with _counter_cache_lock:
+            if _counter_cache is None or store.data_version() != _counter_cache_data_version:
+                _load_counter_cache()
+            since = _counter_cache_since()
+            return {
+                "version": _counter_cache_version,
+                "rows": [
+                    {"name": name, "date": day, "value": value}
+                    for day, totals in sorted(_counter_cache.items())
+                    if day >= since
+                    for name, value in totals.items()
+                ],
+                "active_hours": {day: len(hours) for day, hours in _active_hours.items() if day >= since},
+            }
+    except Exception as exc:
+        print("Failed to read counters from DB:", exc)
+        return {"version": 0, "rows": [], "active_hours": {}}
+
+
+# Slouch detector selection. BLE_DETECTOR picks the default detector; a
+# different one can be chosen per device with set_detector(). Detector
+# instances hold latched state, so there is one per device.
+DEFAULT_DETECTOR = os.environ.get("BLE_DETECTOR", detectors.DEFAULT_DETECTOR)
+_detector_names: Dict[str, str] = {}
+_detectors: Dict[str | None, detectors.Detector] = {}
+
+
+def set_detector(name: str, device_name: str | None = None) -> None:
+    """Select the slouch detector for a device (or the default when None).
+
+    Raises KeyError if `name` is not a known detector.
+    """
+    global DEFAULT_DETECTOR
+    if name not in detectors.DETECTORS:
+        raise KeyError(name)
+    if INGEST_MODE == "remote":
+        _send_command({"cmd": "set_detector", "detector": name, "device_name": device_name})
+    if device_name is None:
+        DEFAULT_DETECTOR = name
+        _detectors.clear()
+    else:
+        _detector_names[device_name] = name
+        _detectors.pop(device_name, None)
+
+
+def get_detector_for(device_name: str | None) -> detectors.Detector:
+    """Return the (stateful) detector instance used for `device_name`."""
+    det = _detectors.get(device_name)
+    if det is None:
+        det = detectors.get_detector(_detector_names.get(device_name or "", DEFAULT_DETECTOR))
+        _detectors[device_name] = det
+    return det
+
+
+def _publish(sample: dict) -> None:
+    """Record `sample` as the latest one and fan it out to live listeners."""
     # Update the last seen sample (always keep this for live retrieval).
-    global last_sample
+    global last_sample, _ble_last_seen
     last_sample = sample
     # update last-seen timestamp for connection status
-    global _ble_last_seen
     _ble_last_seen = time.time()
 
     # Dispatch to any registered asyncio listeners (non-blocking)
@@ -206,6 +910,411 @@ def handle_indication(_: Any, data: bytearray) -> None:
             pass
 
 
+# Write-ahead spool (see spool.py). Ingest appends each sample to a
+# memory-mapped log and a writer thread moves batches into SQLite, recording
+# how far it got in `meta` in the same transaction. A locked DB or a full disk
+# only delays the writer; unconsumed records are replayed after a restart.
+SPOOL_PATH = os.environ.get("BLE_SPOOL_PATH") or DB_PATH + ".spool"
+
+# Optional bounded-error compression of stored samples (see compression.py).
+# BLE_COMPRESS_TOL is a tolerance in sample units, one for all axes or six
+# comma-separated (ax,ay,az,gx,gy,gz); unset or 0 stores every sample.
+# Counters are computed from every sample either way. Tools that re-derive
+# counters from stored samples (rescore.py) need compression off.
+COMPRESS_TOLERANCE = compression.parse_tolerance(os.environ.get("BLE_COMPRESS_TOL"))
+COMPRESS_MAX_INTERVAL_S = float(os.environ.get("BLE_COMPRESS_MAX_INTERVAL", "10"))
+_compressor = (
+    compression.SwingingDoor(COMPRESS_TOLERANCE, COMPRESS_MAX_INTERVAL_S) if COMPRESS_TOLERANCE else None
+)
+SPOOL_BATCH = 5000
+# Once caught up, the writer stores the compressor's pending point anyway
+# (and so can rewind the spool) after this many records of one session.
+SPOOL_FLUSH_RECORDS = 65536
+_spool: spool.Spool | None = None
+_spool_lock = threading.Lock()
+_spool_wakeup = threading.Event()
+# set when a session ends: the writer stores the compressor's pending point
+_session_ended = threading.Event()
+# (generation, offset) of the spool records already committed to the DB
+_spool_checkpoint: tuple[int, int] | None = None
+
+
+def _get_spool() -> spool.Spool:
+    """Open the spool and start its DB writer thread on first use."""
+    global _spool
+    if _spool is None:
+        with _spool_lock:
+            if _spool is None:
+                sp = spool.Spool(SPOOL_PATH)
+                threading.Thread(target=_spool_writer, args=(sp,), name="spool-writer", daemon=True).start()
+                _spool = sp
+    _spool_wakeup.set()
+    return _spool
+
+
+def _persist_spooled(recs: np.ndarray, gen: int, start: int, counted: int = 0, flush: bool = False) -> None:
+    """Store spooled records from offset `start` of generation `gen`, and
+    their counter increments, in one batch.
+
+    Records before offset `counted` were counted already (a replay from the
+    compressor's pending record). With `flush`, the compressor's pending
+    point is stored too. The checkpoint saved with the batch stops at the
+    pending record, which is only in memory until a later batch stores it;
+    its third field is where counting resumes after a crash.
+    """
+    global _compressor
+    samples: list = []
+    counts: storage.Counts = {}
+    compressor = _compressor
+    if compressor is not None:
+        # roll the compressor back too if this batch fails
+        saved = copy.deepcopy(compressor)
+    for i, (wall, t, ax, ay, az, gx, gy, gz, flags, _pad) in enumerate(recs.tolist(), start):
+        # ts_us (and created_at) is the arrival time, not the (possibly much later) write
+        sample = (int(round(wall * 1e6)), t, ax, ay, az, gx, gy, gz)
+        if compressor is None:
+            samples.append(sample)
+        else:
+            # only the points needed to interpolate within tolerance
+            samples.extend(s for _, s in compressor.feed(t, (ax, ay, az, gx, gy, gz), (i, sample)))
+        # counters always see every sample
+        if flags & spool.COUNTED and i >= counted:
+            local = time.localtime(wall)
+            key = (time.strftime("%Y-%m-%d", local), local.tm_hour)
+            c = counts.get(key)
+            if c is None:
+                c = counts[key] = dict.fromkeys(storage.COUNTER_NAMES, 0)
+            c["slouch_frequency"] += 1 if flags & spool.TRANSITION else 0
+            c["slouch_time"] += 1 if flags & spool.OVER else 0
+            c["straight_time"] += 0 if flags & spool.OVER else 1
+            c["slouch_alerts"] += 1 if flags & spool.ALERT else 0
+    if flush and compressor is not None:
+        samples.extend(s for _, s in compressor.flush())
+    end = start + len(recs)
+    pending = compressor.pending if compressor is not None else None
+    checkpoint = "%d:%d" % (gen, end) if pending is None else "%d:%d:%d" % (gen, pending[0], max(end, counted))
+    with _counter_cache_lock:
+        try:
+            store.append(samples, counts, {"spool_checkpoint": checkpoint})
+        except Exception:
+            if compressor is not None:
+                _compressor = saved
+            raise
+        _cache_counter_increments(counts)
+
+
+def _spool_writer(sp: spool.Spool) -> None:
+    """Drain the spool into the store forever, backing off while it fails."""
+    global _spool_checkpoint
+    backoff = 0.5
+    counted = 0
+    while True:
+        try:
+            if _spool_checkpoint is None:
+                saved = store.get_meta("spool_checkpoint")
+                gen, pos, *rest = (int(v) for v in saved.split(":")) if saved else (sp.generation, 0)
+                # a different generation means the spool restarted since
+                if gen != sp.generation:
+                    gen, pos, rest = sp.generation, 0, []
+                # replay from the compressor's pending record, counting only what wasn't
+                counted = rest[0] if rest else 0
+                if saved and pos < sp.write_pos:
+                    print(f"Replaying {sp.write_pos - pos} spooled samples into the DB")
+                _spool_checkpoint = (gen, pos)
+            gen, pos = _spool_checkpoint
+            _spool_wakeup.clear()
+            recs = sp.read(pos, SPOOL_BATCH)
+            if len(recs):
+                _persist_spooled(recs, gen, pos, counted)
+                _spool_checkpoint = (gen, pos + len(recs))
+                tracing.committed(gen, pos + len(recs))
+                backoff = 0.5
+                continue
+            # caught up: the pending point goes in once its session is over,
+            # or when it is all that keeps a long session's spool from rewinding
+            ended = _session_ended.is_set()
+            if _compressor is not None and _compressor.pending is not None and (ended or pos >= SPOOL_FLUSH_RECORDS):
+                _persist_spooled(recs, gen, pos, flush=True)
+            if ended:
+                _session_ended.clear()
+            # start the spool over so the file stays small
+            if (_compressor is None or _compressor.pending is None) and sp.rewind_if_consumed(pos):
+                _spool_checkpoint = (sp.generation, 0)
+                counted = 0
+        except Exception as exc:
+            print(f"Spool writer could not write to the DB ({exc}); retrying in {backoff:.1f}s")
+            # the backlog now lives only in the spool; make it durable
+            sp.flush()
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30.0)
+            continue
+        _spool_wakeup.wait(1.0)
+
+
+def _end_session() -> None:
+    """Have the spool writer store the compressor's pending point."""
+    if _compressor is not None and _spool is not None:
+        _session_ended.set()
+        _spool_wakeup.set()
+
+
+def flush_spool(timeout: float = 5.0) -> bool:
+    """Wait until every spooled sample is in the DB; False on timeout."""
+    deadline = time.time() + timeout
+    while _spool is not None:
+        checkpoint = _spool_checkpoint
+        if checkpoint is not None and checkpoint[0] == _spool.generation and checkpoint[1] >= _spool.write_pos:
+            return True
+        if time.time() >= deadline:
+            return False
+        _spool_wakeup.set()
+        time.sleep(0.01)
+    return True
+
+
+# Bulk uploads (POST /ingest/bulk): samples the device buffered while out of
+# range. Stored samples form runs wherever consecutive ones are at most
+# BULK_RUN_GAP_S apart (more with compression on, which stores sparse
+# points); uploaded samples inside a run, widened by BULK_SLACK_S for clock
+# mapping jitter (at most half the upload's sample interval, so a seamless
+# continuation isn't clipped), are already stored and dropped.
+BULK_RUN_GAP_S = 1.0
+BULK_SLACK_S = 0.05
+_HOUR_US = 3_600_000_000
+
+
+class ArchivedDay(Exception):
+    """A bulk upload reaches a day that was archived and dropped from the DB."""
+
+
+def _local_hour_start(ts: float) -> int:
+    """Epoch seconds at the start of the local hour containing `ts`."""
+    lt = time.localtime(ts)
+    return int(ts) - lt.tm_min * 60 - lt.tm_sec
+
+
+def _stored_runs_mask(ts_us: np.ndarray, stored_us: np.ndarray, gap_us: int, slack_us: int) -> np.ndarray:
+    """Which of `ts_us` fall inside the runs of `stored_us` (sorted)."""
+    if not stored_us.size:
+        return np.zeros(ts_us.size, dtype=bool)
+    breaks = np.flatnonzero(np.diff(stored_us) > gap_us)
+    starts = stored_us[np.concatenate(([0], breaks + 1))] - slack_us
+    ends = stored_us[np.concatenate((breaks, [stored_us.size - 1]))] + slack_us
+    run = np.searchsorted(starts, ts_us, "right") - 1
+    return (run >= 0) & (ts_us <= ends[np.maximum(run, 0)])
+
+
+def ingest_bulk(ts_us: np.ndarray, vals: np.ndarray) -> Dict[str, Any]:
+    """Store a bulk upload and recount the local hours it covers.
+
+    `ts_us` is epoch microseconds and `vals` (N, 6) in AXES order, as
+    packets.decode_bulk returns them. Samples repeated within the upload or
+    already stored are dropped. The rest are written in one append together
+    with the counter changes: every stored sample of the hours the upload
+    spans (duplicates included, so a retry also repairs hours an earlier
+    attempt already wrote) is run through the detector again and each of
+    those hours' slouch_frequency, slouch_time and straight_time (hourly
+    and daily) move to the recount.
+    slouch_alerts stay as they are, since alerts only fire live. With
+    compression on the stored samples are too sparse to recount, so the new
+    samples' counts are added instead. Past days change, so counters_epoch
+    is bumped in the same append.
+
+    Raises ArchivedDay, storing nothing, if the upload reaches a day whose
+    partition archive.py already archived and dropped: those rows can be
+    neither deduplicated nor recounted. A day that is archived but still in
+    the DB takes the upload; the next archive run writes it out again.
+
+    Returns {"received", "duplicates", "stored", "start_ts", "end_ts", "hours"}.
+    """
+    received = int(ts_us.size)
+    out: Dict[str, Any] = {"received": received, "duplicates": 0, "stored": 0, "start_ts": None, "end_ts": None, "hours": 0}
+    if not received:
+        return out
+    order = np.argsort(ts_us, kind="stable")
+    ts_us, vals = ts_us[order], vals[order]
+    if store.name == SQLiteStorage.name:
+        import archive
+
+        present = {day for day, _ in store.days()}
+        for day, _, _ in storage.DaySplitter().ranges(ts_us):
+            if day not in present and archive.is_archived(day):
+                raise ArchivedDay(f"{day} is archived and no longer in the DB")
+    keep = np.ones(received, dtype=bool)
+    keep[1:] = np.diff(ts_us) > 0
+    # the recounted period: whole local hours around the entire upload
+    lo = _local_hour_start(ts_us[0] / 1e6)
+    hi = _local_hour_start(ts_us[-1] / 1e6) + 3600
+    lo_us = lo * 1_000_000
+    touched = np.unique((ts_us - lo_us) // _HOUR_US).tolist()
+
+    gap_s = max(BULK_RUN_GAP_S, COMPRESS_MAX_INTERVAL_S) if _compressor is not None else BULK_RUN_GAP_S
+    slack_us = int(BULK_SLACK_S * 1e6)
+    if received > 1:
+        slack_us = min(slack_us, int(np.median(np.diff(ts_us))) // 2)
+    # samples still in the spool count as stored
+    flush_spool()
+    with _counter_cache_lock:
+        # timestamps only (the ts_us index covers them), from a run's length
+        # before the upload so runs that start earlier are whole
+        stored = store.window(ts_us[0] / 1e6 - gap_s, ts_us[-1] / 1e6 + gap_s, ("ts_us",))
+        keep &= ~_stored_runs_mask(ts_us, stored["ts_us"], int(gap_s * 1e6), slack_us)
+        ts_us, vals = ts_us[keep], vals[keep]
+        out["duplicates"] = received - int(ts_us.size)
+        if not ts_us.size:
+            return out
+
+        # detection over the recounted period, in time order, starting straight
+        if _compressor is None:
+            stored = store.window(lo, hi - 1e-6, ("ts_us", "ax", "ay", "az"))
+            ts_all = np.concatenate((stored["ts_us"], ts_us))
+            az_all = np.concatenate((stored["az"], vals[:, 2]))
+            by_time = np.argsort(ts_all, kind="stable")
+            ts_all = ts_all[by_time]
+            batch = {"az": az_all[by_time]}
+            for i, k in ((0, "ax"), (1, "ay")):
+                batch[k] = np.concatenate((stored[k], vals[:, i]))[by_time]
+        else:
+            ts_all = ts_us
+            batch = {"ax": vals[:, 0], "ay": vals[:, 1], "az": vals[:, 2]}
+        det = detectors.get_detector(_detector_names.get(_ble_device or "", DEFAULT_DETECTOR)).detect(batch)
+        rising = det.state & ~np.concatenate(([False], det.state[:-1]))
+        hour = (ts_all - lo_us) // _HOUR_US
+        n_hours = (hi - lo) // 3600
+        total = np.bincount(hour, minlength=n_hours)
+        slouch = np.bincount(hour, weights=det.over, minlength=n_hours)
+        freq = np.bincount(hour, weights=rising, minlength=n_hours)
+
+        keys = {}
+        for h in touched:
+            local = time.localtime(lo + h * 3600)
+            keys[h] = (time.strftime("%Y-%m-%d", local), local.tm_hour)
+        previous: Dict[tuple, Dict[str, int]] = {}
+        if _compressor is None:
+            for day in sorted({d for d, _ in keys.values()}):
+                for r in store.counters(day, day, hourly=True):
+                    previous.setdefault((r["date"], r["hour"]), {})[r["name"]] = r["value"]
+        counts: storage.Counts = {}
+        for h, key in keys.items():
+            recount = {
+                "slouch_frequency": int(freq[h]),
+                "slouch_time": int(slouch[h]),
+                "straight_time": int(total[h] - slouch[h]),
+            }
+            before = previous.get(key, {})
+            counts[key] = {name: value - before.get(name, 0) for name, value in recount.items()}
+
+        epoch = int(store.get_meta("counters_epoch", "0")) + 1
+        cols = {"ts_us": ts_us, "t": ts_us / 1e6 - start_t}
+        cols.update((k, vals[:, i]) for i, k in enumerate(storage.AXES))
+        store.append_columns(cols, counts, {"counters_epoch": str(epoch)})
+        if _counter_cache is not None:
+            # deltas can take an hour back to zero; cheaper to reread than to patch
+            _load_counter_cache()
+    out.update(stored=int(ts_us.size), start_ts=int(ts_us[0]) / 1e6, end_ts=int(ts_us[-1]) / 1e6, hours=len(touched))
+    return out
+
+
+# Decoder for the connected device's notifications (legacy or packed, see
+# packets.py); tracks sequence numbers, clock mapping and losses.
+_decoder = packets.PacketDecoder()
+
+
+def packet_stats() -> Dict[str, Any]:
+    """Notification/sample counts and loss accounting for the BLE stream."""
+    return _decoder.summary()
+
+
+def handle_indication(_: Any, data: bytearray) -> None:
+    """Decode one BLE notification into samples and ingest them.
+
+    Accepts both the legacy single-sample payload and packed batches.
+    """
+    received_ns = time.perf_counter_ns()
+    trace = tracing.Trace(received_ns) if tracing.sampled() else None
+    decoded = _decoder.decode(data, time.time())
+    if decoded is None:
+        return
+    vals, times = decoded
+    if trace is not None:
+        trace.mark("decode")
+    if _reconnect_pending is not None:
+        _close_reconnect_event(float(times[0]))
+    _ingest(vals, times, received_ns, trace)
+
+
+def _ingest(vals: np.ndarray, times: np.ndarray, received_ns: int, trace: tracing.Trace | None = None) -> None:
+    """Run detection, alerts, persistence and fan-out for a batch of samples.
+
+    `vals` is (N, 6) in AXES order, `times` the epoch time of each sample.
+    `trace`, if given, is marked at each stage (see tracing.py).
+    """
+    global slouching
+    # Run slouch detection for the whole batch; the detector keeps its own
+    # latched state between calls.
+    detector = get_detector_for(_ble_device)
+    was_slouching = detector.slouching
+    det = detector.detect({"ax": vals[:, 0], "ay": vals[:, 1], "az": vals[:, 2]})
+    slouching = detector.slouching
+    rising = det.state & ~np.concatenate(([was_slouching], det.state[:-1]))
+    # The posture score is derived once here so clients don't each recompute it.
+    scores = detectors.posture_scores(vals[:, 2]).tolist()
+    over = det.over.tolist()
+    state = det.state.tolist()
+    rising = rising.tolist()
+    ts = (times - start_t).tolist()
+    if trace is not None:
+        trace.mark("detect")
+
+    samples = []
+    for i, (ax, ay, az, gx, gy, gz) in enumerate(vals.tolist()):
+        t = ts[i]
+        # Alerts go out before persistence so their latency doesn't include it.
+        alert = alerts.check(start_t + t, state[i], received_ns, _ble_client)
+
+        # Persisting is a spool append; the spool writer thread does the DB work.
+        if PERSIST_DATA:
+            flags = spool.COUNTED
+            if over[i]:
+                flags |= spool.OVER
+            if rising[i]:
+                flags |= spool.TRANSITION
+            if alert:
+                flags |= spool.ALERT
+            try:
+                _get_spool().append(start_t + t, t, ax, ay, az, gx, gy, gz, flags)
+            except Exception as exc:
+                print("Failed to spool sample:", exc)
+
+        samples.append({
+            "t": t,
+            "ts": start_t + t,
+            "ax": ax,
+            "ay": ay,
+            "az": az,
+            "gx": gx,
+            "gy": gy,
+            "gz": gz,
+            "score": scores[i],
+            "status": detectors.posture_status(scores[i]),
+        })
+
+    slouched = sum(over)
+    today = time.strftime("%Y-%m-%d")
+    leaderboard.board.add(LOCAL_USER, today, straight=len(over) - slouched, slouch=slouched)
+
+    if trace is not None:
+        if PERSIST_DATA and _spool is not None:
+            trace.spooled(_spool.generation, _spool.write_pos)
+        else:
+            trace.mark("spool")
+
+    for sample in samples:
+        _publish(sample)
+    if trace is not None and samples:
+        trace.fanned_out(samples[-1])
+
+
 async def _run(device_name: str = "XIAOMG25_BLE") -> None:
     """Background coroutine that connects to BLE device and subscribes to notifications.
 
@@ -225,7 +1334,6 @@ async def _run(device_name: str = "XIAOMG25_BLE") -> None:
         # requested. Installing `bleak` will enable real BLE collection.
         print("bleak is not available; entering simulation mode. Install bleak to enable real BLE.")
         print("Import error:", exc)
-        import random
 
         # Simple synthetic data generator: small random walk around zero.
         ax = ay = az = gx = gy = gz = 0
@@ -238,74 +1346,82 @@ async def _run(device_name: str = "XIAOMG25_BLE") -> None:
             gx += random.randint(-2, 2)
             gy += random.randint(-2, 2)
             gz += random.randint(-2, 2)
+            # the walk stays inside the int8 range every consumer packs it into
+            ax, ay, az, gx, gy, gz = (max(-128, min(127, v)) for v in (ax, ay, az, gx, gy, gz))
 
-            sample = {"t": t, "ax": ax, "ay": ay, "az": az, "gx": gx, "gy": gy, "gz": gz}
+            score = detectors.posture_score(az)
+            sample = {"t": t, "ts": start_t + t, "ax": ax, "ay": ay, "az": az, "gx": gx, "gy": gy, "gz": gz,
+                      "score": score, "status": detectors.posture_status(score)}
 
             # persist only when enabled
             if PERSIST_DATA:
                 try:
-                    conn = _open_db()
-                    with _db_lock:
-                        conn.execute(
-                            "INSERT INTO samples (t, ax, ay, az, gx, gy, gz) VALUES (?, ?, ?, ?, ?, ?, ?)",
-                            (t, ax, ay, az, gx, gy, gz),
-                        )
-                        conn.commit()
+                    # simulated samples are stored but don't feed the counters
+                    _get_spool().append(start_t + t, t, ax, ay, az, gx, gy, gz, 0)
                 except Exception as exc:
-                    print("Failed to write simulated sample to DB:", exc)
-
-            # Update the last seen sample (always keep this for live retrieval).
-            global last_sample
-            last_sample = sample
+                    print("Failed to spool simulated sample:", exc)
 
-            for q in list(_listeners):
-                try:
-                    q.put_nowait(sample)
-                except asyncio.QueueFull:
-                    pass
+            _publish(sample)
 
             # emit samples at ~5 Hz
             await asyncio.sleep(0.2)
         return
 
+    global _ble_connected, _ble_device, _ble_client, _disconnected_at, _reconnect_pending
     connect_attempt = 0
+    backoff = SCAN_BACKOFF_MIN_S
+    try_direct = True
+    loop = asyncio.get_running_loop()
 
     while not _stop_event.is_set():
-        device = await BleakScanner.find_device_by_name(device_name)
-        if not device:
-            # back off and try again
-            await asyncio.sleep(2)
-            continue
+        # Fast path: connect straight to the last known address, which skips
+        # a scan cycle entirely when the device is still in range.
+        address = _cached_address(device_name) if try_direct else None
+        if address is not None:
+            target, method = address, "direct"
+        else:
+            target = await _scan_for(BleakScanner, device_name, SCAN_WINDOW_S)
+            if target is None:
+                # not advertising: wait longer between scan windows each time
+                await _sleep_unless_stopped(backoff * random.uniform(0.8, 1.2))
+                backoff = min(backoff * 2, SCAN_BACKOFF_MAX_S)
+                continue
+            method = "scan"
+
+        disconnected = asyncio.Event()
+
+        def _on_disconnect(_: Any) -> None:
+            loop.call_soon_threadsafe(disconnected.set)
 
         try:
             connect_attempt += 1
-            dev_id = getattr(device, "address", None) or getattr(device, "name", None)
-            print(f"Attempting to connect to BLE device '{device_name}' (attempt {connect_attempt})... device={dev_id}")
-
-            # Connect and subscribe. Use a disconnected callback to detect
-            # unexpected disconnects and attempt immediate reconnects to the
-            # same device.
-            async with BleakClient(device) as client:
+            dev_id = target if isinstance(target, str) else getattr(target, "address", None) or getattr(target, "name", None)
+            print(f"Attempting to connect to BLE device '{device_name}' ({method}, attempt {connect_attempt})... device={dev_id}")
+
+            # Connect and subscribe; the disconnected callback lets us notice
+            # unexpected disconnects and reconnect right away.
+            async with BleakClient(
+                target,
+                disconnected_callback=_on_disconnect,
+                timeout=DIRECT_CONNECT_TIMEOUT_S if method == "direct" else SCAN_CONNECT_TIMEOUT_S,
+            ) as client:
                 # record device + connected state
-                global _ble_connected, _ble_device
-                _ble_device = getattr(device, "name", None) or getattr(device, "address", None)
+                _ble_device = getattr(target, "name", None) or device_name
                 _ble_connected = True
-
-                # set disconnected callback to notify event loop
-                disconnected = asyncio.Event()
-
-                def _on_disconnect(_: any):
-                    try:
-                        loop = asyncio.get_running_loop()
-                        loop.call_soon_threadsafe(disconnected.set)
-                    except Exception:
-                        pass
-
-                try:
-                    client.set_disconnected_callback(_on_disconnect)
-                except Exception:
-                    # Some bleak backends may not support set_disconnected_callback
-                    pass
+                _ble_client = client
+                _decoder.resync()
+                backoff = SCAN_BACKOFF_MIN_S
+                _remember_address(device_name, getattr(client, "address", None) or dev_id)
+                if _disconnected_at is not None:
+                    _reconnect_pending = {
+                        "disconnected_at": _disconnected_at,
+                        "reconnected_at": time.time(),
+                        "latency_s": round(time.time() - _disconnected_at, 3),
+                        "method": method,
+                        "attempts": connect_attempt,
+                        "last_sample_at": _ble_last_seen,
+                    }
+                connect_attempt = 0
 
                 await client.start_notify(CHAR_UUID, handle_indication)
 
@@ -323,23 +1439,141 @@ async def _run(device_name: str = "XIAOMG25_BLE") -> None:
                 except Exception:
                     pass
 
-                # If disconnected event fired, log and allow outer loop to reconnect
-                if disc_task in done:
-                    _ble_connected = False
-                    print(f"BLE device {device_name} disconnected; will attempt reconnect.")
-                    # small backoff before reconnecting
-                    await asyncio.sleep(1)
-                else:
-                    # stop was requested; mark disconnected and exit
-                    _ble_connected = False
+                _ble_client = None
+                alerts.engine.reset()
+                _ble_connected = False
+                _end_session()
+                if disc_task not in done:
+                    # stop was requested
                     return
+                print(f"BLE device {device_name} disconnected; reconnecting.")
+                _close_reconnect_event()
+                _disconnected_at = time.time()
+                try_direct = True
         except asyncio.CancelledError:
             raise
         except Exception as exc:  # keep running on errors
             print("BLE client error:", exc)
             _ble_connected = False
-            _ble_device = None
+            _ble_client = None
+            _end_session()
+            # a failed direct connect usually means the device moved or
+            # changed address; fall back to scanning until it is found again
+            if method == "direct":
+                try_direct = False
+            else:
+                await _sleep_unless_stopped(1)
+
+
+async def _sleep_unless_stopped(delay: float) -> None:
+    try:
+        await asyncio.wait_for(_stop_event.wait(), delay)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def _scan_for(scanner_cls: Any, device_name: str, timeout: float) -> Any:
+    """Scan for up to `timeout` seconds; return the device as soon as it's seen.
+
+    Advertisements arrive through a detection callback, so this returns on the
+    first matching advert instead of waiting out a full scan cycle. Passive
+    scanning is used where the backend supports it.
+    """
+    found = asyncio.get_running_loop().create_future()
+
+    def _on_advert(device: Any, adv: Any) -> None:
+        name = getattr(adv, "local_name", None) or getattr(device, "name", None)
+        if name == device_name and not found.done():
+            found.set_result(device)
+
+    try:
+        scanner = scanner_cls(detection_callback=_on_advert, scanning_mode="passive")
+        await scanner.start()
+    except Exception:
+        # e.g. BlueZ needs or_patterns for passive mode; an active scan still works
+        scanner = scanner_cls(detection_callback=_on_advert)
+        await scanner.start()
+    stop_task = asyncio.ensure_future(_stop_event.wait())
+    try:
+        done, _ = await asyncio.wait({found, stop_task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stop_task.cancel()
+        await scanner.stop()
+    return found.result() if found in done else None
+
+
+def broker_address() -> tuple[str, int]:
+    host, _, port = BROKER_ADDR.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+# Remote mode: connection to the ingest broker and commands waiting to be sent.
+_broker_writer: asyncio.StreamWriter | None = None
+_broker_loop: asyncio.AbstractEventLoop | None = None
+_pending_commands: list[dict] = []
+
+
+def _write_command(cmd: dict) -> None:
+    if _broker_writer is not None and not _broker_writer.is_closing():
+        _broker_writer.write((json.dumps(cmd) + "\n").encode())
+    else:
+        _pending_commands.append(cmd)
+
+
+def _send_command(cmd: dict) -> None:
+    """Forward a control command to the ingest process (queued until connected).
+
+    Safe to call from any thread; the write happens on the subscriber's loop.
+    """
+    if _broker_loop is not None:
+        _broker_loop.call_soon_threadsafe(_write_command, cmd)
+    else:
+        _pending_commands.append(cmd)
+
+
+async def _subscribe() -> None:
+    """Remote mode: mirror live state from the ingest process's broker.
+
+    Every sample published by the ingest process is re-published locally, so
+    /ws handlers and last_sample behave exactly as in local mode. The hello's
+    `last_sample` only sets last_sample; it is not a new sample.
+    """
+    global _stop_event, _broker_writer, _broker_loop, slouching, _ble_connected, _ble_device, last_sample
+    _stop_event = asyncio.Event()
+    _broker_loop = asyncio.get_running_loop()
+    host, port = broker_address()
+    while not _stop_event.is_set():
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+        except OSError as exc:
+            print(f"Ingest broker {host}:{port} unavailable ({exc}); retrying.")
             await asyncio.sleep(1)
+            continue
+        _broker_writer = writer
+        pending = _pending_commands[:]
+        _pending_commands.clear()
+        for cmd in pending:
+            _write_command(cmd)
+        try:
+            async for line in reader:
+                msg = json.loads(line)
+                slouching = msg.get("slouching", slouching)
+                _ble_connected = msg.get("connected", _ble_connected)
+                _ble_device = msg.get("device", _ble_device)
+                if msg.get("last_sample"):
+                    last_sample = msg["last_sample"]
+                if msg.get("sample"):
+                    _publish(msg["sample"])
+                if msg.get("alert"):
+                    alerts.publish(msg["alert"])
+                if msg.get("reconnect"):
+                    reconnect_events.append(msg["reconnect"])
+        except (OSError, ValueError) as exc:
+            print("Ingest broker connection error:", exc)
+        finally:
+            _broker_writer = None
+            writer.close()
+        await asyncio.sleep(1)
 
 
 def start(device_name: str = "XIAOMG25_BLE") -> None:
@@ -348,9 +1582,23 @@ def start(device_name: str = "XIAOMG25_BLE") -> None:
     If called from an existing asyncio event loop (e.g. when FastAPI runs), it schedules
     the coroutine there. Otherwise, it spins a background thread with its own event loop
     so the BLE task runs independently.
+
+    In remote ingest mode this starts the broker subscriber instead and asks
+    the ingest process to start its BLE task.
     """
     global _task
 
+    if INGEST_MODE == "remote":
+        _send_command({"cmd": "start", "device_name": device_name})
+        if _task is None:
+            # first call comes from the server's startup event, inside its loop
+            _task = asyncio.get_running_loop().create_task(_subscribe())
+        return
+
+    if PERSIST_DATA:
+        # replays anything a previous run left in the spool
+        _get_spool()
+
     try:
         loop = asyncio.get_running_loop()
     except RuntimeError:
@@ -376,19 +1624,28 @@ def start(device_name: str = "XIAOMG25_BLE") -> None:
 
 def stop() -> None:
     """Request the BLE background task to stop."""
+    if INGEST_MODE == "remote":
+        _send_command({"cmd": "stop"})
+        return
     if _stop_event and not _stop_event.is_set():
         _stop_event.set()
+    _end_session()
+
 
+def get_data(grid_hz: float | None = None) -> Dict[str, list]:
+    """Return a copy of the recorded data (safe for JSON serialization).
 
-def get_data() -> Dict[str, list]:
-    """Return a copy of the recorded data (safe for JSON serialization)."""
-    # If persistence is enabled, read all samples from the DB and return as
+    With `grid_hz`, the stored samples are linearly interpolated onto a
+    regular grid of that rate (per session), which undoes compression.
+    """
+    # If persistence is enabled, read all samples from the store and return as
     # arrays. Otherwise return the in-memory `data_log` copies (may be empty).
     if PERSIST_DATA:
         try:
-            conn = _open_db()
-            cur = conn.execute("SELECT t, ax, ay, az, gx, gy, gz, pitch FROM samples ORDER BY id ASC")
-            rows = cur.fetchall()
+            rows = store.scan(limit=None)
+            if grid_hz:
+                grid = compression.resample(rows, grid_hz)
+                return {k: [g[k] for g in grid] for k in ("t",) + compression.AXES}
             out = {"t": [], "ax": [], "ay": [], "az": [], "gx": [], "gy": [], "gz": [], "pitch": []}
             for r in rows:
                 out["t"].append(r["t"])
@@ -410,14 +1667,10 @@ def get_data() -> Dict[str, list]:
 
 def get_latest() -> dict:
     """Return the latest sample or an empty dict if none."""
-    # If persistence is enabled, return the last DB sample.
+    # If persistence is enabled, return the last stored sample.
     if PERSIST_DATA:
         try:
-            conn = _open_db()
-            cur = conn.execute(
-                "SELECT t, ax, ay, az, gx, gy, gz, pitch FROM samples ORDER BY id DESC LIMIT 1"
-            )
-            row = cur.fetchone()
+            row = store.latest()
             if row is None:
                 return {}
             return {"t": row["t"], "ax": row["ax"], "ay": row["ay"], "az": row["az"], "gx": row["gx"], "gy": row["gy"], "gz": row["gz"], "pitch": row["pitch"]}
@@ -436,17 +1689,8 @@ def get_latest() -> dict:
 
 def get_counter(name: str) -> int:
     """Return today's integer value for a named counter (0 if missing)."""
-    today = time.strftime("%Y-%m-%d")
     try:
-        conn = _open_db()
-        cur = conn.execute(
-            "SELECT value FROM counters WHERE name = ? AND date = ?",
-            (name, today),
-        )
-        row = cur.fetchone()
-        if row is None:
-            return 0
-        return int(row["value"])
+        return store.counter(name, time.strftime("%Y-%m-%d"))
     except Exception as exc:
         print("Failed to read counter from DB:", exc)
         return 0
@@ -454,41 +1698,40 @@ def get_counter(name: str) -> int:
 
 def reset_counter(name: str) -> None:
     """Reset today's counter (set to 0), creating a row for today if necessary."""
+    global _counter_cache_version
     today = time.strftime("%Y-%m-%d")
     try:
-        conn = _open_db()
-        with _db_lock:
-            conn.execute(
-                """
-                INSERT INTO counters(name, date, value)
-                VALUES (?, ?, 0)
-                ON CONFLICT(name, date)
-                DO UPDATE SET value = 0
-                """,
-                (name, today),
-            )
-            conn.commit()
+        with _counter_cache_lock:
+            store.set_counter(name, today, 0)
+            if _counter_cache is not None:
+                _counter_cache.setdefault(today, {})[name] = 0
+                _counter_cache_version += 1
     except Exception as exc:
         print("Failed to reset counter in DB:", exc)
 
 
 def prune_samples(older_than_days: int) -> int:
-    """Delete samples older than `older_than_days`. Returns number of rows deleted."""
+    """Drop day partitions older than `older_than_days`. Returns number of rows deleted.
+
+    Retention works at day granularity: a day's partition is dropped once the
+    whole day is past the cutoff, which costs a DROP TABLE instead of a DELETE.
+    """
     try:
-        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
-        cutoff_str = cutoff.strftime("%Y-%m-%d %H:%M:%S")
-        conn = _open_db()
-        with _db_lock:
-            cur = conn.execute("DELETE FROM samples WHERE created_at < ?", (cutoff_str,))
-            deleted = cur.rowcount
-            conn.commit()
-        return deleted
+        return store.prune(storage.local_day(time.time() - older_than_days * 86400))
     except Exception as exc:
         print("Failed to prune samples from DB:", exc)
         return 0
 
 
-def query_samples(limit: int = 100, offset: int = 0, start_t: float | None = None, end_t: float | None = None) -> list:
+def query_samples(
+    limit: int = 100,
+    offset: int = 0,
+    start_t: float | None = None,
+    end_t: float | None = None,
+    grid_hz: float | None = None,
+    start_ts: float | None = None,
+    end_ts: float | None = None,
+) -> list:
     """Query samples from the SQLite DB with optional time filtering.
 
     Parameters:
@@ -496,27 +1739,114 @@ def query_samples(limit: int = 100, offset: int = 0, start_t: float | None = Non
     - offset: rows to skip for paging (default 0)
     - start_t: include samples with t >= start_t when provided
     - end_t: include samples with t <= end_t when provided
+    - start_ts, end_ts: absolute window in epoch seconds (inclusive). Only
+      the day partitions overlapping it are read, each through its ts_us
+      index, and rows come back in time order.
+    - grid_hz: interpolate the page of stored rows onto a regular grid of
+      this rate (rows then only have t and the six axes)
+
+    `t` restarts with the service, so start_t/end_t can match several
+    sessions; use start_ts/end_ts for real time ranges.
 
-    Returns a list of dict rows (keys: id, t, ax, ay, az, gx, gy, gz, pitch, created_at).
+    Returns a list of dict rows (keys: id, t, ax, ay, az, gx, gy, gz, pitch, created_at, ts_us).
+    Day partitions are walked oldest first, so paging spans them transparently.
     """
     try:
-        conn = _open_db()
-        sql = "SELECT id, t, ax, ay, az, gx, gy, gz, pitch, created_at FROM samples"
-        params: list = []
-        clauses: list = []
-        if start_t is not None:
-            clauses.append("t >= ?")
-            params.append(start_t)
-        if end_t is not None:
-            clauses.append("t <= ?")
-            params.append(end_t)
-        if clauses:
-            sql += " WHERE " + " AND ".join(clauses)
-        sql += " ORDER BY id ASC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
-        cur = conn.execute(sql, params)
-        rows = cur.fetchall()
-        return [dict(r) for r in rows]
+        out = store.scan(start_ts=start_ts, end_ts=end_ts, start_t=start_t, end_t=end_t, limit=limit, offset=offset)
+        if grid_hz:
+            return compression.resample(out, grid_hz)
+        return out
     except Exception as exc:
         print("Failed to query samples from DB:", exc)
         return []
+
+
+def get_meta(name: str, default: str | None = None) -> str | None:
+    try:
+        return store.get_meta(name, default)
+    except Exception as exc:
+        print("Failed to read meta from DB:", exc)
+        return default
+
+
+def counters_epoch() -> int:
+    """Version of historical counters; bumped whenever past days are rewritten.
+
+    Live ingest only ever touches today's counters, so sync clients can fetch
+    just the days that received new samples unless the epoch has changed.
+    """
+    return int(get_meta("counters_epoch", "0"))
+
+
+def samples_after(after_id: int, limit: int = 1000) -> list:
+    """Return up to `limit` samples with id > after_id, in id order.
+
+    Each partition is probed with a primary-key seek, so this costs the same
+    regardless of how much history precedes `after_id`; the partitions' rows
+    are merged by id because bulk uploads give older days higher ids.
+    """
+    try:
+        return store.scan(after_id=after_id, limit=limit)
+    except Exception as exc:
+        print("Failed to query samples from DB:", exc)
+        return []
+
+
+def days_with_samples_after(after_id: int) -> list[str]:
+    """Return the days whose partitions hold samples with id > after_id."""
+    return [day for day, last_id in store.days() if last_id is not None and last_id > after_id]
+
+
+def get_counter_rows(dates: list[str] | None = None, hourly: bool = False) -> list:
+    """Return counter rows for the given dates (all dates when None)."""
+    try:
+        if dates is None:
+            return store.counters("0000-01-01", "9999-12-31", hourly)
+        if not dates:
+            return []
+        wanted = set(dates)
+        return [r for r in store.counters(min(dates), max(dates), hourly) if r["date"] in wanted]
+    except Exception as exc:
+        print("Failed to read counters from DB:", exc)
+        return []
+
+
+def get_counter_range(start: str, end: str, hourly: bool = False) -> list:
+    """Return counter rows for dates start..end (inclusive, YYYY-MM-DD)."""
+    try:
+        return store.counters(start, end, hourly)
+    except Exception as exc:
+        print("Failed to read counters from DB:", exc)
+        return []
+
+
+def save_user_stats(user: str, date: str, straight: int, slouch: int) -> None:
+    """Store a user's reported daily totals (replacing any earlier report)."""
+    try:
+        store.save_user_stats(user, date, straight, slouch)
+    except Exception as exc:
+        print("Failed to save user stats in DB:", exc)
+
+
+def load_leaderboard(since_date: str) -> None:
+    """(Re)build the in-memory leaderboard from the DB, from `since_date` on.
+
+    The local user's totals come from the straight/slouch time counters,
+    friends' from `user_stats`.
+    """
+    try:
+        local: Dict[str, list] = {}
+        for r in store.counters(since_date, "9999-12-31"):
+            if r["name"] in ("straight_time", "slouch_time"):
+                local.setdefault(r["date"], [0, 0])[0 if r["name"] == "straight_time" else 1] = r["value"]
+        friends = store.user_stats(since_date)
+    except Exception as exc:
+        print("Failed to load leaderboard from DB:", exc)
+        return
+    board = leaderboard.board
+    board.clear()
+    for date in sorted(local):
+        board.add(LOCAL_USER, date, straight=local[date][0], slouch=local[date][1], replace=True)
+    for r in friends:
+        if r["user"] != LOCAL_USER:
+            board.add(r["user"], r["date"], straight=r["straight"], slouch=r["slouch"], replace=True)
@@ -0,0 +1,171 @@
+"""Bounded-error compression of the sample stream (swinging door).
+
+A wearer sitting still produces long runs of nearly identical samples. The
+swinging-door algorithm keeps only the points needed so that linear
+interpolation between kept points reproduces every dropped sample within a
+per-axis tolerance:
+
+    sd = SwingingDoor(tolerance=2)
+    for t, values, row in stream:
+        for kept in sd.feed(t, values, row):
+            store(kept)
+
+For each axis, a "door" is opened at the last kept point (the pivot): the
+range of slopes whose line stays within +-tolerance of every sample seen
+since. While the line to the newest sample fits through the doors of all
+axes it is only remembered; once it doesn't, the previous sample is kept and
+becomes the new pivot. A session break (t going backwards) keeps both ends,
+and a point is kept at least every `max_interval` seconds. The remembered
+sample (`pending`) is only handed out by a later feed() or by flush(), so a
+caller that must survive a crash keeps its source until then.
+
+`resample()` turns stored rows back into a regular grid for readers.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+
+AXES = ("ax", "ay", "az", "gx", "gy", "gz")
+
+
+def parse_tolerance(spec: str | None) -> tuple[float, ...] | None:
+    """'2' or '2,2,2,4,4,4' (per AXES) -> tolerances; None/''/0 -> off."""
+    if not spec:
+        return None
+    values = [float(v) for v in spec.split(",")]
+    if len(values) == 1:
+        values = values * len(AXES)
+    if len(values) != len(AXES):
+        raise ValueError(f"expected 1 or {len(AXES)} tolerances, got {len(values)}")
+    if not any(values):
+        return None
+    return tuple(values)
+
+
+class SwingingDoor:
+    def __init__(self, tolerance: float | Sequence[float], max_interval: float = 10.0) -> None:
+        if isinstance(tolerance, (int, float)):
+            tolerance = (float(tolerance),) * len(AXES)
+        self.tolerance = tuple(float(v) for v in tolerance)
+        self.max_interval = max_interval
+        self.reset()
+
+    def reset(self) -> None:
+        self._pivot: tuple[float, Sequence[float]] | None = None
+        self._pending: tuple[float, Sequence[float], Any] | None = None
+        self._upper: List[float] = []
+        self._lower: List[float] = []
+
+    def _open(self, t: float, values: Sequence[float]) -> None:
+        self._pivot = (t, values)
+        self._pending = None
+        n = len(values)
+        self._upper = [float("inf")] * n
+        self._lower = [float("-inf")] * n
+
+    def _fits(self, t: float, values: Sequence[float]) -> bool:
+        """Does the line from the pivot to this sample stay within tolerance
+        of every sample since the pivot?"""
+        t0, v0 = self._pivot
+        dt = t - t0
+        upper, lower = self._upper, self._lower
+        for i, v in enumerate(values):
+            slope = (v - v0[i]) / dt
+            if slope > upper[i] or slope < lower[i]:
+                return False
+        return True
+
+    def _narrow(self, t: float, values: Sequence[float]) -> None:
+        """Narrow the doors: later lines must pass within tolerance of this sample."""
+        t0, v0 = self._pivot
+        dt = t - t0
+        upper, lower, tol = self._upper, self._lower, self.tolerance
+        for i, v in enumerate(values):
+            hi = (v + tol[i] - v0[i]) / dt
+            lo = (v - tol[i] - v0[i]) / dt
+            if hi < upper[i]:
+                upper[i] = hi
+            if lo > lower[i]:
+                lower[i] = lo
+
+    def feed(self, t: float, values: Sequence[float], item: Any = None) -> list:
+        """Add a sample; return the items (0-2) that must be stored now."""
+        if self._pivot is None:
+            self._open(t, values)
+            return [item]
+        t0 = self._pivot[0]
+        if t <= t0 or t - t0 > self.max_interval:
+            # session break or long stretch: close off with the pending point
+            # and start again from this one
+            out = [self._pending[2]] if self._pending is not None else []
+            self._open(t, values)
+            return out + [item]
+        out = []
+        if not self._fits(t, values):
+            # keep the last sample that still fit and pivot on it; with no
+            # samples in between, the new one always fits
+            pt, pv, pitem = self._pending
+            self._open(pt, pv)
+            out.append(pitem)
+        self._narrow(t, values)
+        self._pending = (t, values, item)
+        return out
+
+    @property
+    def pending(self) -> Any:
+        """Item of the remembered sample not handed out yet, or None."""
+        return self._pending[2] if self._pending is not None else None
+
+    def flush(self) -> list:
+        """Items still pending (store them when the stream ends)."""
+        out = [self._pending[2]] if self._pending is not None else []
+        if self._pending is not None:
+            self._open(self._pending[0], self._pending[1])
+        return out
+
+
+def compress(t: np.ndarray, values: np.ndarray, tolerance: float | Sequence[float], max_interval: float = 10.0) -> np.ndarray:
+    """Offline helper: boolean mask of the samples swinging door keeps."""
+    sd = SwingingDoor(tolerance, max_interval)
+    keep = np.zeros(len(t), dtype=bool)
+    for i, (ti, vi) in enumerate(zip(t.tolist(), values.tolist())):
+        for k in sd.feed(ti, vi, i):
+            keep[k] = True
+    for k in sd.flush():
+        keep[k] = True
+    return keep
+
+
+def _sessions(t: np.ndarray) -> list[slice]:
+    cuts = np.flatnonzero(np.diff(t) <= 0) + 1
+    bounds = [0, *cuts.tolist(), len(t)]
+    return [slice(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+
+def reconstruct(t_kept: np.ndarray, v_kept: np.ndarray, t_out: np.ndarray) -> np.ndarray:
+    """Linear interpolation of kept points (one session) at times `t_out`."""
+    return np.column_stack([np.interp(t_out, t_kept, v_kept[:, i]) for i in range(v_kept.shape[1])])
+
+
+def resample(rows: List[Dict[str, Any]], hz: float) -> List[Dict[str, Any]]:
+    """Interpolate stored rows (dicts with t and AXES) onto a regular grid.
+
+    Each session (t resets when the service restarts) is gridded separately
+    from its first to its last stored point. Values are rounded to 2 decimals.
+    """
+    if not rows or hz <= 0:
+        return []
+    t = np.array([r["t"] for r in rows], dtype=np.float64)
+    v = np.array([[r[k] for k in AXES] for r in rows], dtype=np.float64)
+    out: List[Dict[str, Any]] = []
+    for s in _sessions(t):
+        ts, vs = t[s], v[s]
+        grid = ts[0] + np.arange(int(np.floor((ts[-1] - ts[0]) * hz)) + 1) / hz
+        g = np.round(reconstruct(ts, vs, grid), 2)
+        for ti, row in zip(grid.tolist(), g.tolist()):
+            out.append({"t": ti, **dict(zip(AXES, row))})
+    return out
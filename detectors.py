@@ -0,0 +1,220 @@
+"""Slouch detectors.
+
+A detector turns a batch of raw samples into a per-sample posture state. All
+detectors share the same small interface so the ingest path, offline tools and
+benchmarks can swap them freely:
+
+    det = get_detector("hysteresis")
+    result = det.detect({"az": np.array([...]), ...})
+    result.over         # bool per sample: posture is over the slouch threshold
+    result.state        # bool per sample: latched slouching state
+    result.transitions  # number of straight -> slouching transitions
+
+Detectors are stateful across batches (the latched state and any rolling
+window are carried over), so feeding a session one sample at a time or in one
+big batch yields identical results. Call `reset()` between sessions.
+
+Accelerometer values arrive in hundredths of a g, clamped to int8 by the
+firmware (see `backend`), so `az > 64` means roughly 0.64 g on the z axis.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, Dict
+
+import numpy as np
+
+
+AXES = ("ax", "ay", "az", "gx", "gy", "gz")
+
+
+@dataclass
+class Detection:
+    over: np.ndarray
+    state: np.ndarray
+    transitions: int
+
+
+def _hysteresis(x: np.ndarray, hi: float, lo: float, initial: bool) -> np.ndarray:
+    """Vectorized two-threshold latch: set when x > hi, clear when x < lo.
+
+    Each sample takes the value decided by the most recent set/clear event at
+    or before it, or `initial` when there has been none in this batch.
+    """
+    on = x > hi
+    events = on | (x < lo)
+    idx = np.where(events, np.arange(x.size), -1)
+    last = np.maximum.accumulate(idx) if x.size else idx
+    return np.where(last >= 0, on[np.maximum(last, 0)], initial)
+
+
+def _count_rising(state: np.ndarray, previous: bool) -> int:
+    if state.size == 0:
+        return 0
+    rising = int(np.count_nonzero(state[1:] & ~state[:-1]))
+    if state[0] and not previous:
+        rising += 1
+    return rising
+
+
+class Detector:
+    """Base class. Subclasses implement `_signal` and set `hi`/`lo`."""
+
+    name = "base"
+    hi: float
+    lo: float
+    # Samples of history needed before a batch for results to match a
+    # continuous run (used when a session is processed in independent chunks).
+    warmup = 0
+
+    def __init__(self) -> None:
+        self.slouching = False
+
+    def reset(self) -> None:
+        self.slouching = False
+
+    def _signal(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        raise NotImplementedError
+
+    def detect(self, batch: Dict[str, np.ndarray]) -> Detection:
+        x = self._signal(batch)
+        state = _hysteresis(x, self.hi, self.lo, self.slouching)
+        transitions = _count_rising(state, self.slouching)
+        if state.size:
+            self.slouching = bool(state[-1])
+        return Detection(over=x > self.hi, state=state, transitions=transitions)
+
+
+class HysteresisDetector(Detector):
+    """The original rule: slouching above az > 64, straight again below az < 50."""
+
+    name = "hysteresis"
+
+    def __init__(self, hi: float = 64, lo: float = 50) -> None:
+        super().__init__()
+        self.hi = hi
+        self.lo = lo
+
+    def _signal(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        return np.asarray(batch["az"], dtype=np.float64)
+
+
+def pitch_degrees(batch: Dict[str, np.ndarray]) -> np.ndarray:
+    """Forward tilt in degrees estimated from the accelerometer axes."""
+    ax = np.asarray(batch["ax"], dtype=np.float64)
+    ay = np.asarray(batch["ay"], dtype=np.float64)
+    az = np.asarray(batch["az"], dtype=np.float64)
+    return np.degrees(np.arctan2(az, np.hypot(ax, ay)))
+
+
+class PitchDetector(Detector):
+    """Threshold on the tilt angle, so it is insensitive to overall magnitude."""
+
+    name = "pitch"
+
+    def __init__(self, hi: float = 40.0, lo: float = 30.0) -> None:
+        super().__init__()
+        self.hi = hi
+        self.lo = lo
+
+    def _signal(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        return pitch_degrees(batch)
+
+
+class WindowedDetector(Detector):
+    """Rolling mean of az over `window` samples, ignoring noisy stretches.
+
+    A window only counts as slouched when its mean is over `hi` and its
+    variance stays under `max_var`, so brief movements (reaching, turning)
+    don't register as slouches. The tail of the previous batch is kept so the
+    window slides across batch boundaries.
+    """
+
+    name = "windowed"
+
+    def __init__(self, window: int = 25, hi: float = 64, lo: float = 50, max_var: float = 150.0) -> None:
+        super().__init__()
+        self.window = max(1, int(window))
+        self.hi = hi
+        self.lo = lo
+        self.max_var = max_var
+        self.warmup = self.window - 1
+        self._tail = np.empty(0, dtype=np.float64)
+
+    def reset(self) -> None:
+        super().reset()
+        self._tail = np.empty(0, dtype=np.float64)
+
+    def _signal(self, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        az = np.asarray(batch["az"], dtype=np.float64)
+        n = az.size
+        x = np.concatenate((self._tail, az))
+        self._tail = x[-(self.window - 1):] if self.window > 1 else x[:0]
+
+        # Rolling sums via cumulative sums; windows are shorter at the very
+        # start of a session until enough samples have been seen.
+        c1 = np.concatenate(([0.0], np.cumsum(x)))
+        c2 = np.concatenate(([0.0], np.cumsum(x * x)))
+        end = np.arange(x.size - n + 1, x.size + 1)
+        start = np.maximum(end - self.window, 0)
+        count = end - start
+        mean = (c1[end] - c1[start]) / count
+        var = np.maximum((c2[end] - c2[start]) / count - mean * mean, 0.0)
+
+        # Noisy windows are pushed between the thresholds so they neither set
+        # nor clear the latch.
+        return np.where(var <= self.max_var, mean, (self.hi + self.lo) / 2.0)
+
+
+# Posture score shown on the dashboard: az at or below SCORE_BEST maps to 100%
+# (straight), at or above SCORE_WORST to 0% (fully slouched), linear between.
+SCORE_BEST = 18
+SCORE_WORST = 128
+
+
+def posture_scores(az: np.ndarray) -> np.ndarray:
+    """Vectorized 0-100 posture score (rounded half up, like the dashboard)."""
+    az = np.asarray(az, dtype=np.float64)
+    pct = (SCORE_WORST - az) / (SCORE_WORST - SCORE_BEST) * 100.0
+    return np.floor(np.clip(pct, 0.0, 100.0) + 0.5).astype(np.int64)
+
+
+def posture_score(az: float) -> int:
+    """Scalar version of `posture_scores` for the per-sample ingest path."""
+    if az <= SCORE_BEST:
+        return 100
+    if az >= SCORE_WORST:
+        return 0
+    return int((SCORE_WORST - az) / (SCORE_WORST - SCORE_BEST) * 100.0 + 0.5)
+
+
+def posture_status(score: int) -> str:
+    if score >= 75:
+        return "excellent"
+    if score >= 50:
+        return "warning"
+    return "poor"
+
+
+DETECTORS: Dict[str, Callable[[], Detector]] = {
+    HysteresisDetector.name: HysteresisDetector,
+    PitchDetector.name: PitchDetector,
+    WindowedDetector.name: WindowedDetector,
+}
+
+DEFAULT_DETECTOR = HysteresisDetector.name
+
+
+def get_detector(name: str) -> Detector:
+    """Return a fresh detector instance by name (raises KeyError if unknown)."""
+    return DETECTORS[name]()
+
+
+def available() -> list:
+    return sorted(DETECTORS)
+
+
+def to_batch(rows: list) -> Dict[str, np.ndarray]:
+    """Convert a list of sample dicts into a column batch."""
+    return {k: np.fromiter((r[k] for r in rows), dtype=np.float64, count=len(rows)) for k in AXES if rows and k in rows[0]}
@@ -0,0 +1,214 @@
+"""In-process stand-in for the posture necklace and its BleakClient.
+
+Lets tests and benchmarks drive the real ingest path without Bluetooth:
+
+    dev = FakeDevice()
+    dev.send(az=90)          # goes through ble_service.handle_indication
+    dev.send_packed([[0, 0, 90, 0, 0, 0]] * 10)   # packed v1 notification
+    dev.writes               # [(char_uuid, payload, time), ...] e.g. vibration
+
+A FakeDevice implements the parts of the BleakClient API that `ble_service`
+and `alerts` use (async context manager, start/stop_notify,
+write_gatt_char, set_disconnected_callback), so it can also be handed to code
+that expects a connected client.
+
+`FakeBleak` goes one step further and stands in for the `bleak` package, so
+`ble_service._run` (scan, connect, reconnect) runs unmodified:
+
+    backend = FakeBleak(dev)
+    with backend.installed():
+        ble_service.start()
+        ...
+        dev.drop()           # link lost; _run reconnects via the cached address
+        dev.in_range = False # or make it unreachable until set back to True
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import sys
+import time
+import types
+from typing import Any, Callable, Iterator, List, Tuple
+
+
+class FakeDevice:
+    def __init__(self, name: str = "XIAOMG25_BLE", address: str = "FA:KE:00:00:00:01") -> None:
+        self.name = name
+        self.address = address
+        self.is_connected = False
+        self.in_range = True
+        # packed-format stream state: next sequence number and device clock
+        self.seq = 0
+        self.clock_ms = 0
+        self.writes: List[Tuple[str, bytes, float]] = []
+        self._notify: Callable[[Any, bytearray], None] | None = None
+        self._on_disconnect: Callable[[Any], None] | None = None
+
+    async def __aenter__(self) -> "FakeDevice":
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.disconnect()
+
+    async def connect(self) -> bool:
+        if not self.in_range:
+            raise TimeoutError(f"device {self.address} not found")
+        self.is_connected = True
+        return True
+
+    async def disconnect(self) -> bool:
+        self.is_connected = False
+        return True
+
+    def set_disconnected_callback(self, callback: Callable[[Any], None]) -> None:
+        self._on_disconnect = callback
+
+    async def start_notify(self, char_uuid: str, callback: Callable[[Any, bytearray], None]) -> None:
+        self._notify = callback
+
+    async def stop_notify(self, char_uuid: str) -> None:
+        self._notify = None
+
+    async def write_gatt_char(self, char_uuid: str, data: bytes, response: bool = False) -> None:
+        self.writes.append((char_uuid, bytes(data), time.time()))
+
+    def payload(self, ax: int = 0, ay: int = 0, az: int = 0, gx: int = 0, gy: int = 0, gz: int = 0) -> bytearray:
+        """Encode one sample the way the firmware does (int8 offset by 128)."""
+        return bytearray(max(0, min(255, v + 128)) for v in (ax, ay, az, gx, gy, gz))
+
+    def send(self, ax: int = 0, ay: int = 0, az: int = 0, gx: int = 0, gy: int = 0, gz: int = 0) -> None:
+        """Deliver one notification to the subscribed callback.
+
+        Without a subscriber the sample goes straight to
+        `ble_service.handle_indication`, so tests don't need a BLE loop.
+        """
+        self._deliver(self.payload(ax, ay, az, gx, gy, gz))
+
+    def send_packed(self, samples: Any, interval_ms: int = 20, lose: int = 0) -> None:
+        """Deliver (N, 6) samples as one packed v1 notification.
+
+        `lose` drops that many whole notifications of the same size first,
+        advancing the sequence number and device clock as if they were sent.
+        """
+        import packets
+
+        n = len(samples)
+        self.seq += lose
+        self.clock_ms += lose * n * interval_ms
+        self._deliver(bytearray(packets.encode(self.seq, self.clock_ms, interval_ms, samples)))
+        self.seq += 1
+        self.clock_ms += n * interval_ms
+
+    def _deliver(self, data: bytearray) -> None:
+        callback = self._notify
+        if callback is None:
+            import ble_service
+
+            callback = ble_service.handle_indication
+        callback(None, data)
+
+    def drop(self) -> None:
+        """Simulate the link dropping (fires the disconnected callback)."""
+        self.is_connected = False
+        if self._on_disconnect is not None:
+            self._on_disconnect(self)
+
+
+class _Advertisement:
+    def __init__(self, local_name: str) -> None:
+        self.local_name = local_name
+        self.rssi = -60
+
+
+class FakeBleak:
+    """A fake `bleak` module serving one FakeDevice.
+
+    Records how the service reached the device: `connects` holds
+    ("address" | "device", target) per connect attempt and `scans` counts
+    scanner starts. `connect_delay` and `advert_delay` simulate radio latency.
+    """
+
+    def __init__(self, device: FakeDevice, connect_delay: float = 0.0, advert_delay: float = 0.0) -> None:
+        self.device = device
+        self.connect_delay = connect_delay
+        self.advert_delay = advert_delay
+        self.connects: List[Tuple[str, Any]] = []
+        self.scans = 0
+        self.module = types.ModuleType("bleak")
+        self.module.BleakClient = self._client
+        self.module.BleakScanner = self._scanner_class()
+
+    def _client(self, target: Any, disconnected_callback: Callable[[Any], None] | None = None,
+                timeout: float = 10.0, **kwargs: Any) -> "_FakeClient":
+        self.connects.append(("address" if isinstance(target, str) else "device", target))
+        return _FakeClient(self, target, disconnected_callback)
+
+    def _scanner_class(self) -> type:
+        backend = self
+
+        class FakeScanner:
+            def __init__(self, detection_callback: Callable[[Any, Any], None] | None = None, **kwargs: Any) -> None:
+                self._callback = detection_callback
+                self._task: asyncio.Task | None = None
+
+            async def start(self) -> None:
+                backend.scans += 1
+                self._task = asyncio.get_running_loop().create_task(self._advertise())
+
+            async def stop(self) -> None:
+                if self._task is not None:
+                    self._task.cancel()
+
+            async def _advertise(self) -> None:
+                # the device advertises every 100 ms while it is in range
+                await asyncio.sleep(backend.advert_delay)
+                while True:
+                    if backend.device.in_range and not backend.device.is_connected and self._callback:
+                        self._callback(backend.device, _Advertisement(backend.device.name))
+                    await asyncio.sleep(0.1)
+
+            @staticmethod
+            async def find_device_by_name(name: str, timeout: float = 10.0) -> Any:
+                backend.scans += 1
+                dev = backend.device
+                return dev if dev.in_range and dev.name == name else None
+
+        return FakeScanner
+
+    @contextlib.contextmanager
+    def installed(self) -> Iterator["FakeBleak"]:
+        """Make `import bleak` return this fake for the duration."""
+        saved = sys.modules.get("bleak")
+        sys.modules["bleak"] = self.module
+        try:
+            yield self
+        finally:
+            if saved is None:
+                sys.modules.pop("bleak", None)
+            else:
+                sys.modules["bleak"] = saved
+
+
+class _FakeClient:
+    """What FakeBleak.BleakClient returns: a connection attempt to the device."""
+
+    def __init__(self, backend: FakeBleak, target: Any, disconnected_callback: Callable[[Any], None] | None) -> None:
+        self._backend = backend
+        self._target = target
+        self._dev = backend.device
+        if disconnected_callback is not None:
+            self._dev.set_disconnected_callback(disconnected_callback)
+        self.address = self._dev.address
+
+    async def __aenter__(self) -> FakeDevice:
+        await asyncio.sleep(self._backend.connect_delay)
+        if isinstance(self._target, str) and self._target != self._dev.address:
+            raise TimeoutError(f"device {self._target} not found")
+        await self._dev.connect()
+        return self._dev
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self._dev.disconnect()
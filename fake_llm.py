@@ -0,0 +1,184 @@
+"""Local stand-in for an OpenAI-compatible chat-completions API (Groq).
+
+Lets the chat path (`/api/chat`, `/mcp/summary` -> mcp_client -> MCP server
+-> posture API) run and be load-tested without a network or an API key:
+
+    python fake_llm.py --port 8866 --latency 0.3 --tokens-per-s 300
+    LLM_BASE_URL=http://127.0.0.1:8866/v1 GROQ_API_KEY=fake uvicorn server:app
+
+POST /v1/chat/completions answers like a tool-using model. If the request
+offers tools and the conversation has no tool results yet, it asks for one
+tool call: FAKE_LLM_TOOL, or the first offered tool, with FAKE_LLM_TOOL_ARGS
+or 'today' for each required argument. Otherwise it replies with
+`completion_tokens` words of text. Each response takes
+`latency + completion_tokens / tokens_per_s` seconds. Tool messages are
+checked against the assistant tool calls before them, as the real API does.
+
+To exercise clients' backoff, FAKE_LLM_RPS limits accepted requests per
+second (excess gets 429 with Retry-After, like a provider's rate limit) and
+FAKE_LLM_ERROR_RATE fails that share of requests with a 503.
+
+GET /stats reports request counts and peak concurrency.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import uvicorn
+
+LATENCY_S = float(os.environ.get("FAKE_LLM_LATENCY", "0.2"))
+TOKENS_PER_S = float(os.environ.get("FAKE_LLM_TOKENS_PER_S", "500"))
+COMPLETION_TOKENS = int(os.environ.get("FAKE_LLM_COMPLETION_TOKENS", "60"))
+TOOL = os.environ.get("FAKE_LLM_TOOL", "")
+TOOL_ARGS = os.environ.get("FAKE_LLM_TOOL_ARGS", "")
+RPS = float(os.environ.get("FAKE_LLM_RPS", "0"))
+ERROR_RATE = float(os.environ.get("FAKE_LLM_ERROR_RATE", "0"))
+
+app = FastAPI(title="fake OpenAI-compatible LLM")
+
+_ids = itertools.count(1)
+stats: Dict[str, Any] = {
+    "requests": 0, "tool_calls": 0, "replies": 0, "rejected": 0,
+    "rate_limited": 0, "errors": 0, "in_flight": 0, "peak_in_flight": 0,
+}
+_bucket = {"tokens": 0.0, "at": 0.0}
+
+
+def _rate_limited() -> float | None:
+    """Seconds until the next request would be accepted, or None if accepted now."""
+    if RPS <= 0:
+        return None
+    now = time.monotonic()
+    burst = max(1.0, RPS)
+    _bucket["tokens"] = min(burst, _bucket["tokens"] + (now - _bucket["at"]) * RPS) if _bucket["at"] else burst
+    _bucket["at"] = now
+    if _bucket["tokens"] >= 1:
+        _bucket["tokens"] -= 1
+        return None
+    return (1 - _bucket["tokens"]) / RPS
+
+
+def _tokens(value: Any) -> int:
+    # rough prompt size; good enough for usage accounting
+    return (len(json.dumps(value)) + 3) // 4
+
+
+def _reject(message: str) -> JSONResponse:
+    stats["rejected"] += 1
+    return JSONResponse({"error": {"message": message, "type": "invalid_request_error"}}, status_code=400)
+
+
+def _validate(messages: List[Dict[str, Any]]) -> str | None:
+    if not messages:
+        return "messages must not be empty"
+    asked: set = set()
+    for m in messages:
+        if m.get("role") == "assistant":
+            asked.update(c.get("id") for c in m.get("tool_calls") or [])
+        elif m.get("role") == "tool" and m.get("tool_call_id") not in asked:
+            return "messages with role 'tool' must be a response to a preceding message with 'tool_calls'"
+    return None
+
+
+def _tool_call(tools: List[Dict[str, Any]]) -> Dict[str, Any]:
+    names = {t["function"]["name"]: t["function"] for t in tools}
+    name = TOOL or next(iter(names))
+    if TOOL_ARGS:
+        args = json.loads(TOOL_ARGS)
+    else:
+        required = names.get(name, {}).get("parameters", {}).get("required", [])
+        args = {k: "today" for k in required}
+    return {"id": f"call_{next(_ids)}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages") or []
+    problem = _validate(messages)
+    if problem:
+        return _reject(problem)
+    wait = _rate_limited()
+    if wait is not None:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"Retry-After": str(max(1, round(wait)))},
+        )
+    if random.random() < ERROR_RATE:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": "Service unavailable", "type": "server_error"}}, status_code=503)
+    tools = body.get("tools") or []
+    wants_tool = tools and body.get("tool_choice") != "none" and not any(m.get("role") == "tool" for m in messages)
+
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+    try:
+        if wants_tool:
+            call = _tool_call(tools)
+            message = {"role": "assistant", "content": None, "tool_calls": [call]}
+            completion_tokens = _tokens(call)
+            finish = "tool_calls"
+            stats["tool_calls"] += 1
+        else:
+            text = " ".join(itertools.islice(itertools.cycle(["Keep", "your", "shoulders", "back."]), COMPLETION_TOKENS))
+            message = {"role": "assistant", "content": text}
+            completion_tokens = COMPLETION_TOKENS
+            finish = "stop"
+            stats["replies"] += 1
+        await asyncio.sleep(LATENCY_S + completion_tokens / TOKENS_PER_S)
+    finally:
+        stats["in_flight"] -= 1
+
+    prompt_tokens = _tokens(messages) + _tokens(tools)
+    return {
+        "id": f"chatcmpl-fake-{next(_ids)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+@app.get("/v1/models")
+def models():
+    return {"object": "list", "data": [{"id": "llama-3.1-8b-instant", "object": "model", "owned_by": "fake"}]}
+
+
+@app.get("/stats")
+def get_stats():
+    return stats
+
+
+if __name__ == "__main__":
+    p = argparse.ArgumentParser()
+    p.add_argument("--port", type=int, default=8866)
+    p.add_argument("--latency", type=float, default=LATENCY_S, help="seconds before the first token")
+    p.add_argument("--tokens-per-s", type=float, default=TOKENS_PER_S)
+    p.add_argument("--completion-tokens", type=int, default=COMPLETION_TOKENS)
+    p.add_argument("--tool", default=TOOL, help="tool to call (default: first offered)")
+    p.add_argument("--tool-args", default=TOOL_ARGS, help="JSON arguments for the tool call")
+    p.add_argument("--rps", type=float, default=RPS, help="requests/s before answering 429 (0: unlimited)")
+    p.add_argument("--error-rate", type=float, default=ERROR_RATE, help="share of requests failed with 503")
+    args = p.parse_args()
+    LATENCY_S, TOKENS_PER_S, COMPLETION_TOKENS = args.latency, args.tokens_per_s, args.completion_tokens
+    TOOL, TOOL_ARGS = args.tool, args.tool_args
+    RPS, ERROR_RATE = args.rps, args.error_rate
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
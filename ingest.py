@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""Standalone BLE ingest process with a local sample broker.
+
+Runs the BLE client and DB writer from `ble_service` in a single dedicated
+process and republishes every live sample on a local TCP socket, so any
+number of web workers can serve /ws and the read APIs with the same live
+state:
+
+    python ingest.py                                   # BLE + broker on 127.0.0.1:8765
+    BLE_INGEST_MODE=remote uvicorn server:app --workers 4
+
+Wire format is newline-delimited JSON. On connect a subscriber receives the
+current state (`last_sample`, `slouching`, connection info); after that one
+message per sample. Subscribers may send commands back, one JSON object per
+line: {"cmd": "start", "device_name": ...}, {"cmd": "stop"},
+{"cmd": "set_detector", "detector": ..., "device_name": ...} and
+{"cmd": "alert_config", "changes": {...}}. Slouch alerts are forwarded as
+{"alert": {...}} messages and BLE reconnect events as {"reconnect": {...}}.
+
+A subscriber that can't keep up has samples dropped for it rather than
+stalling ingest, the same policy as the in-process listener queues.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+
+# This process is the ingest side, whatever the web workers are configured as.
+os.environ["BLE_INGEST_MODE"] = "local"
+
+import alerts  # noqa: E402
+import ble_service  # noqa: E402
+
+
+# Per-subscriber cap on unsent bytes before samples are dropped for it.
+MAX_BUFFERED = 256 * 1024
+
+_subscribers: set[asyncio.StreamWriter] = set()
+
+
+def _state(sample: dict | None = None) -> dict:
+    return {
+        "sample": sample,
+        "slouching": ble_service.slouching,
+        "connected": ble_service._ble_connected,
+        "device": ble_service._ble_device,
+    }
+
+
+def _handle_command(cmd: dict) -> None:
+    name = cmd.get("cmd")
+    if name == "start":
+        ble_service.start(cmd.get("device_name") or "XIAOMG25_BLE")
+    elif name == "stop":
+        ble_service.stop()
+    elif name == "alert_config":
+        try:
+            alerts.update_config(**cmd.get("changes", {}))
+        except KeyError as exc:
+            print("Unknown alert setting from subscriber:", exc)
+    elif name == "set_detector":
+        try:
+            ble_service.set_detector(cmd["detector"], cmd.get("device_name"))
+        except KeyError as exc:
+            print("Unknown detector from subscriber:", exc)
+    else:
+        print("Unknown broker command:", cmd)
+
+
+async def _serve_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    # the current sample under its own key: it was fanned out already
+    hello = dict(_state(), last_sample=ble_service.last_sample)
+    writer.write((json.dumps(hello) + "\n").encode())
+    _subscribers.add(writer)
+    try:
+        async for line in reader:
+            try:
+                _handle_command(json.loads(line))
+            except ValueError:
+                print("Malformed broker command:", line[:80])
+    except OSError:
+        pass
+    finally:
+        _subscribers.discard(writer)
+        writer.close()
+
+
+def _broadcast(msg: dict) -> None:
+    line = (json.dumps(msg) + "\n").encode()
+    for writer in list(_subscribers):
+        if writer.is_closing():
+            _subscribers.discard(writer)
+            continue
+        if writer.transport.get_write_buffer_size() > MAX_BUFFERED:
+            # slow subscriber — drop this message for it
+            continue
+        writer.write(line)
+
+
+async def _fan_out() -> None:
+    q = await ble_service.register_listener(maxsize=10000)
+    while True:
+        _broadcast(_state(await q.get()))
+
+
+async def _fan_out_alerts() -> None:
+    q = await alerts.register_listener()
+    while True:
+        _broadcast({"alert": await q.get()})
+
+
+async def run(device_name: str) -> None:
+    host, port = ble_service.broker_address()
+    server = await asyncio.start_server(_serve_client, host, port)
+    print(f"Ingest broker listening on {host}:{port}")
+    ble_service.reconnect_callbacks.append(lambda event: _broadcast({"reconnect": event}))
+    ble_service.start(device_name)
+    async with server:
+        await asyncio.gather(_fan_out(), _fan_out_alerts())
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--device-name", default="XIAOMG25_BLE")
+    args = p.parse_args()
+    try:
+        asyncio.run(run(args.device_name))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
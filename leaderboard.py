@@ -0,0 +1,177 @@
+"""Friends leaderboard.
+
+Each user's posture is summarised per day as straight/slouch tick counts. The
+leaderboard keeps those totals in memory and maintains one sorted ranking per
+period (a day, or an ISO week) that is updated incrementally whenever a user's
+totals change, so a query is a couple of bisects and a slice rather than a
+scan over every user's counters.
+
+Users are ranked by straight-time percentage, then by streak: the number of
+consecutive days (up to the ranked day) with at least STREAK_GOAL percent
+straight time.
+
+The local wearer's totals come from the service's own counters (ticked live by
+`ble_service`); friends' gateways report theirs through the API.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left, insort
+from datetime import date as Date, timedelta
+from typing import Dict, List, Tuple
+
+STREAK_GOAL = 70.0
+# Days of per-user history kept in memory (enough for weekly ranks + streaks).
+KEEP_DAYS = 60
+PERIODS = ("daily", "weekly")
+
+# (-score, -streak, user): ascending order is best first, ties broken by name.
+_Key = Tuple[float, int, str]
+
+
+def week_key(day: str) -> str:
+    iso = Date.fromisoformat(day).isocalendar()
+    return f"{iso[0]}-W{iso[1]:02d}"
+
+
+def _pct(straight: int, slouch: int) -> float:
+    total = straight + slouch
+    return round(100.0 * straight / total, 2) if total else 0.0
+
+
+class Ranking:
+    """Users sorted by key, with O(log n) rank lookup."""
+
+    def __init__(self) -> None:
+        self._keys: List[_Key] = []
+        self._by_user: Dict[str, _Key] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def update(self, user: str, score: float, streak: int) -> None:
+        new = (-score, -streak, user)
+        old = self._by_user.get(user)
+        if old == new:
+            return
+        if old is not None:
+            del self._keys[bisect_left(self._keys, old)]
+        insort(self._keys, new)
+        self._by_user[user] = new
+
+    def rank(self, user: str) -> int | None:
+        """0-based rank of `user`, or None if not ranked."""
+        key = self._by_user.get(user)
+        return None if key is None else bisect_left(self._keys, key)
+
+    def slice(self, lo: int, hi: int) -> List[_Key]:
+        return self._keys[max(0, lo):hi]
+
+
+class Leaderboard:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._daily: Dict[str, Dict[str, List[int]]] = {}   # day -> user -> [straight, slouch]
+        self._weekly: Dict[str, Dict[str, List[int]]] = {}  # week -> user -> [straight, slouch]
+        self._rankings: Dict[Tuple[str, str], Ranking] = {}
+
+    def add(self, user: str, day: str, straight: int = 0, slouch: int = 0, replace: bool = False) -> None:
+        """Add ticks to `user`'s totals for `day` (or set them with replace=True)."""
+        with self._lock:
+            totals = self._daily.setdefault(day, {}).setdefault(user, [0, 0])
+            week = self._weekly.setdefault(week_key(day), {}).setdefault(user, [0, 0])
+            if replace:
+                week[0] += straight - totals[0]
+                week[1] += slouch - totals[1]
+                totals[0], totals[1] = straight, slouch
+            else:
+                totals[0] += straight
+                totals[1] += slouch
+                week[0] += straight
+                week[1] += slouch
+            self._rerank(user, day)
+            # Later days' streaks build on this one, so refresh them too.
+            d = Date.fromisoformat(day) + timedelta(days=1)
+            while user in self._daily.get(d.isoformat(), {}):
+                self._rerank(user, d.isoformat())
+                d += timedelta(days=1)
+
+    def _rerank(self, user: str, day: str) -> None:
+        streak = self._streak(user, day)
+        week = week_key(day)
+        self._ranking("daily", day).update(user, _pct(*self._daily[day][user]), streak)
+        self._ranking("weekly", week).update(user, _pct(*self._weekly[week][user]), streak)
+
+    def _ranking(self, period: str, key: str) -> Ranking:
+        ranking = self._rankings.get((period, key))
+        if ranking is None:
+            ranking = self._rankings[(period, key)] = Ranking()
+        return ranking
+
+    def _meets_goal(self, user: str, day: Date) -> bool:
+        totals = self._daily.get(day.isoformat(), {}).get(user)
+        return totals is not None and _pct(*totals) >= STREAK_GOAL
+
+    def _streak(self, user: str, day: str) -> int:
+        """Consecutive goal days ending at `day`, or at the day before if
+        `day` itself hasn't reached the goal yet (it may still get there)."""
+        d = Date.fromisoformat(day)
+        if not self._meets_goal(user, d):
+            d -= timedelta(days=1)
+        n = 0
+        while n < KEEP_DAYS and self._meets_goal(user, d):
+            n += 1
+            d -= timedelta(days=1)
+        return n
+
+    def prune(self, today: str) -> None:
+        """Forget days older than KEEP_DAYS before `today`."""
+        cutoff = (Date.fromisoformat(today) - timedelta(days=KEEP_DAYS)).isoformat()
+        with self._lock:
+            for day in [d for d in self._daily if d < cutoff]:
+                del self._daily[day]
+                self._rankings.pop(("daily", day), None)
+            live_weeks = {week_key(d) for d in self._daily}
+            for week in [w for w in self._weekly if w not in live_weeks]:
+                del self._weekly[week]
+                self._rankings.pop(("weekly", week), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._daily.clear()
+            self._weekly.clear()
+            self._rankings.clear()
+
+    def query(self, period: str, day: str, user: str | None = None, k: int = 10, neighbors: int = 2) -> dict:
+        """Top-k for the period containing `day`, plus `user`'s rank and neighbours."""
+        if period not in PERIODS:
+            raise ValueError(f"unknown period: {period}")
+        key = day if period == "daily" else week_key(day)
+        with self._lock:
+            ranking = self._rankings.get((period, key)) or Ranking()
+            totals = (self._daily if period == "daily" else self._weekly).get(key, {})
+
+            def entry(rank: int, k: _Key) -> dict:
+                straight, slouch = totals.get(k[2], (0, 0))
+                return {"rank": rank + 1, "user": k[2], "score": -k[0], "streak": -k[1], "straight": straight, "slouch": slouch}
+
+            out = {
+                "period": period,
+                "key": key,
+                "total": len(ranking),
+                "top": [entry(i, x) for i, x in enumerate(ranking.slice(0, k))],
+            }
+            if user is not None:
+                r = ranking.rank(user)
+                if r is None:
+                    out["user"] = None
+                    out["neighbors"] = []
+                else:
+                    lo = max(0, r - neighbors)
+                    out["user"] = entry(r, ranking.slice(r, r + 1)[0])
+                    out["neighbors"] = [entry(lo + i, x) for i, x in enumerate(ranking.slice(lo, r + neighbors + 1))]
+            return out
+
+
+board = Leaderboard()
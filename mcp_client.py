@@ -5,14 +5,18 @@ Runs fully free using Groq's Llama 3 API.
 """
 
 import asyncio
+import heapq
+import itertools
 import json
 import logging
 import os
-from typing import Any, Dict, List, Optional
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from dataclasses import dataclass
 from enum import Enum
 import aiohttp
-from openai import AsyncOpenAI  # Groq uses OpenAI-compatible API
+from openai import APIConnectionError, AsyncOpenAI  # Groq uses OpenAI-compatible API
 from dotenv import load_dotenv
 load_dotenv()
 # ────────────────────────────────────────────────────────────────
@@ -25,6 +29,248 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Any OpenAI-compatible chat-completions API works; LLM_BASE_URL points the
+# client elsewhere (e.g. fake_llm.py for offline load tests).
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+LLM_BASE_URL = os.getenv("LLM_BASE_URL", GROQ_BASE_URL)
+MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:5000")
+
+
+_openai_clients: Dict[tuple, AsyncOpenAI] = {}
+
+
+def _openai_client(api_key: str, base_url: str) -> AsyncOpenAI:
+    """Shared client per key and endpoint. Creating one per chat costs tens
+    of milliseconds of CPU and a fresh connection pool. Retries are left to
+    the scheduler."""
+    key = (api_key, base_url)
+    if key not in _openai_clients:
+        _openai_clients[key] = AsyncOpenAI(api_key=api_key, base_url=base_url, max_retries=0)
+    return _openai_clients[key]
+
+
+# ────────────────────────────────────────────────────────────────
+# LLM request scheduling
+# Every completion goes through one shared LLMScheduler: at most
+# LLM_MAX_IN_FLIGHT at a time, started no faster than a token bucket of
+# LLM_RATE_PER_S (bursts of LLM_BURST), interactive chat before background
+# summaries. 429/5xx/connection errors are retried with jittered backoff,
+# waiting at least as long as Retry-After; a 429 also pauses every other
+# request for that long. When the queue is full or a request could not
+# start within LLM_MAX_WAIT_S it fails fast with Overloaded (HTTP 503)
+# instead of timing out later.
+# ────────────────────────────────────────────────────────────────
+
+PRIORITY_CHAT = 0
+PRIORITY_SUMMARY = 1
+
+
+class Overloaded(Exception):
+    """The request was shed; the caller may retry after `retry_after` seconds."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    """Seconds from a Retry-After (or retry-after-ms) response header."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return max(0.0, float(headers["retry-after"]))
+    except ValueError:
+        pass  # HTTP-date form: fall back to our own backoff
+    return None
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        max_in_flight: int = 4,
+        rate_per_s: float = 0.5,
+        burst: int = 5,
+        max_queue: int = 32,
+        max_wait_s: float = 30.0,
+        max_retries: int = 3,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 20.0,
+    ):
+        self.max_in_flight = max_in_flight
+        self.rate_per_s = rate_per_s  # 0 disables the token bucket
+        self.burst = burst
+        self.max_queue = max_queue
+        self.max_wait_s = max_wait_s
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self._tokens = float(burst)
+        self._refilled = time.monotonic()
+        self._paused_until = 0.0
+        self._in_flight = 0
+        self._waiters: List[list] = []  # heap of [priority, ticket, future]
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats: Dict[str, int] = {"started": 0, "completed": 0, "retried": 0, "shed": 0, "failed": 0}
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            **self.stats,
+            "in_flight": self._in_flight,
+            "queued": sum(1 for w in self._waiters if not w[2].done()),
+            "tokens": round(self._tokens, 2),
+            "paused_for_s": round(max(0.0, self._paused_until - now), 2),
+        }
+
+    def ticket(self) -> int:
+        """Queue position for a multi-call job; see call()."""
+        return next(self._seq)
+
+    async def call(
+        self, priority: int, fn: Callable[..., Awaitable[Any]], *args: Any, ticket: Optional[int] = None, **kwargs: Any
+    ) -> Any:
+        """Run `await fn(*args, **kwargs)` under the scheduler's limits.
+
+        Within a priority, waiters are served in ticket order. Passing the
+        same ticket for every call of one chat lets its follow-up calls go
+        ahead of chats that haven't started, so work in progress finishes.
+        """
+        if ticket is None:
+            ticket = self.ticket()
+        attempt = 0
+        while True:
+            await self._acquire(priority, ticket)
+            try:
+                result = await fn(*args, **kwargs)
+                self.stats["completed"] += 1
+                return result
+            except Exception as exc:
+                error = exc
+                delay = self._retry_delay(exc, attempt)
+                if delay is None:
+                    self.stats["failed"] += 1
+                    raise
+                if attempt >= self.max_retries or delay > self.max_wait_s:
+                    self.stats["failed"] += 1
+                    if getattr(exc, "status_code", None) == 429:
+                        raise Overloaded("LLM provider rate limit reached", delay) from exc
+                    raise
+            finally:
+                self._release()
+            attempt += 1
+            self.stats["retried"] += 1
+            logger.warning(f"LLM call failed ({error}); retry {attempt} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, exc: Exception, attempt: int) -> Optional[float]:
+        """Backoff before retrying `exc`, or None when it isn't retryable."""
+        status = getattr(exc, "status_code", None)
+        if not (isinstance(exc, APIConnectionError) or status == 429 or (status is not None and status >= 500)):
+            return None
+        delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt))
+        hinted = _retry_after(exc)
+        if hinted is not None:
+            # never earlier than asked; spread the retries a little after it
+            delay = hinted + random.uniform(0, 0.1 * hinted + 0.05)
+        if status == 429:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    def _refill(self, now: float) -> None:
+        if self.rate_per_s > 0:
+            self._tokens = min(self.burst, self._tokens + (now - self._refilled) * self.rate_per_s)
+        self._refilled = now
+
+    def _can_start(self, now: float) -> bool:
+        if self._in_flight >= self.max_in_flight or now < self._paused_until:
+            return False
+        self._refill(now)
+        return self.rate_per_s <= 0 or self._tokens >= 1
+
+    def _start(self) -> None:
+        self._in_flight += 1
+        if self.rate_per_s > 0:
+            self._tokens -= 1
+        self.stats["started"] += 1
+
+    def _release(self) -> None:
+        self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the most important waiters."""
+        now = time.monotonic()
+        while self._waiters:
+            fut = self._waiters[0][2]
+            if fut.done():  # gave up or was shed
+                heapq.heappop(self._waiters)
+                continue
+            if not self._can_start(now):
+                break
+            heapq.heappop(self._waiters)
+            self._start()
+            fut.set_result(None)
+        if self._waiters and self._in_flight < self.max_in_flight and self._timer is None:
+            # waiting on the bucket or a Retry-After pause: wake up when it opens
+            delay = max(self._paused_until - now, (1 - self._tokens) / self.rate_per_s if self.rate_per_s > 0 else 0.0)
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0.001), self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._dispatch()
+
+    def _shed_one(self, priority: int) -> None:
+        """Queue full: drop the newest waiter less important than `priority`,
+        or refuse the new request."""
+        live = [w for w in self._waiters if not w[2].done()]
+        if len(live) < self.max_queue:
+            return
+        victim = max(live, key=lambda w: (w[0], w[1]))
+        if victim[0] <= priority:
+            self.stats["shed"] += 1
+            raise Overloaded("LLM queue full", self._expected_wait())
+        self.stats["shed"] += 1
+        victim[2].set_exception(Overloaded("LLM queue full", self._expected_wait()))
+
+    def _expected_wait(self) -> float:
+        queued = sum(1 for w in self._waiters if not w[2].done())
+        per_s = self.rate_per_s if self.rate_per_s > 0 else float(self.max_in_flight)
+        return max(1.0, queued / per_s, self._paused_until - time.monotonic())
+
+    async def _acquire(self, priority: int, ticket: int) -> None:
+        now = time.monotonic()
+        if not any(not w[2].done() for w in self._waiters) and self._can_start(now):
+            self._start()
+            return
+        self._shed_one(priority)
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, ticket, fut])
+        self._dispatch()
+        try:
+            await asyncio.wait_for(fut, self.max_wait_s)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as exc:
+            if fut.done() and not fut.cancelled() and fut.exception() is None:
+                self._release()  # the slot was granted just as we gave up
+            if isinstance(exc, asyncio.TimeoutError):
+                self.stats["shed"] += 1
+                raise Overloaded("LLM request waited too long", self._expected_wait())
+            raise
+
+
+scheduler = LLMScheduler(
+    max_in_flight=int(os.getenv("LLM_MAX_IN_FLIGHT", "4")),
+    rate_per_s=float(os.getenv("LLM_RATE_PER_S", "0.5")),
+    burst=int(os.getenv("LLM_BURST", "5")),
+    max_queue=int(os.getenv("LLM_MAX_QUEUE", "32")),
+    max_wait_s=float(os.getenv("LLM_MAX_WAIT_S", "30")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+)
+
 
 class MCPMessageType(Enum):
     REQUEST = "request"
@@ -41,20 +287,24 @@ class MCPTool:
 
 
 class MCPClient:
-    def __init__(self, groq_api_key: str, mcp_server_url: str = "http://localhost:5000"):
+    def __init__(self, groq_api_key: str, mcp_server_url: str = MCP_SERVER_URL, base_url: str = LLM_BASE_URL):
         self.groq_api_key = groq_api_key
         self.mcp_server_url = mcp_server_url
-        self.openai_client = AsyncOpenAI(
-            api_key=groq_api_key,
-            base_url="https://api.groq.com/openai/v1"  # 👈 Groq endpoint
-        )
+        self.openai_client = _openai_client(groq_api_key, base_url)
         self.session: Optional[aiohttp.ClientSession] = None
         self.available_tools: List[MCPTool] = []
         self._request_id_counter = 0
+        # seconds spent per stage: mcp_connect, llm_plan, tool, llm_answer
+        self.timings: Dict[str, float] = {}
+
+    def _timed(self, stage: str, started: float) -> None:
+        self.timings[stage] = self.timings.get(stage, 0.0) + time.perf_counter() - started
 
     async def __aenter__(self):
         self.session = aiohttp.ClientSession()
+        started = time.perf_counter()
         await self.connect()
+        self._timed("mcp_connect", started)
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
@@ -115,10 +365,16 @@ class MCPClient:
     async def execute_tool(self, tool_name: str, args: Dict[str, Any]) -> Dict[str, Any]:
         """Call an MCP tool"""
         response = await self._send_mcp_request("tools/call", {"name": tool_name, "arguments": args})
+        if response.get("error"):
+            return {"error": response["error"].get("message", "tool failed")}
         return response.get("result", {})
 
-    async def chat_with_tools(self, user_message: str, model: str = "llama-3.1-8b-instant") -> str:
-        """Send a message to Llama 3 that only responds to posture-related queries"""
+    async def chat_with_tools(self, user_message: str, model: str = "llama-3.1-8b-instant", priority: int = PRIORITY_CHAT) -> str:
+        """Send a message to Llama 3 that only responds to posture-related queries.
+
+        Completions go through the shared `scheduler`; raises Overloaded when
+        it sheds the request.
+        """
         try:
             # Prepare system prompt
             messages = [
@@ -130,7 +386,8 @@ class MCPClient:
                         "If a question is unrelated to posture, posture advice, neck angle, slouching, ergonomics, breathing, advice, or previous replies "
                         "politely refuse with: 'Sorry! I can only answer posture-related questions based on your necklace data.' "
                         "Assume the most recent day is today, if there are no entries on a date, do not make up data, do not hallucinate data."
-                        "Keep replies short, supportive, and data-driven."
+                        "Keep replies short, supportive, and data-driven. "
+                        f"Today is {time.strftime('%Y-%m-%d (%A)')}; call the tools with the dates the question needs."
                     ),
                 },
                 {"role": "user", "content": user_message},
@@ -148,7 +405,12 @@ class MCPClient:
                 for tool in self.available_tools
             ]
 
-            response = await self.openai_client.chat.completions.create(
+            ticket = scheduler.ticket()
+            started = time.perf_counter()
+            response = await scheduler.call(
+                priority,
+                self.openai_client.chat.completions.create,
+                ticket=ticket,
                 model=model,
                 messages=messages,
                 tools=openai_tools if openai_tools else None,
@@ -157,30 +419,39 @@ class MCPClient:
                 # no tools are present.
                 tool_choice=("auto" if openai_tools else "none"),
             )
+            self._timed("llm_plan", started)
 
             message = response.choices[0].message
 
             # Handle tool calls
             if message.tool_calls:
+                # the tool results must follow the assistant turn that asked for them
+                messages.append(message.model_dump(exclude_none=True))
                 for tool_call in message.tool_calls:
                     tool_name = tool_call.function.name
                     tool_args = json.loads(tool_call.function.arguments or "{}")
+                    started = time.perf_counter()
                     tool_result = await self.execute_tool(tool_name, tool_args)
+                    self._timed("tool", started)
                     messages.append(
                         {
                             "role": "tool",
                             "tool_call_id": tool_call.id,
                             "name": tool_name,
-                            "content": json.dumps(tool_result),
+                            "content": json.dumps(tool_result, separators=(",", ":")),
                         }
                     )
 
-                final_response = await self.openai_client.chat.completions.create(
-                    model=model, messages=messages
+                started = time.perf_counter()
+                final_response = await scheduler.call(
+                    priority, self.openai_client.chat.completions.create, ticket=ticket, model=model, messages=messages
                 )
+                self._timed("llm_answer", started)
                 return final_response.choices[0].message.content
             else:
                 return message.content
+        except Overloaded:
+            raise
         except Exception as e:
             logger.error(f"Error in chat_with_tools: {e}")
             return f"Error: {str(e)}"
@@ -189,12 +460,12 @@ class MCPClient:
 class MCPChatGroq:
     """Simple interface for PostureBot (Groq version)"""
 
-    def __init__(self, groq_api_key: str, mcp_server_url: str = "http://localhost:5000"):
-        self.client = MCPClient(groq_api_key, mcp_server_url)
+    def __init__(self, groq_api_key: str, mcp_server_url: str = MCP_SERVER_URL, base_url: str = LLM_BASE_URL):
+        self.client = MCPClient(groq_api_key, mcp_server_url, base_url)
 
-    async def chat(self, message: str, model) -> str:
+    async def chat(self, message: str, model, priority: int = PRIORITY_CHAT) -> str:
         async with self.client:
-            return await self.client.chat_with_tools(message, model)
+            return await self.client.chat_with_tools(message, model, priority)
 
 
 async def main():
@@ -207,8 +478,9 @@ async def main():
 
     bot = MCPChatGroq(groq_api_key)
 
-    response = await bot.chat("Am I improving compared to yesterday?", model="llama-3.1-8b-instant")
+    response = await bot.chat("Am I improving compared to yesterday?", model="llama-3.1-8b-instant", priority=PRIORITY_SUMMARY)
     print("\n PostureBot:", response)
+    return response
 
 
 if __name__ == "__main__":
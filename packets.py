@@ -0,0 +1,217 @@
+"""Decoding of IMU notifications from the necklace.
+
+Two payload formats are accepted on the same characteristic:
+
+Legacy (what `backend` sends today): exactly one sample, 6 bytes
+ax, ay, az, gx, gy, gz, each an int8 offset by 128. It carries no sequence
+number or device time, so it's stamped with the host arrival time and losses
+can't be detected.
+
+Packed, version 1: a 10-byte little-endian header followed by N samples in
+the legacy 6-byte encoding:
+
+    offset  size  field
+    0       1     version (1)
+    1       1     N, number of samples
+    2       2     sequence number, +1 per notification, wraps at 65536
+    4       4     device time of the first sample in ms, wraps at 2**32
+    8       2     sample interval in ms
+    10      6*N   samples
+
+Device timestamps are mapped onto host time with a running offset (the
+smallest host-minus-device difference seen, allowed to drift slowly), so
+sample times keep the device's spacing instead of BLE delivery jitter.
+Sequence gaps are counted as lost packets and, using the device clock, lost
+samples.
+
+Bulk uploads (POST /ingest/bulk) carry what the device buffered while out of
+range. The body is a 24-byte little-endian header, every sample time, then
+every sample in the same 6-byte encoding, so a device can send its buffer as
+is:
+
+    offset   size  field
+    0        4     magic b"PBLK"
+    4        1     version (1)
+    5        3     reserved, zero
+    8        4     N, number of samples
+    12       8     t0, epoch time of the time base in microseconds (signed)
+    20       4     tick, microseconds per time unit (1000 for a ms clock)
+    24       4*N   sample times in ticks after t0 (uint32, any order)
+    24+4*N   6*N   samples
+
+Unlike notifications the times are absolute already: the uploader maps its
+clock to epoch time once for the whole buffer.
+"""
+
+from __future__ import annotations
+
+import struct
+from collections import deque
+from typing import Any, Dict
+
+import numpy as np
+
+
+VERSION = 1
+HEADER = struct.Struct("<BBHIH")
+SAMPLE_SIZE = 6
+LEGACY_SIZE = SAMPLE_SIZE
+
+BULK_MAGIC = b"PBLK"
+BULK_VERSION = 1
+BULK_HEADER = struct.Struct("<4sB3xIqI")
+BULK_SAMPLE_SIZE = 4 + SAMPLE_SIZE
+BULK_MAX_SAMPLES = 4_000_000
+
+# How fast the host/device clock offset may creep upwards (s per s), so the
+# mapping follows crystal drift without absorbing one-off delivery delays.
+_MAX_DRIFT = 1e-4
+# A device clock that goes back by more than this (without wrapping) means
+# the device restarted; smaller steps back are reordered notifications.
+_REBOOT_MS = 2000
+
+
+def encode(seq: int, t_ms: int, interval_ms: int, samples: Any) -> bytes:
+    """Build a packed v1 payload from an (N, 6) array of signed samples."""
+    arr = np.asarray(samples, dtype=np.int16).reshape(-1, SAMPLE_SIZE)
+    body = (np.clip(arr, -128, 127) + 128).astype(np.uint8).tobytes()
+    return HEADER.pack(VERSION, len(arr), seq & 0xFFFF, t_ms & 0xFFFFFFFF, interval_ms) + body
+
+
+def encode_bulk(t0_us: int, tick_us: int, ticks: Any, samples: Any) -> bytes:
+    """Build a bulk upload body from tick offsets and an (N, 6) array of signed samples."""
+    offsets = np.asarray(ticks, dtype=np.uint32)
+    arr = np.asarray(samples, dtype=np.int16).reshape(-1, SAMPLE_SIZE)
+    if len(offsets) != len(arr):
+        raise ValueError("ticks and samples differ in length")
+    body = (np.clip(arr, -128, 127) + 128).astype(np.uint8).tobytes()
+    return BULK_HEADER.pack(BULK_MAGIC, BULK_VERSION, len(arr), t0_us, tick_us) + offsets.astype("<u4").tobytes() + body
+
+
+def decode_bulk(data: bytes) -> tuple[np.ndarray, np.ndarray]:
+    """Return (ts_us, samples) for a bulk upload body.
+
+    `ts_us` is int64 epoch microseconds, `samples` an (N, 6) int16 array of
+    signed values in AXES order, both in upload order. Raises ValueError if
+    the body is malformed.
+    """
+    if len(data) < BULK_HEADER.size:
+        raise ValueError("body shorter than the bulk header")
+    magic, version, n, t0_us, tick_us = BULK_HEADER.unpack_from(data)
+    if magic != BULK_MAGIC or version != BULK_VERSION:
+        raise ValueError(f"not a bulk v{BULK_VERSION} body")
+    if n > BULK_MAX_SAMPLES:
+        raise ValueError(f"more than {BULK_MAX_SAMPLES} samples")
+    if len(data) != BULK_HEADER.size + n * BULK_SAMPLE_SIZE:
+        raise ValueError(f"body is {len(data)} bytes, header says {n} samples")
+    if tick_us == 0:
+        raise ValueError("tick must be positive")
+    ticks = np.frombuffer(data, dtype="<u4", count=n, offset=BULK_HEADER.size)
+    ts_us = t0_us + ticks.astype(np.int64) * tick_us
+    vals = np.frombuffer(data, dtype=np.uint8, offset=BULK_HEADER.size + 4 * n).astype(np.int16) - 128
+    return ts_us, vals.reshape(n, SAMPLE_SIZE)
+
+
+class PacketDecoder:
+    """Stateful decoder for one device's notification stream."""
+
+    def __init__(self) -> None:
+        self.gaps: deque = deque(maxlen=100)
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear the counters as well as the stream state."""
+        self.resync()
+        self.gaps.clear()
+        self.stats: Dict[str, int] = {
+            "notifications": 0,
+            "legacy": 0,
+            "samples": 0,
+            "lost_packets": 0,
+            "lost_samples": 0,
+            "duplicates": 0,
+            "malformed": 0,
+        }
+
+    def resync(self) -> None:
+        """Forget sequence and clock state (call on every (re)connect)."""
+        self._next_seq: int | None = None
+        self._next_ms: int | None = None  # unwrapped device ms expected next
+        self._last_raw_ms: int | None = None
+        self._wraps = 0
+        self._offset: float | None = None  # host seconds minus device seconds
+        self._last_host: float | None = None
+
+    def decode(self, data: bytes | bytearray, host_time: float) -> tuple[np.ndarray, np.ndarray] | None:
+        """Return (samples, times) for one notification, or None to drop it.
+
+        `samples` is an (N, 6) int16 array of signed values in AXES order and
+        `times` the epoch time of each sample.
+        """
+        stats = self.stats
+        stats["notifications"] += 1
+        size = len(data)
+        if size >= HEADER.size + SAMPLE_SIZE and data[0] == VERSION and size == HEADER.size + data[1] * SAMPLE_SIZE:
+            return self._decode_packed(data, host_time)
+        if size < LEGACY_SIZE:
+            stats["malformed"] += 1
+            return None
+        # legacy: one sample, extra trailing bytes ignored as before
+        stats["legacy"] += 1
+        stats["samples"] += 1
+        vals = np.frombuffer(bytes(data[:LEGACY_SIZE]), dtype=np.uint8).astype(np.int16) - 128
+        return vals.reshape(1, SAMPLE_SIZE), np.array([host_time])
+
+    def _decode_packed(self, data: bytes | bytearray, host_time: float) -> tuple[np.ndarray, np.ndarray] | None:
+        stats = self.stats
+        _, n, seq, raw_ms, interval = HEADER.unpack_from(data)
+
+        last = self._last_raw_ms
+        if last is not None and _REBOOT_MS < last - raw_ms < 0x80000000:
+            # device clock jumped back without wrapping: it rebooted
+            self.resync()
+        if self._next_seq is not None:
+            ahead = (seq - self._next_seq) & 0xFFFF
+            if ahead >= 0x8000:
+                # an old or repeated notification
+                stats["duplicates"] += 1
+                return None
+        dev_ms = self._unwrap(raw_ms)
+        if self._next_seq is not None and ahead:
+            lost = ahead * n
+            if interval and self._next_ms is not None and dev_ms > self._next_ms:
+                lost = int(round((dev_ms - self._next_ms) / interval))
+            stats["lost_packets"] += ahead
+            stats["lost_samples"] += lost
+            self.gaps.append({"at": host_time, "lost_packets": ahead, "lost_samples": lost,
+                              "gap_ms": dev_ms - self._next_ms if self._next_ms is not None else None})
+        self._next_seq = (seq + 1) & 0xFFFF
+        self._next_ms = dev_ms + n * interval
+
+        # The notification left the device right after its last sample.
+        dev_last = (dev_ms + (n - 1) * interval) / 1000.0
+        candidate = host_time - dev_last
+        if self._offset is None or candidate < self._offset:
+            self._offset = candidate
+        else:
+            self._offset = min(candidate, self._offset + _MAX_DRIFT * (host_time - self._last_host))
+        self._last_host = host_time
+
+        stats["samples"] += n
+        vals = np.frombuffer(bytes(data), dtype=np.uint8, offset=HEADER.size).astype(np.int16) - 128
+        times = self._offset + (dev_ms + np.arange(n) * interval) / 1000.0
+        return vals.reshape(n, SAMPLE_SIZE), times
+
+    def _unwrap(self, raw_ms: int) -> int:
+        last = self._last_raw_ms
+        if last is not None and last - raw_ms > 0x80000000:
+            self._wraps += 1
+        self._last_raw_ms = raw_ms
+        return raw_ms + (self._wraps << 32)
+
+    def summary(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = dict(self.stats)
+        expected = out["samples"] + out["lost_samples"]
+        out["loss_ratio"] = round(out["lost_samples"] / expected, 6) if expected else 0.0
+        out["recent_gaps"] = list(self.gaps)
+        return out
@@ -2,59 +2,187 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 import uvicorn
 from typing import Any, Dict, Optional
+import datetime
+import os
 import httpx
 
 app = FastAPI()
 
-async def _send_mcp_request(_, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-    # Mock data mode
+# The posture data API (server.py) the tools are answered from.
+API_URL = os.environ.get("POSTURE_API_URL", "http://127.0.0.1:8000")
+
+# Each tool takes arguments and returns a small JSON object built from the
+# counter rollups, so a chat turn carries only the numbers the question
+# needs. Keep names and descriptions short: the schemas go into every
+# prompt. Dates are YYYY-MM-DD ('today' and 'yesterday' are accepted too).
+_DATE = {"type": "string", "format": "date"}
+
+TOOLS = [
+    {
+        "name": "get_daily_stats",
+        "description": "Posture per day, start..end inclusive (end defaults to start), with totals.",
+        "inputSchema": {"type": "object", "properties": {"start": _DATE, "end": _DATE}, "required": ["start"]},
+    },
+    {
+        "name": "compare_periods",
+        "description": "Posture totals of period a vs b (start..end inclusive); delta = b - a.",
+        "inputSchema": {
+            "type": "object",
+            "properties": {"a_start": _DATE, "a_end": _DATE, "b_start": _DATE, "b_end": _DATE},
+            "required": ["a_start", "b_start"],
+        },
+    },
+    {
+        "name": "get_hourly_breakdown",
+        "description": "Posture per hour of one day.",
+        "inputSchema": {"type": "object", "properties": {"date": _DATE}, "required": ["date"]},
+    },
+    {
+        "name": "get_live_sample",
+        "description": "Latest sensor sample (accel ax/ay/az, gyro gx/gy/gz, pitch degrees).",
+        "inputSchema": {"type": "object", "properties": {}},
+    },
+]
+
+
+class ToolError(Exception):
+    pass
+
+
+def _day(value: Optional[str], default: Optional[str] = None) -> str:
+    """Resolve 'today'/'yesterday' and validate YYYY-MM-DD."""
+    value = (value or default or "").strip().lower()
+    today = datetime.date.today()
+    if value == "today":
+        return today.isoformat()
+    if value == "yesterday":
+        return (today - datetime.timedelta(days=1)).isoformat()
+    try:
+        return datetime.date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ToolError(f"bad date {value!r}, expected YYYY-MM-DD, 'today' or 'yesterday'")
+
+
+async def _get(client: httpx.AsyncClient, path: str, **params: Any) -> Any:
+    resp = await client.get(path, params=params)
+    if resp.status_code == 404:
+        return None
+    if resp.status_code != 200:
+        raise ToolError(f"upstream returned {resp.status_code}: {resp.text}")
+    return resp.json()
+
+
+async def get_daily_stats(client: httpx.AsyncClient, args: Dict[str, Any]) -> Dict[str, Any]:
+    start = _day(args.get("start"), "today")
+    end = _day(args.get("end"), start)
+    # a single day's row would only repeat the totals
+    return await _get(client, "/db/stats", start=min(start, end), end=max(start, end), rows=str(start != end).lower())
+
+
+async def compare_periods(client: httpx.AsyncClient, args: Dict[str, Any]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for key in ("a", "b"):
+        start = _day(args.get(f"{key}_start"))
+        end = _day(args.get(f"{key}_end"), start)
+        stats = await _get(client, "/db/stats", start=min(start, end), end=max(start, end), rows="false")
+        out[key] = {"start": stats["start"], "end": stats["end"], "days_with_data": stats["days_with_data"], **stats["total"]}
+    for side in out.values():
+        days = side["days_with_data"]
+        side["slouches_per_day"] = round(side["slouches"] / days, 1) if days else None
+        side["alerts_per_day"] = round(side["alerts"] / days, 1) if days else None
+    a, b = out["a"], out["b"]
+    delta = {
+        column: round(b[column] - a[column], 1)
+        for column in ("slouch_pct", "slouches_per_day", "alerts_per_day")
+        if a[column] is not None and b[column] is not None
+    }
+    out["delta"] = delta
+    return out
+
+
+async def get_hourly_breakdown(client: httpx.AsyncClient, args: Dict[str, Any]) -> Dict[str, Any]:
+    return await _get(client, "/db/stats/hourly", date=_day(args.get("date"), "today"))
+
+
+async def get_live_sample(client: httpx.AsyncClient, args: Dict[str, Any]) -> Dict[str, Any]:
+    latest = await _get(client, "/data/latest")
+    if not latest:
+        return {"sample": None}
+    return {k: round(v, 1) if isinstance(v, float) else v for k, v in latest.items()}
+
+
+async def get_posture_data(client: httpx.AsyncClient, args: Dict[str, Any]) -> Dict[str, Any]:
+    # Superseded by the tools above and no longer listed; still answered for
+    # clients that have it cached.
+    resp = await client.get("/db/description")
+    if resp.status_code != 200:
+        raise ToolError(f"upstream returned {resp.status_code}: {resp.text}")
+    return {"description": resp.text}
+
+
+TOOL_HANDLERS = {
+    "get_daily_stats": get_daily_stats,
+    "compare_periods": compare_periods,
+    "get_hourly_breakdown": get_hourly_breakdown,
+    "get_live_sample": get_live_sample,
+    "get_posture_data": get_posture_data,
+}
+
+
+async def call_tool(client: httpx.AsyncClient, name: str, args: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    handler = TOOL_HANDLERS.get(name)
+    if handler is None:
+        return {"error": {"message": f"Unknown tool: {name}"}}
+    try:
+        return {"result": await handler(client, args or {})}
+    except ToolError as exc:
+        return {"error": {"message": str(exc)}}
+    except Exception as exc:
+        return {"error": {"message": f"Failed to call upstream posture API: {exc}"}}
+
+
+async def _send_mcp_request(client: httpx.AsyncClient, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     if method == "tools/list":
-        return {
-            "result": {
-                "tools": [
-                    {
-                        "name": "get_posture_data",
-                        "description": "This function gets a descriptive string for posture frequency and slouch percentage by date.",
-                        "inputSchema": {"type": "object", "properties": {}}
-                    }
-                ]
-            }
-        }
+        return {"result": {"tools": TOOLS}}
 
     elif method == "tools/call":
-        # Call the local FastAPI endpoint that returns the human-readable
-        # posture description and return it as the MCP call result. This
-        # allows the model (Groq Llama) to receive the summary text as a
-        # tool response.
-        try:
-            print('YAS')
-            async with httpx.AsyncClient(timeout=5.0) as client:
-                resp = await client.get("http://127.0.0.1:8000/db/description")
-            if resp.status_code == 200:
-                text = resp.text
-                return {"result": {"description": text}}
-            else:
-                return {"error": {"message": f"Upstream returned {resp.status_code}: {resp.text}"}}
-        except Exception as exc:
-            return {"error": {"message": f"Failed to call upstream description API: {exc}"}}
+        params = params or {}
+        return await call_tool(client, params.get("name", ""), params.get("arguments"))
 
     elif method == "initialize":
         return {"result": {"status": "ok"}}
 
-    return {"error": {"message": "Mock: Unknown method"}}
+    return {"error": {"message": "Unknown method"}}
+
+
+# One pooled client for all requests: building an httpx client costs tens of
+# milliseconds of CPU (SSL context), which serialises a busy event loop.
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _api_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(base_url=API_URL, timeout=5.0)
+    return _client
+
+
+@app.on_event("shutdown")
+async def _close_client():
+    if _client is not None:
+        await _client.aclose()
 
 
 @app.post("/mcp")
 async def handle_mcp(request: Request):
-    print('watthefuck')
     body = await request.json()
     method = body.get("method")
     params = body.get("params")
-    result = await _send_mcp_request(None, method, params)
+    result = await _send_mcp_request(_api_client(), method, params)
     print('server side', result)
     return JSONResponse(result)
 
 
 if __name__ == "__main__":
-    print(" Starting mock MCP posture server on http://localhost:5000/mcp ...")
+    print(" Starting MCP posture server on http://localhost:5000/mcp ...")
     uvicorn.run(app, host="localhost", port=5000, log_level='debug')
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""Offline re-scoring of historical samples.
+
+The per-day `counters` (and the `hourly_counters` rollup) are only ever
+computed live in `ble_service.handle_indication`, so changing a threshold or
+detector leaves all history scored with the old rule. This job recomputes them
+from the raw `samples` table:
+
+- each day partition is split into ts_us ranges of about `chunk_size` rows
+  (time order, not id order: a bulk upload gives an older day ids above
+  newer days' rows) and scored in a ProcessPoolExecutor, one chunk per task;
+- each chunk is scored for both possible incoming slouch states, so chunks are
+  independent and the parent stitches them together in time order afterwards;
+- the chunk plan and finished chunks are checkpointed in
+  `rescore_day_chunks`, so an interrupted run picks up where it left off when
+  started again with the same arguments;
+- the final counters are written in a single transaction, which first
+  rescores every chunk reached by samples stored while the job was running
+  (live samples at the end of today, or a bulk upload anywhere).
+
+Usage:
+  python rescore.py                          # default detector, all cores
+  python rescore.py --detector windowed --workers 4
+  python rescore.py --restart                # discard a half-finished job
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+import numpy as np
+
+import detectors
+
+
+COUNTER_NAMES = ("slouch_frequency", "slouch_time", "straight_time")
+SAMPLE_COLS = "t, ax, ay, az, gx, gy, gz"
+# open ends of a day's first and last ts_us range
+_MIN_TS, _MAX_TS = -(2**62), 2**62
+
+
+def _ensure_tables(conn: sqlite3.Connection) -> None:
+    with conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rescore_jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                detector TEXT NOT NULL,
+                chunk_size INTEGER NOT NULL,
+                min_id INTEGER NOT NULL,
+                max_id INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'running',
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        )
+        # the job's chunks; result is NULL until the chunk is scored
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rescore_day_chunks (
+                job_id INTEGER NOT NULL,
+                day TEXT NOT NULL,
+                lo_ts INTEGER NOT NULL,
+                hi_ts INTEGER NOT NULL,
+                result TEXT,
+                PRIMARY KEY (job_id, day, lo_ts)
+            )
+            """
+        )
+
+
+def _columns(rows: list) -> Dict[str, np.ndarray]:
+    arr = np.array(rows, dtype=np.float64).reshape(-1, 7)
+    return {k: arr[:, i] for i, k in enumerate(("t",) + detectors.AXES)}
+
+
+def _plan(conn: sqlite3.Connection, days: List[str], chunk_size: int) -> List[tuple]:
+    """(day, lo_ts, hi_ts) ranges of about chunk_size rows, in time order."""
+    import ble_service
+
+    out = []
+    for day in days:
+        table = ble_service._partition_table(day)
+        try:
+            n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            bounds = [_MIN_TS]
+            for offset in range(chunk_size, n, chunk_size):
+                # an index-only walk of the partition's ts_us index
+                ts = conn.execute(f"SELECT ts_us FROM {table} ORDER BY ts_us LIMIT 1 OFFSET ?", (offset,)).fetchone()[0]
+                if ts > bounds[-1]:
+                    bounds.append(ts)
+        except sqlite3.OperationalError:
+            # dropped (archived) meanwhile
+            continue
+        bounds.append(_MAX_TS)
+        out += [(day, lo, hi) for lo, hi in zip(bounds, bounds[1:])]
+    return out
+
+
+def score_chunk(db_path: str, detector_name: str, table: str, prev_table: str | None, lo_ts: int, hi_ts: int) -> dict:
+    """Score the samples of partition `table` with lo_ts <= ts_us < hi_ts, in
+    time order. Runs in a worker process.
+
+    Returns per-hour slouch/straight tick counts and, for an incoming state of
+    False and of True, per-hour transition counts and the outgoing state.
+    Keys are local 'YYYY-MM-DD HH' strings, matching how the live path dates
+    its counters. `prev_table` is the previous day's partition, for warm-up
+    history when the chunk starts its day.
+    """
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        probe = detectors.get_detector(detector_name)
+        # the rows just before the chunk in time, newest first: seeks on ts_us
+        prev: list = []
+        for source in (table, prev_table):
+            need = probe.warmup + 1 - len(prev)
+            if source is None or need <= 0:
+                continue
+            try:
+                prev += conn.execute(
+                    f"SELECT {SAMPLE_COLS} FROM {source} WHERE ts_us < ? ORDER BY ts_us DESC, id DESC LIMIT ?",
+                    (lo_ts, need),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                pass
+        prev.reverse()
+        try:
+            rows = conn.execute(
+                f"SELECT {SAMPLE_COLS}, strftime('%Y-%m-%d %H', created_at, 'localtime') "
+                f"FROM {table} WHERE ts_us >= ? AND ts_us < ? ORDER BY ts_us, id",
+                (lo_ts, hi_ts),
+            ).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+    finally:
+        conn.close()
+
+    out = {"starts_session": True, "count": len(rows), "ticks": {}, "freq": [{}, {}], "final": [False, True]}
+    if not rows:
+        return out
+
+    keys = [r[7] for r in rows]
+    cols = _columns([r[:7] for r in rows])
+    t = cols["t"]
+
+    # Warm-up history: the tail of the preceding rows from the same session.
+    history = None
+    if prev:
+        hist = _columns(prev)
+        if t[0] >= hist["t"][-1]:
+            out["starts_session"] = False
+            cut = np.flatnonzero(np.diff(hist["t"]) < 0)
+            start = int(cut[-1]) + 1 if cut.size else 0
+            history = {k: v[start:] for k, v in hist.items()}
+
+    uniq, inverse = np.unique(np.array(keys), return_inverse=True)
+    labels = [str(u) for u in uniq]
+    segments = np.split(np.arange(t.size), np.flatnonzero(np.diff(t) < 0) + 1)
+
+    for initial in (False, True):
+        det = detectors.get_detector(detector_name)
+        if history is not None and history["t"].size:
+            det.detect(history)
+        det.slouching = initial
+        over = np.zeros(t.size, dtype=bool)
+        rising = np.zeros(t.size, dtype=bool)
+        for n, seg in enumerate(segments):
+            if n > 0:
+                det.reset()
+            before = det.slouching
+            res = det.detect({k: v[seg] for k, v in cols.items()})
+            over[seg] = res.over
+            prev_state = np.concatenate(([before], res.state[:-1]))
+            rising[seg] = res.state & ~prev_state
+        freq = np.bincount(inverse, weights=rising, minlength=len(labels))
+        out["freq"][int(initial)] = {labels[i]: int(v) for i, v in enumerate(freq) if v}
+        out["final"][int(initial)] = det.slouching
+        if not initial:
+            slouch = np.bincount(inverse, weights=over, minlength=len(labels))
+            total = np.bincount(inverse, minlength=len(labels))
+            out["ticks"] = {labels[i]: [int(slouch[i]), int(total[i] - slouch[i])] for i in range(len(labels))}
+    return out
+
+
+def _merge(totals: Dict[str, List[int]], chunk: dict, state_in: bool) -> bool:
+    """Fold one chunk's result into `totals` and return the outgoing state."""
+    if chunk["starts_session"]:
+        state_in = False
+    for key, (slouch, straight) in chunk["ticks"].items():
+        acc = totals.setdefault(key, [0, 0, 0])
+        acc[1] += slouch
+        acc[2] += straight
+    for key, n in chunk["freq"][int(state_in)].items():
+        totals.setdefault(key, [0, 0, 0])[0] += n
+    return chunk["final"][int(state_in)] if chunk["count"] else state_in
+
+
+def _write_counters(conn: sqlite3.Connection, totals: Dict[str, List[int]]) -> None:
+    """Replace counters and hourly rollups for every date present in `totals`."""
+    dates = sorted({key[:10] for key in totals})
+    placeholders = ",".join("?" for _ in COUNTER_NAMES)
+    for date in dates:
+        conn.execute(f"DELETE FROM counters WHERE date = ? AND name IN ({placeholders})", (date, *COUNTER_NAMES))
+        conn.execute(f"DELETE FROM hourly_counters WHERE date = ? AND name IN ({placeholders})", (date, *COUNTER_NAMES))
+
+    daily: Dict[str, List[int]] = {}
+    hourly = []
+    for key, values in totals.items():
+        date, hour = key[:10], int(key[11:13])
+        acc = daily.setdefault(date, [0, 0, 0])
+        for i, (name, v) in enumerate(zip(COUNTER_NAMES, values)):
+            acc[i] += v
+            if v:
+                hourly.append((name, date, hour, v))
+    conn.executemany(
+        "INSERT INTO counters(name, date, value) VALUES (?, ?, ?)",
+        [(name, date, v) for date, values in daily.items() for name, v in zip(COUNTER_NAMES, values)],
+    )
+    conn.executemany("INSERT INTO hourly_counters(name, date, hour, value) VALUES (?, ?, ?, ?)", hourly)
+
+
+def rescore(db_path: str, detector_name: str, chunk_size: int = 500_000, workers: int | None = None, restart: bool = False) -> Dict[str, List[int]]:
+    """Recompute counters for all stored samples with `detector_name`."""
+    import ble_service
+
+    if detector_name not in detectors.DETECTORS:
+        raise KeyError(detector_name)
+
+    # Make sure the counters tables exist before we try to replace them.
+    ble_service.DB_PATH = db_path
+    ble_service._open_db()
+    table = ble_service._partition_table
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    _ensure_tables(conn)
+
+    job = conn.execute(
+        "SELECT id, min_id, max_id FROM rescore_jobs WHERE status = 'running' AND detector = ? AND chunk_size = ? "
+        "ORDER BY id DESC LIMIT 1",
+        (detector_name, chunk_size),
+    ).fetchone()
+    if job and restart:
+        with conn:
+            conn.execute("DELETE FROM rescore_day_chunks WHERE job_id = ?", (job[0],))
+            conn.execute("UPDATE rescore_jobs SET status = 'abandoned' WHERE id = ?", (job[0],))
+        job = None
+    if job is None:
+        # samples with a higher id than this arrive while the job runs
+        days = [r[0] for r in conn.execute("SELECT day FROM sample_partitions ORDER BY day")]
+        firsts = [conn.execute(f"SELECT MIN(id) FROM {table(d)}").fetchone()[0] for d in days]
+        lo = min((v for v in firsts if v is not None), default=0)
+        hi = ble_service._last_id
+        with conn:
+            cur = conn.execute(
+                "INSERT INTO rescore_jobs (detector, chunk_size, min_id, max_id) VALUES (?, ?, ?, ?)",
+                (detector_name, chunk_size, lo, hi),
+            )
+            conn.executemany(
+                "INSERT INTO rescore_day_chunks (job_id, day, lo_ts, hi_ts) VALUES (?, ?, ?, ?)",
+                [(cur.lastrowid, *chunk) for chunk in _plan(conn, days, chunk_size)],
+            )
+        job = (cur.lastrowid, lo, hi)
+        print(f"Started rescore job {job[0]}: ids {lo}..{hi} with '{detector_name}'")
+    else:
+        print(f"Resuming rescore job {job[0]}: ids {job[1]}..{job[2]} with '{detector_name}'")
+    job_id, min_id, max_id = job
+
+    chunks: Dict[tuple, dict | None] = {}
+    for day, lo_ts, hi_ts, result in conn.execute(
+        "SELECT day, lo_ts, hi_ts, result FROM rescore_day_chunks WHERE job_id = ?", (job_id,)
+    ):
+        chunks[(day, lo_ts, hi_ts)] = json.loads(result) if result else None
+    days = sorted({day for day, _, _ in chunks})
+    prev_day = dict(zip(days[1:], days))
+
+    def args(chunk: tuple) -> tuple:
+        day, lo_ts, hi_ts = chunk
+        before = prev_day.get(day)
+        return db_path, detector_name, table(day), before and table(before), lo_ts, hi_ts
+
+    t0 = time.perf_counter()
+    rows = 0
+    pending = [c for c, result in chunks.items() if result is None]
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(score_chunk, *args(c)): c for c in pending}
+            for fut in as_completed(futures):
+                chunk = futures[fut]
+                result = chunks[chunk] = fut.result()
+                rows += result["count"]
+                with conn:
+                    conn.execute(
+                        "UPDATE rescore_day_chunks SET result = ? WHERE job_id = ? AND day = ? AND lo_ts = ?",
+                        (json.dumps(result), job_id, chunk[0], chunk[1]),
+                    )
+                done = sum(r is not None for r in chunks.values())
+                print(f"  chunk {done}/{len(chunks)} done ({rows} rows, {time.perf_counter() - t0:.1f}s)")
+
+    # Samples stored after the job started are scored inside the write
+    # transaction, so the live writer can't slip anything in between: every
+    # chunk from the earliest of them on is scored again (for live samples,
+    # just today's last one), and days created meanwhile get one chunk each.
+    conn.isolation_level = None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        redo = []
+        now_days = [r[0] for r in conn.execute("SELECT day FROM sample_partitions ORDER BY day")]
+        for day in now_days:
+            first = conn.execute(f"SELECT MIN(ts_us) FROM {table(day)} WHERE id > ?", (max_id,)).fetchone()[0]
+            if first is None:
+                continue
+            if day not in days:
+                redo.append((day, _MIN_TS, _MAX_TS))
+            else:
+                redo += [c for c in chunks if c[0] == day and c[2] > first]
+        days = sorted(set(days) | set(now_days))
+        prev_day = dict(zip(days[1:], days))
+        late = 0
+        for chunk in redo:
+            chunks[chunk] = score_chunk(*args(chunk))
+            late += chunks[chunk]["count"]
+
+        totals: Dict[str, List[int]] = {}
+        state = False
+        for chunk in sorted(chunks):
+            state = _merge(totals, chunks[chunk], state)
+        _write_counters(conn, totals)
+        # Past days changed under sync clients; make them refetch all counters.
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES ('counters_epoch', '1') "
+            "ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1"
+        )
+        conn.execute("UPDATE rescore_jobs SET status = 'done' WHERE id = ?", (job_id,))
+        conn.execute("DELETE FROM rescore_day_chunks WHERE job_id = ?", (job_id,))
+        conn.execute("COMMIT")
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - t0
+    print(f"Rescored {len(chunks)} chunks ({len(redo)} again for {late} rows stored meanwhile) "
+          f"into {len({k[:10] for k in totals})} days in {elapsed:.1f}s")
+    return totals
+
+
+def main() -> None:
+    p = argparse.ArgumentParser()
+    p.add_argument("--db", default=os.environ.get("BLE_DB_PATH", "ble_data.db"))
+    p.add_argument("--detector", default=os.environ.get("BLE_DETECTOR", detectors.DEFAULT_DETECTOR), choices=detectors.available())
+    p.add_argument("--chunk-size", type=int, default=500_000, help="sample rows per worker task")
+    p.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    p.add_argument("--restart", action="store_true", help="discard an unfinished job instead of resuming it")
+    args = p.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"DB not found: {args.db}")
+        return
+    rescore(args.db, args.detector, chunk_size=max(1, args.chunk_size), workers=args.workers, restart=args.restart)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,24 @@
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
-from starlette.responses import PlainTextResponse
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from starlette.responses import FileResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
+import alerts
+import archive
 import ble_service
-import mcp_client
+import leaderboard
+import packets
+import profiler
+import tracing
 import uvicorn
+import base64
+import datetime
+import hashlib
+import json
+import math
 import os
+import re
+import struct
 import time
 from dotenv import load_dotenv
 load_dotenv()
@@ -14,6 +27,7 @@ app = FastAPI(title="BLE data service")
 # Allow CORS for local frontend development so browser preflight (OPTIONS)
 # requests succeed. In production, narrow allow_origins appropriately.
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 
 app.add_middleware(
     CORSMiddleware,
@@ -33,15 +47,72 @@ app.add_middleware(
 )
 
 
+# Compress larger responses (sync pages, /data) for clients that accept gzip.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
+
 class ControlRequest(BaseModel):
     device_name: str = "XIAOMG24_BLE"
 
 
+class DetectorRequest(BaseModel):
+    detector: str
+    device_name: Optional[str] = None
+
+
+class AlertConfigUpdate(BaseModel):
+    enabled: Optional[bool] = None
+    sensitivity: Optional[int] = None
+    sustain_s: Optional[float] = None
+    debounce_s: Optional[float] = None
+    cooldown_s: Optional[float] = None
+    vibrate: Optional[bool] = None
+    vibration_strength: Optional[int] = None
+
+
+class UserStatsReport(BaseModel):
+    user: str
+    date: str
+    straight: int
+    slouch: int
+
+
+# Optional subsystems are loaded on first use so a restart gets back to
+# collecting samples and answering requests as fast as possible. List any
+# of them in SERVER_WARMUP (e.g. "chat,leaderboard") to load them in the
+# background right after startup instead.
+WARMUP = [name.strip() for name in os.environ.get("SERVER_WARMUP", "").split(",") if name.strip()]
+
+
+def _chat_stack():
+    """The chat/MCP client, imported on first use (pulls in openai and aiohttp)."""
+    import mcp_client
+
+    return mcp_client
+
+
+def warm_up(names: list[str]) -> None:
+    """Load the named lazy subsystems now: 'chat' and/or 'leaderboard'."""
+    for name in names:
+        t0 = time.perf_counter()
+        if name == "chat":
+            _chat_stack()
+        elif name == "leaderboard":
+            _refresh_local_user(time.strftime("%Y-%m-%d"))
+        else:
+            print("Unknown warm-up subsystem:", name)
+            continue
+        print(f"Warmed up {name} in {time.perf_counter() - t0:.2f}s")
+
+
 @app.on_event("startup")
 async def startup_event():
     # Start BLE data collection automatically on server startup.
     # If you prefer manual control, remove/modify this.
     ble_service.start()
+    # The leaderboard loads on its first request (see _refresh_local_user).
+    if WARMUP:
+        asyncio.get_running_loop().run_in_executor(None, warm_up, WARMUP)
 
 
 @app.get("/status")
@@ -51,9 +122,57 @@ def status():
     return {"running": True, "samples": count}
 
 
+@app.get("/ble/reconnects")
+def ble_reconnects():
+    """Recent BLE reconnects with their latency and data gap."""
+    return ble_service.reconnect_stats()
+
+
+@app.get("/ble/packets")
+def ble_packets():
+    """Notification decoding stats: samples received, lost packets and samples."""
+    return ble_service.packet_stats()
+
+
+@app.get("/debug/profile", response_class=PlainTextResponse)
+async def debug_profile(seconds: float = 5.0, interval_ms: float = 5.0, lines: bool = False, thread: Optional[str] = None):
+    """Sample every thread of this process for `seconds` (max 60).
+
+    Returns collapsed stacks (`frame;frame;... count` per line) for
+    flamegraph.pl or speedscope. `lines` adds line numbers to frames,
+    `thread` limits it to one thread (e.g. MainThread for the event loop).
+    """
+    if interval_ms < 1:
+        raise HTTPException(status_code=400, detail="interval_ms must be >= 1")
+    try:
+        return await asyncio.get_running_loop().run_in_executor(
+            None, profiler.profile, seconds, interval_ms / 1000, lines, {thread} if thread else None
+        )
+    except profiler.Busy as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+@app.get("/debug/trace")
+def debug_trace():
+    """Per-stage latency of traced samples (decode, detect, spool, fanout, send, persist)."""
+    return tracing.stats()
+
+
+@app.post("/debug/trace")
+def debug_trace_set(rate: float, reset: bool = True):
+    """Trace `rate` (0..1) of notifications from now on; 0 turns tracing off."""
+    if not 0 <= rate <= 1:
+        raise HTTPException(status_code=400, detail="rate must be between 0 and 1")
+    tracing.set_rate(rate)
+    if reset:
+        tracing.reset()
+    return tracing.stats()
+
+
 @app.get("/data")
-def read_all():
-    return ble_service.get_data()
+def read_all(grid_hz: Optional[float] = None):
+    """All stored samples as columns; `grid_hz` resamples onto a regular grid."""
+    return ble_service.get_data(grid_hz=grid_hz)
 
 
 @app.get("/data/latest")
@@ -65,17 +184,32 @@ def read_latest():
 
 
 @app.get("/db/samples")
-def db_samples(limit: int = 100, offset: int = 0, start_t: Optional[float] = None, end_t: Optional[float] = None):
+def db_samples(
+    limit: int = 100,
+    offset: int = 0,
+    start_t: Optional[float] = None,
+    end_t: Optional[float] = None,
+    grid_hz: Optional[float] = None,
+    start_ts: Optional[float] = None,
+    end_ts: Optional[float] = None,
+):
     """Return samples from the underlying SQLite DB.
 
     Query params:
     - limit: max rows to return (default 100)
     - offset: rows to skip (paging)
-    - start_t, end_t: optional numeric t-range filters
+    - start_t, end_t: optional numeric t-range filters (t restarts with the
+      service, so these can match several sessions)
+    - start_ts, end_ts: absolute window in epoch seconds, inclusive; rows
+      come back in time order
+    - grid_hz: interpolate the returned rows onto a regular grid (useful when
+      samples are stored compressed, see BLE_COMPRESS_TOL)
     """
     if not ble_service.persistence_enabled():
         raise HTTPException(status_code=400, detail="persistence disabled")
-    rows = ble_service.query_samples(limit=limit, offset=offset, start_t=start_t, end_t=end_t)
+    rows = ble_service.query_samples(
+        limit=limit, offset=offset, start_t=start_t, end_t=end_t, grid_hz=grid_hz, start_ts=start_ts, end_ts=end_ts
+    )
     return {"count": len(rows), "samples": rows}
 
 
@@ -149,13 +283,11 @@ def db_description():
         raise HTTPException(status_code=400, detail="persistence disabled")
 
     try:
-        conn = ble_service._open_db()
-        cur = conn.execute("SELECT MIN(date), MAX(date) FROM counters")
-        row = cur.fetchone()
-        if not row or not row[0]:
+        rows = ble_service.get_counter_rows()
+        if not rows:
             return "No posture data available yet."
 
-        start_date, end_date = row
+        start_date, end_date = rows[0]["date"], rows[-1]["date"]
         today = time.strftime("%Y-%m-%d")
 
         # --- Retrieve today's counters ---
@@ -164,17 +296,10 @@ def db_description():
         straight_time_today = ble_service.get_counter("straight_time")
         total_today = slouch_time_today + straight_time_today
 
-        # --- Retrieve overall sums (for range summary) ---
-        cur = conn.execute(
-            """
-            SELECT name, SUM(value) AS total
-            FROM counters
-            WHERE date BETWEEN ? AND ?
-            GROUP BY name
-            """,
-            (start_date, end_date),
-        )
-        totals = {row["name"]: row["total"] for row in cur.fetchall()}
+        # --- Overall sums (for range summary) ---
+        totals: dict = {}
+        for row in rows:
+            totals[row["name"]] = totals.get(row["name"], 0) + row["value"]
 
         freq_total = totals.get("slouch_frequency", 0)
         slouch_time_total = totals.get("slouch_time", 0)
@@ -229,6 +354,356 @@ def db_description():
         raise HTTPException(status_code=500, detail=str(exc))
 
 
+# Compact, columnar views of the counter rollups for the MCP tools: one row
+# per day (or hour) with data, columns in STATS_COLUMNS order.
+STATS_COLUMNS = ["slouches", "slouch_ticks", "straight_ticks", "alerts", "slouch_pct"]
+_STATS_NAMES = {
+    "slouch_frequency": "slouches",
+    "slouch_time": "slouch_ticks",
+    "straight_time": "straight_ticks",
+    "slouch_alerts": "alerts",
+}
+STATS_MAX_DAYS = 366
+
+
+def _stats_values(totals: dict) -> list:
+    slouch, straight = totals.get("slouch_ticks", 0), totals.get("straight_ticks", 0)
+    pct = round(100 * slouch / (slouch + straight)) if slouch + straight else None
+    return [totals.get("slouches", 0), slouch, straight, totals.get("alerts", 0), pct]
+
+
+def _stats_table(rows: list, key: str) -> dict:
+    """Pivot counter rows (name, key, value) into {key: {column: total}}."""
+    out: dict = {}
+    for r in rows:
+        column = _STATS_NAMES.get(r["name"])
+        if column is not None:
+            bucket = out.setdefault(r[key], {})
+            bucket[column] = bucket.get(column, 0) + r["value"]
+    return out
+
+
+@app.get("/db/stats")
+def db_stats(start: str, end: Optional[str] = None, rows: bool = True):
+    """Per-day posture stats for start..end (inclusive) plus range totals.
+
+    Answered from the `counters` rollup. Days without data are omitted;
+    `rows=false` returns only the totals.
+    """
+    if not ble_service.persistence_enabled():
+        raise HTTPException(status_code=400, detail="persistence disabled")
+    end = end or start
+    if not _DAY_RE.match(start) or not _DAY_RE.match(end) or end < start:
+        raise HTTPException(status_code=400, detail="start/end must be YYYY-MM-DD with start <= end")
+    span = (datetime.date.fromisoformat(end) - datetime.date.fromisoformat(start)).days + 1
+    if span > STATS_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"range longer than {STATS_MAX_DAYS} days")
+    days = _stats_table(ble_service.get_counter_range(start, end), "date")
+    totals: dict = {}
+    for values in days.values():
+        for column, value in values.items():
+            totals[column] = totals.get(column, 0) + value
+    out = {
+        "start": start,
+        "end": end,
+        "days_with_data": len(days),
+        "total": dict(zip(STATS_COLUMNS, _stats_values(totals))),
+    }
+    if rows:
+        out["cols"] = ["date"] + STATS_COLUMNS
+        out["rows"] = [[day] + _stats_values(days[day]) for day in sorted(days)]
+    return out
+
+
+@app.get("/db/stats/hourly")
+def db_stats_hourly(date: str):
+    """Per-hour posture stats for one day, from the `hourly_counters` rollup."""
+    if not ble_service.persistence_enabled():
+        raise HTTPException(status_code=400, detail="persistence disabled")
+    if not _DAY_RE.match(date):
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    hours = _stats_table(ble_service.get_counter_range(date, date, hourly=True), "hour")
+    return {
+        "date": date,
+        "cols": ["hour"] + STATS_COLUMNS,
+        "rows": [[hour] + _stats_values(hours[hour]) for hour in sorted(hours)],
+    }
+
+
+# /dashboard: everything the app's home and progress screens show, in one
+# response built from memory (cached counters, the leaderboard, the last live
+# sample and recent alerts). The body is rebuilt only when one of those
+# changes, and its ETag lets an unchanged screen refresh with a 304.
+DASHBOARD_ALERTS = 10
+_dashboard_cache: tuple | None = None  # (key, body, etag)
+
+
+def _dashboard_key(today: str, counters_version: int) -> tuple:
+    # the objects themselves, not id()s, which can be reused once freed
+    recent = alerts.recent
+    return (today, counters_version, ble_service.last_sample, len(recent), recent[-1] if recent else None)
+
+
+def _dashboard_body(today: str) -> tuple[bytes, str]:
+    global _dashboard_cache
+    counters = ble_service.recent_counters()
+    key = _dashboard_key(today, counters["version"])
+    if _dashboard_cache is not None and _dashboard_cache[0] == key:
+        return _dashboard_cache[1], _dashboard_cache[2]
+    _refresh_local_user(today)
+    days = _stats_table(counters["rows"], "date")
+    first = datetime.date.fromisoformat(today) - datetime.timedelta(days=ble_service.COUNTER_CACHE_DAYS - 1)
+    week = [(first + datetime.timedelta(days=i)).isoformat() for i in range(ble_service.COUNTER_CACHE_DAYS)]
+    local = leaderboard.board.query("daily", today, user=ble_service.LOCAL_USER, k=0, neighbors=0)["user"]
+    latest = ble_service.last_sample
+    out = {
+        "date": today,
+        "today": dict(
+            zip(STATS_COLUMNS, _stats_values(days.get(today, {}))),
+            active_hours=counters["active_hours"].get(today, 0),
+        ),
+        "streak": local["streak"] if local else 0,
+        "week": {
+            "cols": ["date"] + STATS_COLUMNS + ["active_hours"],
+            "rows": [[d] + _stats_values(days.get(d, {})) + [counters["active_hours"].get(d, 0)] for d in week],
+        },
+        "latest": {k: latest.get(k) for k in ("t", "score", "status")} if latest else None,
+        "alerts": list(alerts.recent)[-DASHBOARD_ALERTS:],
+    }
+    body = json.dumps(out, separators=(",", ":")).encode()
+    # stable across restarts and web workers, unlike hash()
+    etag = '"%s"' % hashlib.blake2b(body, digest_size=8).hexdigest()
+    _dashboard_cache = (key, body, etag)
+    return body, etag
+
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    # weak comparison, as If-None-Match uses
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+@app.get("/dashboard")
+def dashboard(request: Request):
+    """Today's stats, 7-day trend, streak, latest score and recent alerts.
+
+    Served from memory; send the ETag back in If-None-Match to get a 304
+    when nothing changed. `today.slouch_pct` and the week rows use the
+    /db/stats columns; `active_hours` counts hours with posture data.
+    """
+    body, etag = _dashboard_body(time.strftime("%Y-%m-%d"))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+BULK_MAX_BYTES = packets.BULK_HEADER.size + packets.BULK_MAX_SAMPLES * packets.BULK_SAMPLE_SIZE
+
+
+@app.post("/ingest/bulk")
+async def ingest_bulk(request: Request):
+    """Store samples the device buffered while away from the gateway.
+
+    The body is a binary bulk upload (application/octet-stream, format in
+    packets.py): a time base, then a uint32 tick offset and six one-byte
+    axes per sample. Samples already stored (e.g. delivered live before the link
+    dropped) are skipped, the rest are written in one batch, and the
+    counters of every local hour they land in are recounted. The response
+    says how many samples were received, skipped as duplicates and stored.
+    An upload reaching a day already archived and dropped from the DB
+    (archive.py --drop) is refused with 409.
+    """
+    if not ble_service.persistence_enabled():
+        raise HTTPException(status_code=400, detail="persistence disabled")
+    if ble_service.INGEST_MODE == "remote":
+        raise HTTPException(status_code=409, detail="bulk uploads need local ingest mode (the ingest process owns writes)")
+    length = request.headers.get("content-length")
+    if length is not None and length.isdigit() and int(length) > BULK_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"at most {packets.BULK_MAX_SAMPLES} samples per upload")
+    body = await request.body()
+    try:
+        ts_us, vals = packets.decode_bulk(body)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    # decoding is cheap; dedupe, detection and the DB write go to a thread
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, ble_service.ingest_bulk, ts_us, vals)
+    except ble_service.ArchivedDay as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+
+
+SYNC_MAX_LIMIT = 50000
+
+
+def _encode_sync_token(state: dict) -> str:
+    raw = json.dumps(state, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_sync_token(token: str) -> dict:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        state = json.loads(raw)
+        return {"id": int(state["id"]), "cid": int(state["cid"]), "epoch": state.get("epoch")}
+    except Exception:
+        raise HTTPException(status_code=400, detail="invalid sync token")
+
+
+@app.get("/sync")
+def sync(token: Optional[str] = None, since_id: Optional[int] = None, limit: int = 5000):
+    """Incremental catch-up for clients that were offline.
+
+    Pass the `token` from the previous response (or `since_id` on first use)
+    and receive only samples with a larger id, as columns. While `more` is
+    true, keep calling with the new token. The last page also carries the
+    counter and hourly rollup rows that changed since the client's previous
+    sync: only days that received new samples, or everything if counters were
+    rewritten (e.g. by rescore.py) or the client has never synced.
+    """
+    if not ble_service.persistence_enabled():
+        raise HTTPException(status_code=400, detail="persistence disabled")
+    if token:
+        state = _decode_sync_token(token)
+    else:
+        start = max(0, since_id or 0)
+        state = {"id": start, "cid": start, "epoch": None}
+    limit = max(1, min(limit, SYNC_MAX_LIMIT))
+
+    rows = ble_service.samples_after(state["id"], limit + 1)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    last_id = rows[-1]["id"] if rows else state["id"]
+    columns = ble_service.SAMPLE_COLUMNS.split(", ")
+    out = {
+        "samples": {c: [r[c] for r in rows] for c in columns},
+        "count": len(rows),
+        "more": more,
+    }
+
+    epoch = ble_service.counters_epoch()
+    if more:
+        next_state = {"id": last_id, "cid": state["cid"], "epoch": state["epoch"]}
+    else:
+        if state["epoch"] is None or state["epoch"] != epoch:
+            dates = None
+        else:
+            dates = sorted(set(ble_service.days_with_samples_after(state["cid"])) | {time.strftime("%Y-%m-%d")})
+        out["counters"] = ble_service.get_counter_rows(dates)
+        out["hourly"] = ble_service.get_counter_rows(dates, hourly=True)
+        next_state = {"id": last_id, "cid": last_id, "epoch": epoch}
+    out["token"] = _encode_sync_token(next_state)
+    return out
+
+
+_DAY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+
+_leaderboard_epoch: int | None = None
+_leaderboard_day: str | None = None
+
+
+def _load_leaderboard() -> None:
+    global _leaderboard_epoch
+    since = time.strftime("%Y-%m-%d", time.localtime(time.time() - leaderboard.KEEP_DAYS * 86400))
+    ble_service.load_leaderboard(since)
+    _leaderboard_epoch = ble_service.counters_epoch()
+
+
+def _refresh_local_user(today: str) -> None:
+    """Bring the local wearer's totals up to date where the live tick can't.
+
+    The first call loads the leaderboard from the DB, and rescored counters
+    (new epoch) mean a full reload. In remote ingest mode this worker never
+    sees the ticks, so today's counters are re-read.
+    """
+    global _leaderboard_day
+    if today != _leaderboard_day:
+        leaderboard.board.prune(today)
+        _leaderboard_day = today
+    if not ble_service.persistence_enabled():
+        return
+    if ble_service.counters_epoch() != _leaderboard_epoch:
+        _load_leaderboard()
+    elif ble_service.INGEST_MODE == "remote":
+        leaderboard.board.add(
+            ble_service.LOCAL_USER,
+            today,
+            straight=ble_service.get_counter("straight_time"),
+            slouch=ble_service.get_counter("slouch_time"),
+            replace=True,
+        )
+
+
+@app.get("/leaderboard")
+def get_leaderboard(period: str = "daily", user: Optional[str] = None, k: int = 10, neighbors: int = 2, date: Optional[str] = None):
+    """Friends leaderboard: top-k plus `user`'s rank and nearby users.
+
+    period is 'daily' or 'weekly' (ISO week containing `date`, default today).
+    """
+    if period not in leaderboard.PERIODS:
+        raise HTTPException(status_code=400, detail=f"period must be one of {leaderboard.PERIODS}")
+    if date is not None and not _DAY_RE.match(date):
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    today = time.strftime("%Y-%m-%d")
+    _refresh_local_user(today)
+    return leaderboard.board.query(period, date or today, user=user, k=max(0, k), neighbors=max(0, neighbors))
+
+
+@app.post("/leaderboard/report")
+def report_user_stats(report: UserStatsReport):
+    """Accept a friend's daily straight/slouch totals (replaces earlier reports)."""
+    if not _DAY_RE.match(report.date):
+        raise HTTPException(status_code=400, detail="date must be YYYY-MM-DD")
+    if report.user == ble_service.LOCAL_USER:
+        raise HTTPException(status_code=400, detail="the local user's totals come from the device")
+    if report.straight < 0 or report.slouch < 0:
+        raise HTTPException(status_code=400, detail="totals must be non-negative")
+    if ble_service.persistence_enabled():
+        ble_service.save_user_stats(report.user, report.date, report.straight, report.slouch)
+    leaderboard.board.add(report.user, report.date, straight=report.straight, slouch=report.slouch, replace=True)
+    return {"status": "ok"}
+
+
+@app.get("/archive")
+def archive_index():
+    """List days available in the columnar archive."""
+    return {"days": archive.archived_days()}
+
+
+@app.get("/archive/{date}")
+def archive_day(date: str):
+    """Return the manifest for an archived day, with a URL per column file."""
+    if not _DAY_RE.match(date) or not archive.is_archived(date):
+        raise HTTPException(status_code=404, detail="day not archived")
+    with open(os.path.join(archive.day_dir(date), "meta.json")) as f:
+        meta = json.load(f)
+    meta["files"] = {c: f"/archive/{date}/{c}.npy" for c in archive.COLUMNS}
+    return meta
+
+
+@app.get("/archive/{date}/{column}.npy")
+def archive_column(date: str, column: str):
+    """Serve one archived column as a raw .npy file (np.load-able as-is)."""
+    if not _DAY_RE.match(date) or column not in archive.COLUMNS or not archive.is_archived(date):
+        raise HTTPException(status_code=404, detail="not found")
+    path = os.path.join(archive.day_dir(date), f"{column}.npy")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{date}-{column}.npy")
+
+
+def _overloaded(exc: Exception) -> HTTPException:
+    """503 for a request the LLM scheduler shed, with a Retry-After hint."""
+    return HTTPException(status_code=503, detail=str(exc), headers={"Retry-After": str(math.ceil(exc.retry_after))})
+
+
+@app.get("/mcp/scheduler")
+def mcp_scheduler():
+    """LLM scheduler state: in flight, queued, bucket tokens, retries, shed."""
+    return _chat_stack().scheduler.snapshot()
+
+
 @app.get("/mcp/summary", response_class=PlainTextResponse)
 async def mcp_summary():
     """Run the MCP client main() and return the string result.
@@ -239,13 +714,16 @@ async def mcp_summary():
     return no result and this endpoint will return a 500 error with a helpful
     message.
     """
+    chat = _chat_stack()
     try:
-        result = await mcp_client.main()
+        result = await chat.main()
         if not result:
             raise HTTPException(status_code=500, detail="MCP client did not return a summary. Ensure GROQ_API_KEY is set and MCP server is reachable.")
         return result
     except HTTPException:
         raise
+    except chat.Overloaded as exc:
+        raise _overloaded(exc)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc))
 
@@ -262,21 +740,122 @@ def control_stop():
     return {"status": "stopping"}
 
 
+@app.get("/detectors")
+def list_detectors():
+    """List available slouch detectors and the current default."""
+    return {"default": ble_service.DEFAULT_DETECTOR, "available": ble_service.detectors.available()}
+
+
+@app.post("/control/detector")
+def control_detector(req: DetectorRequest):
+    """Select the slouch detector for a device (or the default if no device)."""
+    try:
+        ble_service.set_detector(req.detector, req.device_name)
+    except KeyError:
+        raise HTTPException(status_code=400, detail=f"unknown detector: {req.detector}")
+    return {"status": "ok", "detector": req.detector, "device_name": req.device_name}
+
+
+# Fields a /ws subscriber may select with ?fields=a,b,c
+WS_FIELDS = ("t", "ts", "ax", "ay", "az", "gx", "gy", "gz", "score", "status")
+
+# Optional binary subprotocol for /ws, chosen by the client through
+# Sec-WebSocket-Protocol. Each binary frame holds one or more 16-byte
+# little-endian records: t float64, ax ay az gx gy gz int8, score uint8
+# (255 = unknown), flags uint8 (reserved, 0). Same layout as the records of
+# api_client.py's recording files. Records only carry the session-relative t,
+# so a text frame {"start_ts": ...} precedes the first record and every change
+# of session (a restarted ingest process): a record's epoch time is start_ts + t.
+WS_BINARY_PROTOCOL = "posture.bin.v1"
+WS_RECORD = struct.Struct("<d6bBB")
+WS_MAX_BATCH = 256
+
+
+def _pack_sample(sample: dict) -> bytes:
+    score = sample.get("score")
+    return WS_RECORD.pack(
+        sample["t"],
+        *(max(-128, min(127, int(sample[k]))) for k in ("ax", "ay", "az", "gx", "gy", "gz")),
+        255 if score is None else max(0, min(100, int(score))), 0,
+    )
+
+
 @app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint that streams live samples as JSON.
+async def websocket_endpoint(
+    websocket: WebSocket,
+    fields: Optional[str] = None,
+    max_rate: Optional[float] = None,
+    batch: int = 32,
+):
+    """WebSocket endpoint that streams live samples.
 
     Behavior: when a client connects it registers a listener queue, then forwards
     samples received on that queue to the WebSocket. When the client disconnects
     the listener is unregistered.
+
+    Samples are JSON objects by default. A client that offers the
+    WS_BINARY_PROTOCOL subprotocol gets packed binary records instead,
+    several per frame when samples are queued up (see `batch`).
+
+    Query params:
+    - fields: comma-separated subset of WS_FIELDS to send (default: all),
+      e.g. `?fields=score,status` for the dashboard's live card; JSON only
+    - max_rate: cap on messages per second; when the client is throttled only
+      the newest sample is sent and older ones are skipped (binary clients
+      get all of them, batched into the next frame)
+    - batch: binary only, most records per frame (default 32, max 256)
     """
-    await websocket.accept()
+    binary = WS_BINARY_PROTOCOL in websocket.scope.get("subprotocols", [])
+    selected = None
+    if fields and not binary:
+        selected = [f for f in fields.split(",") if f in WS_FIELDS]
+        if not selected:
+            await websocket.close(code=1008, reason="no valid fields")
+            return
+    min_interval = 1.0 / max_rate if max_rate and max_rate > 0 else 0.0
+    batch = max(1, min(batch, WS_MAX_BATCH))
+
+    await websocket.accept(subprotocol=WS_BINARY_PROTOCOL if binary else None)
     q = await ble_service.register_listener()
+    loop = asyncio.get_running_loop()
+    last_sent = 0.0
+    start_ts = None  # binary: the session start last announced to this client
     try:
         while True:
             sample = await q.get()
-            await websocket.send_json(sample)
-            time.sleep(.01)
+            if min_interval:
+                wait = last_sent + min_interval - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                last_sent = loop.time()
+            if binary:
+                # whatever else is already queued goes out in the same frame
+                frame = [sample]
+                while len(frame) < (WS_MAX_BATCH if min_interval else batch) and not q.empty():
+                    frame.append(q.get_nowait())
+                start = 0
+                for i, s in enumerate(frame):
+                    offset = s["ts"] - s["t"]
+                    if start_ts is None or abs(offset - start_ts) > 1e-3:
+                        if i > start:
+                            await websocket.send_bytes(b"".join(_pack_sample(r) for r in frame[start:i]))
+                        start_ts, start = offset, i
+                        await websocket.send_json({"start_ts": start_ts})
+                await websocket.send_bytes(b"".join(_pack_sample(s) for s in frame[start:]))
+                if tracing.RATE:
+                    for s in frame:
+                        tracing.sent(s)
+                continue
+            if min_interval:
+                # coalesce anything that arrived meanwhile into the newest sample
+                while not q.empty():
+                    sample = q.get_nowait()
+            if selected is not None:
+                await websocket.send_json({k: sample[k] for k in selected if k in sample})
+            else:
+                await websocket.send_json(sample)
+            if tracing.RATE:
+                tracing.sent(sample)
     except WebSocketDisconnect:
         # client disconnected
         await ble_service.unregister_listener(q)
@@ -285,6 +864,49 @@ async def websocket_endpoint(websocket: WebSocket):
         await ble_service.unregister_listener(q)
         raise
 
+@app.get("/alerts/config")
+def get_alert_config():
+    return alerts.config_dict()
+
+
+@app.put("/alerts/config")
+def put_alert_config(update: AlertConfigUpdate):
+    """Change alert sensitivity, debounce, cooldown or vibration settings."""
+    changes = update.model_dump(exclude_unset=True)
+    for key in ("sensitivity", "vibration_strength"):
+        if key in changes and changes[key] is not None and not 0 <= changes[key] <= 100:
+            raise HTTPException(status_code=400, detail=f"{key} must be 0-100")
+    alerts.update_config(**changes)
+    if ble_service.INGEST_MODE == "remote":
+        ble_service._send_command({"cmd": "alert_config", "changes": changes})
+    return alerts.config_dict()
+
+
+@app.get("/alerts/recent")
+def get_recent_alerts(limit: int = 20):
+    return {"alerts": list(alerts.recent)[-max(0, limit):] if limit > 0 else []}
+
+
+@app.get("/alerts/latency")
+def get_alert_latency():
+    """Sample-arrival to alert-published latency over recent alerts."""
+    return alerts.latency_stats()
+
+
+@app.websocket("/ws/alerts")
+async def alerts_websocket(websocket: WebSocket):
+    """Dedicated channel that pushes slouch alert events as JSON."""
+    await websocket.accept()
+    q = await alerts.register_listener()
+    try:
+        while True:
+            await websocket.send_json(await q.get())
+    except WebSocketDisconnect:
+        await alerts.unregister_listener(q)
+    except Exception:
+        await alerts.unregister_listener(q)
+        raise
+
 class ChatRequest(BaseModel):
     message: str
 
@@ -298,16 +920,26 @@ async def isaac():
     return {"message": "MEOWWW!!!"}
 
 @app.post("/api/chat")
-async def chat_endpoint(req: ChatRequest):
-    """Handle chat requests from the React Postura AI chatbot."""
+async def chat_endpoint(req: ChatRequest, response: Response):
+    """Handle chat requests from the React Postura AI chatbot.
+
+    The LLM and MCP server come from LLM_BASE_URL and MCP_SERVER_URL (see
+    mcp_client). A Server-Timing header reports where the time went.
+    """
     groq_key = os.getenv("GROQ_API_KEY")
     if not groq_key:
         raise HTTPException(status_code=500, detail="Missing GROQ_API_KEY environment variable.")
 
+    chat = _chat_stack()
     try:
-        chatbot = mcp_client.MCPChatGroq(groq_key, mcp_server_url="http://localhost:5000")
+        started = time.perf_counter()
+        chatbot = chat.MCPChatGroq(groq_key)
         response_text = await chatbot.chat(req.message, model="llama-3.1-8b-instant")
+        timings = dict(chatbot.client.timings, total=time.perf_counter() - started)
+        response.headers["Server-Timing"] = ", ".join(f"{stage};dur={secs * 1000:.1f}" for stage, secs in timings.items())
         return {"response": response_text}
+    except chat.Overloaded as exc:
+        raise _overloaded(exc)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {e}")
 
@@ -0,0 +1,138 @@
+"""Crash-safe, memory-mapped spool of fixed-size sample records.
+
+Ingest appends every decoded sample here first; a background writer in
+`ble_service` drains it into SQLite in batches. Appending is a couple of
+memory stores, so ingest never waits on the DB, and because the file is
+memory-mapped the records survive a crash of the process (the kernel owns the
+pages) and are replayed on the next start.
+
+File layout:
+
+    [header 64 bytes][record 0][record 1]...
+
+Header: magic, version, record size, generation, write position hint.
+Records are RECORD_DTYPE (24 bytes). The `flags` byte carries a VALID bit that
+is written last, so a record torn by a crash is simply not there yet.
+
+The consumer tracks (generation, offset) of what it has persisted. Once it
+has caught up, it rewinds the spool to the start and bumps the generation,
+which keeps the file small; a generation newer than the consumer's checkpoint
+therefore means "start from offset 0".
+"""
+
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+
+MAGIC = b"BLESPOOL"
+VERSION = 1
+HEADER_SIZE = 64
+_HEADER = struct.Struct("<8sIIQQ")  # magic, version, record size, generation, write hint
+
+RECORD_DTYPE = np.dtype([
+    ("wall", "<f8"),   # epoch seconds when the sample arrived
+    ("t", "<f8"),      # service-relative t, as stored in `samples`
+    ("ax", "i1"), ("ay", "i1"), ("az", "i1"),
+    ("gx", "i1"), ("gy", "i1"), ("gz", "i1"),
+    ("flags", "u1"),
+    ("pad", "u1"),
+])
+_RECORD = struct.Struct("<dd6bBx")
+assert _RECORD.size == RECORD_DTYPE.itemsize
+RECORD_SIZE = _RECORD.size
+
+# flags bits
+OVER = 0x01         # posture over the slouch threshold (slouch_time tick)
+TRANSITION = 0x02   # straight -> slouching transition
+ALERT = 0x04        # a slouch alert fired on this sample
+COUNTED = 0x08      # sample contributes to the posture counters
+VALID = 0x80        # record completely written
+
+
+class Spool:
+    def __init__(self, path: str, initial_records: int = 65536) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        exists = os.path.exists(path) and os.path.getsize(path) >= HEADER_SIZE
+        self._f = open(path, "r+b" if exists else "w+b")
+        if not exists:
+            self._f.truncate(HEADER_SIZE + initial_records * RECORD_SIZE)
+        self._map()
+        magic, version, rec_size, gen, hint = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            # A fresh file starts at a time-based generation, so a checkpoint
+            # left over from a deleted spool can't match it by accident.
+            gen, hint = int(time.time() * 1000), 0
+            _HEADER.pack_into(self._mm, 0, MAGIC, VERSION, RECORD_SIZE, gen, hint)
+        elif version != VERSION or rec_size != RECORD_SIZE:
+            raise ValueError(f"incompatible spool file {path} (version {version}, record size {rec_size})")
+        self.generation = gen
+        # The hint may lag the real end after a crash; scan forward for it.
+        pos = min(hint, self.capacity)
+        while pos < self.capacity and self._mm[self._flags_at(pos)] & VALID:
+            pos += 1
+        self.write_pos = pos
+
+    def _map(self) -> None:
+        self._f.flush()
+        self._mm = mmap.mmap(self._f.fileno(), 0)
+        self.capacity = (len(self._mm) - HEADER_SIZE) // RECORD_SIZE
+
+    @staticmethod
+    def _flags_at(index: int) -> int:
+        return HEADER_SIZE + index * RECORD_SIZE + RECORD_SIZE - 2
+
+    def _grow(self) -> None:
+        self._mm.close()
+        self._f.truncate(HEADER_SIZE + self.capacity * 2 * RECORD_SIZE)
+        self._map()
+
+    def append(self, wall: float, t: float, ax: int, ay: int, az: int, gx: int, gy: int, gz: int, flags: int) -> None:
+        with self._lock:
+            if self.write_pos >= self.capacity:
+                # consumer is behind (e.g. DB unavailable): keep everything
+                self._grow()
+            off = HEADER_SIZE + self.write_pos * RECORD_SIZE
+            _RECORD.pack_into(self._mm, off, wall, t, ax, ay, az, gx, gy, gz, flags & ~VALID)
+            self._mm[off + RECORD_SIZE - 2] = (flags | VALID) & 0xFF
+            self.write_pos += 1
+            struct.pack_into("<Q", self._mm, 24, self.write_pos)
+
+    def read(self, start: int, max_records: int) -> np.ndarray:
+        """Copy out up to `max_records` committed records from `start`."""
+        with self._lock:
+            end = min(self.write_pos, start + max_records)
+            if end <= start:
+                return np.empty(0, dtype=RECORD_DTYPE)
+            raw = self._mm[HEADER_SIZE + start * RECORD_SIZE:HEADER_SIZE + end * RECORD_SIZE]
+        return np.frombuffer(raw, dtype=RECORD_DTYPE)
+
+    def rewind_if_consumed(self, consumed: int) -> bool:
+        """Start over at offset 0 (new generation) if everything is consumed."""
+        with self._lock:
+            if consumed != self.write_pos or self.write_pos == 0:
+                return False
+            end = HEADER_SIZE + self.write_pos * RECORD_SIZE
+            self._mm[HEADER_SIZE:end] = bytes(end - HEADER_SIZE)
+            self.generation += 1
+            self.write_pos = 0
+            struct.pack_into("<QQ", self._mm, 16, self.generation, 0)
+            return True
+
+    def flush(self) -> None:
+        """msync the mapping, for durability across OS crashes too."""
+        with self._lock:
+            self._mm.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._mm.flush()
+            self._mm.close()
+            self._f.close()
@@ -0,0 +1,476 @@
+"""Storage engines for samples, counters and service bookkeeping.
+
+`ble_service` talks to its store only through the `Storage` interface:
+
+    store.append(samples, counts, meta)        # one atomic batch
+    store.append_columns(cols, counts, meta)   # the same from numpy columns
+    store.scan(start_ts=..., end_ts=..., limit=...)
+    store.window(start_ts, end_ts, fields)     # numpy columns of a time range
+    store.counters("2025-01-01", "2025-01-07")
+    store.prune("2025-01-01")
+
+Samples are filed by the local day of their absolute time (`ts_us`, epoch
+microseconds) and get ids in the order they are stored, so a bulk upload
+gives an older day ids above newer days' rows. Scans walk days oldest first:
+by id, or by (ts_us, id) when a time window is given, so both engines page
+identically. With after_id alone the result is in id order across all days
+(the sync feed). Counters are per-day and per-hour totals keyed by
+name; retention drops whole days.
+
+Engines (BLE_STORAGE picks one, see ble_service):
+
+- sqlite (default): the day-partitioned SQLite file, ble_service.SQLiteStorage.
+- memory: MemoryStorage below, column arrays per day. Nothing survives a
+  restart; meant for tests, benchmarks and deployments that don't need
+  history.
+
+bench_storage.py runs the same conformance checks and timings against every
+engine.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from array import array
+from datetime import date as Date, timedelta
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+COUNTER_NAMES = ("slouch_frequency", "slouch_time", "straight_time", "slouch_alerts")
+SAMPLE_FIELDS = ("id", "t", "ax", "ay", "az", "gx", "gy", "gz", "pitch", "created_at", "ts_us")
+AXES = ("ax", "ay", "az", "gx", "gy", "gz")
+WINDOW_FIELDS = ("ts_us",) + AXES
+# Counters older than this many days are expired when a new day starts.
+COUNTER_KEEP_DAYS = 30
+
+# (ts_us, t, ax, ay, az, gx, gy, gz)
+Sample = Tuple[int, float, int, int, int, int, int, int]
+# {(date, hour): {counter name: increment}}
+Counts = Dict[Tuple[str, int], Dict[str, int]]
+# {"ts_us": ..., "t": ..., "ax": ..., ...}: equal-length arrays, ts_us ascending
+Columns = Dict[str, np.ndarray]
+
+
+class DaySplitter:
+    """Local day of epoch-microsecond timestamps, one localtime() per day.
+
+    Batches are nearly always within a day or two, so the current day's
+    bounds are kept and only timestamps outside them are converted.
+    """
+
+    def __init__(self) -> None:
+        self._lo = self._hi = 0
+        self._day = ""
+
+    def day(self, ts_us: int) -> str:
+        if not self._lo <= ts_us < self._hi:
+            local = time.localtime(ts_us / 1e6)
+            self._day = time.strftime("%Y-%m-%d", local)
+            midnight = time.mktime((local.tm_year, local.tm_mon, local.tm_mday, 0, 0, 0, 0, 0, -1))
+            self._lo = int(midnight * 1e6)
+            nxt = Date(local.tm_year, local.tm_mon, local.tm_mday) + timedelta(days=1)
+            self._hi = int(time.mktime((nxt.year, nxt.month, nxt.day, 0, 0, 0, 0, 0, -1)) * 1e6)
+        return self._day
+
+    def split(self, samples: Iterable[Sample]) -> Dict[str, List[Sample]]:
+        out: Dict[str, List[Sample]] = {}
+        for s in samples:
+            out.setdefault(self.day(s[0]), []).append(s)
+        return out
+
+    def ranges(self, ts_us: np.ndarray) -> List[Tuple[str, int, int]]:
+        """(day, start, stop) slices of an ascending ts_us array, one per day."""
+        out = []
+        start = 0
+        while start < len(ts_us):
+            day = self.day(int(ts_us[start]))
+            stop = int(np.searchsorted(ts_us, self._hi, "left"))
+            out.append((day, start, stop))
+            start = stop
+        return out
+
+
+def local_day(ts: float) -> str:
+    return time.strftime("%Y-%m-%d", time.localtime(ts))
+
+
+class Storage:
+    """Base class; see the module docstring for the ordering rules."""
+
+    name = "base"
+
+    def append(self, samples: Sequence[Sample], counts: Counts | None = None, meta: Dict[str, str] | None = None) -> None:
+        """Store samples, add counter increments and set meta keys, atomically."""
+        raise NotImplementedError
+
+    def append_columns(self, cols: Columns, counts: Counts | None = None, meta: Dict[str, str] | None = None) -> None:
+        """append() for a Columns batch (bulk uploads).
+
+        Engines override it to skip building a tuple per sample.
+        """
+        rows = zip(cols["ts_us"].tolist(), cols["t"].tolist(), *(cols[k].tolist() for k in AXES))
+        self.append(list(rows), counts, meta)
+
+    def scan(
+        self,
+        start_ts: float | None = None,
+        end_ts: float | None = None,
+        after_id: int | None = None,
+        start_t: float | None = None,
+        end_t: float | None = None,
+        limit: int | None = 100,
+        offset: int = 0,
+    ) -> List[dict]:
+        """Sample rows (SAMPLE_FIELDS keys) matching every given filter.
+
+        start_ts/end_ts are inclusive epoch seconds and switch the order to
+        time order; after_id keeps ids > after_id and, without a time window,
+        orders by id across days; limit None means all.
+        """
+        raise NotImplementedError
+
+    def window(self, start_ts: float, end_ts: float, fields: Sequence[str] = WINDOW_FIELDS) -> Dict[str, np.ndarray]:
+        """`fields` (of WINDOW_FIELDS) of every sample in start_ts..end_ts, as columns.
+
+        Inclusive epoch seconds, in scan's time order; all columns int64.
+        For bulk work (dedupe, recounting) where row dicts would dominate.
+        """
+        raise NotImplementedError
+
+    def latest(self) -> dict | None:
+        """The sample with the highest id in the newest non-empty day."""
+        raise NotImplementedError
+
+    def days(self) -> List[Tuple[str, int | None]]:
+        """(day, highest id or None if empty) for every stored day, oldest first."""
+        raise NotImplementedError
+
+    def prune(self, before_day: str) -> int:
+        """Drop every day before `before_day`; returns the samples removed."""
+        raise NotImplementedError
+
+    def counter(self, name: str, date: str) -> int:
+        raise NotImplementedError
+
+    def set_counter(self, name: str, date: str, value: int) -> None:
+        raise NotImplementedError
+
+    def counters(self, start: str, end: str, hourly: bool = False) -> List[dict]:
+        """Counter rows (name, date[, hour], value) for start..end inclusive, by date."""
+        raise NotImplementedError
+
+    def save_user_stats(self, user: str, date: str, straight: int, slouch: int) -> None:
+        raise NotImplementedError
+
+    def user_stats(self, since: str) -> List[dict]:
+        """Reported (user, date, straight, slouch) rows from `since` on, by date."""
+        raise NotImplementedError
+
+    def get_meta(self, key: str, default: str | None = None) -> str | None:
+        raise NotImplementedError
+
+    def set_meta(self, key: str, value: str) -> None:
+        raise NotImplementedError
+
+    def data_version(self) -> int:
+        """Changes when another process wrote; constant for unshared engines."""
+        return 0
+
+    def close(self) -> None:
+        pass
+
+
+class _MemoryDay:
+    """Column arrays of one day's samples, in append (id) order."""
+
+    __slots__ = ("id", "t", "ts_us", "axes", "ts_sorted")
+
+    def __init__(self) -> None:
+        self.id = array("q")
+        self.t = array("d")
+        self.ts_us = array("q")
+        self.axes = [array("i") for _ in AXES]
+        self.ts_sorted = True
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+
+class MemoryStorage(Storage):
+    """Samples in per-day column arrays, counters and meta in dicts.
+
+    Scans slice the arrays with numpy: by position for id order, by binary
+    search on ts_us while a day's timestamps arrived in order (otherwise a
+    mask and a stable sort).
+    """
+
+    name = "memory"
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._days: Dict[str, _MemoryDay] = {}
+        self._last_id = 0
+        self._counters: Dict[Tuple[str, str], int] = {}
+        self._hourly: Dict[Tuple[str, str, int], int] = {}
+        self._user_stats: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        self._meta: Dict[str, str] = {}
+        self._splitter = DaySplitter()
+
+    def _day(self, day: str) -> _MemoryDay:
+        d = self._days.get(day)
+        if d is None:
+            d = self._days[day] = _MemoryDay()
+            self._days = dict(sorted(self._days.items()))
+            cutoff = (Date.fromisoformat(local_day(time.time())) - timedelta(days=COUNTER_KEEP_DAYS)).isoformat()
+            for key in [k for k in self._counters if k[1] < cutoff]:
+                del self._counters[key]
+            for key in [k for k in self._hourly if k[1] < cutoff]:
+                del self._hourly[key]
+        return d
+
+    def append(self, samples: Sequence[Sample], counts: Counts | None = None, meta: Dict[str, str] | None = None) -> None:
+        with self._lock:
+            # convert everything first, so a bad value changes nothing
+            batches = []
+            for day, rows in self._splitter.split(samples).items():
+                cols = array("q", (r[0] for r in rows)), array("d", (r[1] for r in rows))
+                axes = [array("i", (r[2 + i] for r in rows)) for i in range(len(AXES))]
+                batches.append((day, cols, axes))
+            for day, (ts, t), axes in batches:
+                d = self._day(day)
+                if d.ts_sorted and (
+                    (len(d.ts_us) and ts[0] < d.ts_us[-1]) or any(b < a for a, b in zip(ts, ts[1:]))
+                ):
+                    d.ts_sorted = False
+                d.id.extend(range(self._last_id + 1, self._last_id + 1 + len(ts)))
+                self._last_id += len(ts)
+                d.ts_us.extend(ts)
+                d.t.extend(t)
+                for col, values in zip(d.axes, axes):
+                    col.extend(values)
+            self._add_counts(counts)
+            self._meta.update(meta or {})
+
+    def append_columns(self, cols: Columns, counts: Counts | None = None, meta: Dict[str, str] | None = None) -> None:
+        # convert everything first, so a bad column changes nothing
+        ts = np.ascontiguousarray(cols["ts_us"], dtype=np.int64)
+        t = np.asarray(cols["t"], dtype=np.float64)
+        axes = [np.asarray(cols[name], dtype=np.int32) for name in AXES]
+        with self._lock:
+            for day, a, b in self._splitter.ranges(ts):
+                d = self._day(day)
+                if len(d.ts_us) and ts[a] < d.ts_us[-1]:
+                    d.ts_sorted = False
+                d.id.frombytes(np.arange(self._last_id + 1, self._last_id + 1 + b - a, dtype=np.int64).tobytes())
+                self._last_id += b - a
+                d.ts_us.frombytes(ts[a:b].tobytes())
+                d.t.frombytes(t[a:b].tobytes())
+                for col, values in zip(d.axes, axes):
+                    col.frombytes(values[a:b].tobytes())
+            self._add_counts(counts)
+            self._meta.update(meta or {})
+
+    def _add_counts(self, counts: Counts | None) -> None:
+        for (date, hour), increments in (counts or {}).items():
+            for name, value in increments.items():
+                if value:
+                    self._counters[(name, date)] = self._counters.get((name, date), 0) + value
+                    self._hourly[(name, date, hour)] = self._hourly.get((name, date, hour), 0) + value
+
+    @staticmethod
+    def _rows(d: _MemoryDay, idx: np.ndarray) -> List[dict]:
+        ids = np.frombuffer(d.id, dtype=np.int64)[idx].tolist()
+        t = np.frombuffer(d.t, dtype=np.float64)[idx].tolist()
+        ts = np.frombuffer(d.ts_us, dtype=np.int64)[idx].tolist()
+        axes = [np.frombuffer(col, dtype=np.int32)[idx].tolist() for col in d.axes]
+        out = []
+        created = None
+        created_s = -1
+        for i in range(len(ids)):
+            sec = ts[i] // 1_000_000
+            if sec != created_s:
+                created_s = sec
+                created = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(sec))
+            out.append({
+                "id": ids[i], "t": t[i],
+                "ax": axes[0][i], "ay": axes[1][i], "az": axes[2][i],
+                "gx": axes[3][i], "gy": axes[4][i], "gz": axes[5][i],
+                "pitch": None, "created_at": created, "ts_us": ts[i],
+            })
+        return out
+
+    def scan(
+        self,
+        start_ts: float | None = None,
+        end_ts: float | None = None,
+        after_id: int | None = None,
+        start_t: float | None = None,
+        end_t: float | None = None,
+        limit: int | None = 100,
+        offset: int = 0,
+    ) -> List[dict]:
+        lo_us = int(np.ceil(start_ts * 1e6)) if start_ts is not None else None
+        hi_us = int(np.floor(end_ts * 1e6)) if end_ts is not None else None
+        first = local_day(start_ts) if start_ts is not None else None
+        last = local_day(end_ts) if end_ts is not None else None
+        out: List[dict] = []
+        if after_id is not None and lo_us is None and hi_us is None:
+            return self._scan_by_id(after_id, start_t, end_t, limit, offset)
+        with self._lock:
+            for day, d in self._days.items():
+                if limit is not None and len(out) >= limit:
+                    break
+                if (first and day < first) or (last and day > last) or not len(d):
+                    continue
+                idx = self._select(d, lo_us, hi_us, after_id, start_t, end_t)
+                if offset >= len(idx):
+                    offset -= len(idx)
+                    continue
+                stop = len(idx) if limit is None else offset + limit - len(out)
+                out.extend(self._rows(d, idx[offset:stop]))
+                offset = 0
+        return out
+
+    def _scan_by_id(self, after_id: int, start_t: float | None, end_t: float | None,
+                    limit: int | None, offset: int) -> List[dict]:
+        """scan(after_id=...) in id order across days (bulk uploads give
+        older days higher ids)."""
+        stop = None if limit is None else offset + limit
+        with self._lock:
+            picked = []
+            for d in self._days.values():
+                if not len(d):
+                    continue
+                idx = self._select(d, None, None, after_id, start_t, end_t)[:stop]
+                if len(idx):
+                    picked.append((d, idx, np.frombuffer(d.id, dtype=np.int64)[idx]))
+            if not picked:
+                return []
+            # the `stop` smallest ids overall, then each day's share of them
+            ids = np.sort(np.concatenate([p[2] for p in picked]))[offset:stop]
+            if not len(ids):
+                return []
+            lo, hi = ids[0], ids[-1]
+            rows = []
+            for d, idx, day_ids in picked:
+                rows.extend(self._rows(d, idx[(day_ids >= lo) & (day_ids <= hi)]))
+        rows.sort(key=lambda r: r["id"])
+        return rows
+
+    @staticmethod
+    def _select(d: _MemoryDay, lo_us: int | None, hi_us: int | None, after_id: int | None,
+                start_t: float | None, end_t: float | None) -> np.ndarray:
+        """Positions of the matching samples of one day, in scan order.
+
+        Call with the lock held: the numpy views over the arrays die with
+        this frame, and an array can't grow while one exists.
+        """
+        by_ts = lo_us is not None or hi_us is not None
+        ids = np.frombuffer(d.id, dtype=np.int64)
+        ts = np.frombuffer(d.ts_us, dtype=np.int64)
+        # candidate positions, narrowed by the cheapest filter first
+        if by_ts and d.ts_sorted:
+            a = int(np.searchsorted(ts, lo_us, "left")) if lo_us is not None else 0
+            b = int(np.searchsorted(ts, hi_us, "right")) if hi_us is not None else len(ts)
+            idx = np.arange(a, b)
+        elif after_id is not None:
+            idx = np.arange(int(np.searchsorted(ids, after_id, "right")), len(ids))
+        else:
+            idx = np.arange(len(ids))
+        mask = np.ones(len(idx), dtype=bool)
+        if lo_us is not None:
+            mask &= ts[idx] >= lo_us
+        if hi_us is not None:
+            mask &= ts[idx] <= hi_us
+        if after_id is not None:
+            mask &= ids[idx] > after_id
+        if start_t is not None or end_t is not None:
+            t = np.frombuffer(d.t, dtype=np.float64)[idx]
+            if start_t is not None:
+                mask &= t >= start_t
+            if end_t is not None:
+                mask &= t <= end_t
+        idx = idx[mask]
+        if by_ts and not d.ts_sorted:
+            idx = idx[np.argsort(ts[idx], kind="stable")]
+        return idx
+
+    def window(self, start_ts: float, end_ts: float, fields: Sequence[str] = WINDOW_FIELDS) -> Dict[str, np.ndarray]:
+        lo_us, hi_us = int(np.ceil(start_ts * 1e6)), int(np.floor(end_ts * 1e6))
+        first, last = local_day(start_ts), local_day(end_ts)
+        parts: List[Dict[str, np.ndarray]] = []
+        with self._lock:
+            for day, d in self._days.items():
+                if day < first or day > last or not len(d):
+                    continue
+                idx = self._select(d, lo_us, hi_us, None, None, None)
+                cols = {"ts_us": np.frombuffer(d.ts_us, dtype=np.int64)[idx]}
+                for name, col in zip(AXES, d.axes):
+                    if name in fields:
+                        cols[name] = np.frombuffer(col, dtype=np.int32)[idx].astype(np.int64)
+                parts.append(cols)
+        if not parts:
+            return {k: np.zeros(0, dtype=np.int64) for k in fields}
+        return {k: np.concatenate([p[k] for p in parts]) for k in fields}
+
+    def latest(self) -> dict | None:
+        with self._lock:
+            for d in reversed(list(self._days.values())):
+                if len(d):
+                    return self._rows(d, np.array([len(d) - 1]))[0]
+        return None
+
+    def days(self) -> List[Tuple[str, int | None]]:
+        with self._lock:
+            return [(day, d.id[-1] if len(d) else None) for day, d in self._days.items()]
+
+    def prune(self, before_day: str) -> int:
+        with self._lock:
+            old = [day for day in self._days if day < before_day]
+            removed = sum(len(self._days.pop(day)) for day in old)
+        return removed
+
+    def counter(self, name: str, date: str) -> int:
+        return self._counters.get((name, date), 0)
+
+    def set_counter(self, name: str, date: str, value: int) -> None:
+        with self._lock:
+            self._counters[(name, date)] = value
+
+    def counters(self, start: str, end: str, hourly: bool = False) -> List[dict]:
+        with self._lock:
+            if hourly:
+                rows = [
+                    {"name": name, "date": date, "hour": hour, "value": value}
+                    for (name, date, hour), value in self._hourly.items()
+                    if start <= date <= end
+                ]
+            else:
+                rows = [
+                    {"name": name, "date": date, "value": value}
+                    for (name, date), value in self._counters.items()
+                    if start <= date <= end
+                ]
+        return sorted(rows, key=lambda r: r["date"])
+
+    def save_user_stats(self, user: str, date: str, straight: int, slouch: int) -> None:
+        with self._lock:
+            self._user_stats[(user, date)] = (straight, slouch)
+
+    def user_stats(self, since: str) -> List[dict]:
+        with self._lock:
+            rows = [
+                {"user": user, "date": date, "straight": straight, "slouch": slouch}
+                for (user, date), (straight, slouch) in self._user_stats.items()
+                if date >= since
+            ]
+        return sorted(rows, key=lambda r: r["date"])
+
+    def get_meta(self, key: str, default: str | None = None) -> str | None:
+        return self._meta.get(key, default)
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._lock:
+            self._meta[key] = value
@@ -0,0 +1,30 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# ble_service reads its configuration at import time
+os.environ.setdefault("BLE_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="posture-tests-"), "test.db"))
+os.environ.setdefault("BLE_PERSIST_DATA", "0")
+os.environ.setdefault("BLE_INGEST_MODE", "local")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(params=["sqlite", "memory"])
+def store(request, tmp_path, monkeypatch):
+    """A fresh, persisting ble_service store of each engine."""
+    import ble_service
+
+    monkeypatch.setattr(ble_service, "PERSIST_DATA", True)
+    monkeypatch.setattr(ble_service, "DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(ble_service, "_db_conn", None)
+    monkeypatch.setattr(ble_service, "_last_id", 0)
+    monkeypatch.setattr(ble_service, "_partitions", [])
+    monkeypatch.setattr(ble_service, "_uncommitted_partitions", [])
+    engine = ble_service.ENGINES[request.param]()
+    monkeypatch.setattr(ble_service, "store", engine)
+    yield engine
+    if ble_service._db_conn is not None:
+        ble_service._db_conn.close()
@@ -0,0 +1,95 @@
+"""ble_service._run's reconnect path, driven through fake_device.FakeBleak."""
+
+import asyncio
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+
+import ble_service
+import server
+from fake_device import FakeBleak, FakeDevice
+
+
+@pytest.fixture(autouse=True)
+def fresh_state(monkeypatch):
+    monkeypatch.setattr(ble_service, "SCAN_WINDOW_S", 0.3)
+    monkeypatch.setattr(ble_service, "SCAN_BACKOFF_MIN_S", 0.05)
+    monkeypatch.setattr(ble_service, "_known_addresses", {})
+    monkeypatch.setattr(ble_service, "_disconnected_at", None)
+    monkeypatch.setattr(ble_service, "_reconnect_pending", None)
+    ble_service.reconnect_events.clear()
+    yield
+    ble_service.reconnect_events.clear()
+
+
+async def _until(cond, timeout: float = 5.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not cond():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for the BLE task")
+        await asyncio.sleep(0.01)
+
+
+def _subscribed(dev: FakeDevice):
+    return lambda: dev.is_connected and dev._notify is not None
+
+
+async def _session(scenario) -> FakeBleak:
+    """Run _run against a fake device, play `scenario(dev, backend)`, stop."""
+    dev = FakeDevice()
+    backend = FakeBleak(dev)
+    with backend.installed():
+        task = asyncio.get_running_loop().create_task(ble_service._run(dev.name))
+        try:
+            await _until(_subscribed(dev))
+            dev.send(az=10)
+            await scenario(dev, backend)
+        finally:
+            ble_service.stop()
+            await asyncio.wait_for(task, 5.0)
+    return backend
+
+
+def test_reconnects_directly_after_a_drop():
+    async def scenario(dev, backend):
+        dev.drop()
+        await _until(lambda: len(backend.connects) == 2 and _subscribed(dev)())
+
+    backend = asyncio.run(_session(scenario))
+    # found by scanning once, then straight back to the cached address
+    assert backend.scans == 1
+    assert backend.connects[0][0] == "device"
+    assert backend.connects[1] == ("address", backend.device.address)
+
+
+def test_falls_back_to_scanning_when_out_of_range():
+    async def scenario(dev, backend):
+        dev.in_range = False
+        dev.drop()
+        # the direct attempt fails, then scan windows come up empty
+        await _until(lambda: backend.scans >= 2)
+        assert not dev.is_connected
+        dev.in_range = True
+        await _until(_subscribed(dev))
+
+    backend = asyncio.run(_session(scenario))
+    assert ("address", backend.device.address) in backend.connects
+    assert backend.connects[-1][0] == "device"
+
+
+def test_reconnect_event_is_reported():
+    async def scenario(dev, backend):
+        await asyncio.sleep(0.05)
+        dev.drop()
+        await _until(lambda: len(backend.connects) == 2 and _subscribed(dev)())
+        dev.send(az=10)
+
+    asyncio.run(_session(scenario))
+    stats = TestClient(server.app).get("/ble/reconnects").json()
+    assert stats["count"] == 1
+    event = stats["events"][0]
+    assert event["method"] == "direct"
+    assert event["latency_s"] >= 0
+    assert event["gap_s"] >= 0.05
+    assert stats["latency_s"]["max"] == event["latency_s"]
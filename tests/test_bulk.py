@@ -0,0 +1,88 @@
+"""Bulk uploads (ble_service.ingest_bulk) next to live samples."""
+
+import time
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+import archive
+import ble_service
+import packets
+import server
+
+
+def _live(n: int, start: float) -> None:
+    """Store `n` samples the way the spool writer does, 20 ms apart."""
+    ble_service.store.append([(int((start + i * 0.02) * 1e6), i * 0.02, 0, 0, 10, 0, 0, 0) for i in range(n)])
+
+
+def _bulk(n: int, start: float) -> dict:
+    ts_us = int(start * 1e6) + np.arange(n, dtype=np.int64) * 20_000
+    vals = np.zeros((n, 6), dtype=np.int16)
+    vals[:, 2] = 10
+    return ble_service.ingest_bulk(ts_us, vals)
+
+
+def _reopen() -> None:
+    """What a restart does to the SQLite engine's module state."""
+    ble_service._db_conn.close()
+    ble_service._db_conn = None
+    ble_service._last_id = 0
+    ble_service._partitions.clear()
+    ble_service._open_db()
+
+
+def test_ids_are_not_reused_after_a_restart(store):
+    now = time.time()
+    _live(50, now - 60)
+    assert _bulk(200, now - 2 * 86400)["stored"] == 200
+    if store.name == "sqlite":
+        _reopen()
+    _live(1, now - 30)
+    ids = [r["id"] for r in store.scan(limit=None)]
+    assert len(ids) == len(set(ids)) == 251
+    assert max(ids) == 251
+
+
+def test_sync_pages_in_id_order_across_bulk_days(store):
+    client = TestClient(server.app)
+    now = time.time()
+    _live(50, now - 120)
+    first = client.get("/sync", params={"since_id": 0, "limit": 100}).json()
+    assert first["samples"]["id"] == list(range(1, 51)) and not first["more"]
+
+    # live rows arrive, then an upload fills an older day with higher ids
+    _live(30, now - 60)
+    _bulk(200, now - 2 * 86400)
+    seen, token = [], first["token"]
+    while True:
+        page = client.get("/sync", params={"token": token, "limit": 100}).json()
+        seen += page["samples"]["id"]
+        token = page["token"]
+        if not page["more"]:
+            break
+    assert seen == list(range(51, 281))
+
+
+@pytest.mark.parametrize("store", ["sqlite"], indirect=True)
+def test_uploads_to_archived_days(store, tmp_path, monkeypatch):
+    monkeypatch.setattr(archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    day_ago = time.time() - 2 * 86400
+    day = time.strftime("%Y-%m-%d", time.localtime(day_ago))
+    _live(50, day_ago)
+    archive.archive_closed_days(ble_service.DB_PATH)
+    assert archive.load_day(day)["id"].size == 50
+
+    # still in the DB: the upload goes in and the next run archives the day again
+    assert _bulk(100, day_ago + 60)["stored"] == 100
+    archive.archive_closed_days(ble_service.DB_PATH, drop=True)
+    assert archive.load_day(day)["id"].size == 150
+    assert day not in ble_service._partitions
+
+    # dropped: refused, nothing recreated
+    with pytest.raises(ble_service.ArchivedDay):
+        _bulk(100, day_ago + 120)
+    assert day not in ble_service._partitions
+    body = packets.encode_bulk(int((day_ago + 120) * 1e6), 1000, np.arange(10) * 20, np.zeros((10, 6), dtype=np.int16))
+    assert TestClient(server.app).post("/ingest/bulk", content=body).status_code == 409
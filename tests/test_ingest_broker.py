@@ -0,0 +1,34 @@
+"""Remote ingest mode: a web worker mirroring ingest.py's broker."""
+
+import asyncio
+
+import ble_service
+import ingest
+
+
+def test_hello_sets_last_sample_without_republishing(monkeypatch):
+    current = {"t": 1.0, "ts": 1e9 + 1.0, "ax": 0, "ay": 0, "az": 10, "gx": 0, "gy": 0, "gz": 0}
+    fresh = dict(current, t=1.2, ts=1e9 + 1.2)
+
+    async def scenario():
+        server = await asyncio.start_server(ingest._serve_client, "127.0.0.1", 0)
+        monkeypatch.setattr(ble_service, "broker_address", lambda: server.sockets[0].getsockname()[:2])
+        monkeypatch.setattr(ble_service, "last_sample", current)
+        q = await ble_service.register_listener()
+        task = asyncio.get_running_loop().create_task(ble_service._subscribe())
+        try:
+            while not ingest._subscribers:
+                await asyncio.sleep(0.01)
+            monkeypatch.setattr(ble_service, "last_sample", None)
+            ingest._broadcast(ingest._state(fresh))
+            # the hello came first: if it were fanned out, it would be queued ahead
+            got = await asyncio.wait_for(q.get(), 5.0)
+            assert got == fresh and q.empty()
+        finally:
+            ble_service._stop_event.set()
+            task.cancel()
+            await ble_service.unregister_listener(q)
+            server.close()
+
+    asyncio.run(scenario())
+    assert ble_service.last_sample == fresh
@@ -0,0 +1,70 @@
+"""rescore.py against the live and bulk write paths."""
+
+import time
+
+import numpy as np
+import pytest
+
+import ble_service
+import detectors
+import rescore
+
+
+def _expected(detector_name: str) -> dict:
+    """Hourly [freq, slouch, straight] from one pass over every row in time order."""
+    rows = sorted(ble_service.store.scan(limit=None), key=lambda r: (r["ts_us"], r["id"]))
+    det = detectors.get_detector(detector_name)
+    out: dict = {}
+    last_t = None
+    for r in rows:
+        if last_t is not None and r["t"] < last_t:
+            det.reset()
+        last_t = r["t"]
+        before = det.slouching
+        res = det.detect({k: np.array([float(r[k])]) for k in detectors.AXES})
+        key = time.strftime("%Y-%m-%d %H", time.localtime(r["ts_us"] / 1e6))
+        acc = out.setdefault(key, [0, 0, 0])
+        acc[0] += int(res.state[0] and not before)
+        acc[1] += int(res.over[0])
+        acc[2] += int(not res.over[0])
+    return out
+
+
+@pytest.mark.parametrize("store", ["sqlite"], indirect=True)
+@pytest.mark.parametrize("chunk_size", [97, 1_000_000])
+def test_rescore_scores_bulk_rows_in_time_order(store, chunk_size):
+    base = time.time() - 2 * 86400
+    az = np.where(np.arange(600) % 150 < 60, 90, 5)
+    # live rows first, then an upload of the hour before them: higher ids, earlier times
+    store.append([(int((base + i * 0.02) * 1e6), i * 0.02, 0, 0, int(az[i]), 0, 0, 0) for i in range(600)])
+    vals = np.zeros((600, 6), dtype=np.int16)
+    vals[:, 2] = az[::-1]
+    ble_service.ingest_bulk(int((base - 3600) * 1e6) + np.arange(600, dtype=np.int64) * 20_000, vals)
+
+    totals = rescore.rescore(ble_service.DB_PATH, ble_service.DEFAULT_DETECTOR, chunk_size=chunk_size, workers=2)
+    assert totals == _expected(ble_service.DEFAULT_DETECTOR)
+
+
+@pytest.mark.parametrize("store", ["sqlite"], indirect=True)
+def test_rescore_covers_samples_stored_while_it_ran(store, monkeypatch):
+    base = time.time() - 2 * 86400
+    az = np.where(np.arange(600) % 150 < 60, 90, 5)
+    store.append([(int((base + i * 0.02) * 1e6), i * 0.02, 0, 0, int(az[i]), 0, 0, 0) for i in range(600)])
+
+    # the first run scores its chunks and dies before writing counters
+    def crash(conn, totals):
+        raise KeyboardInterrupt
+
+    with monkeypatch.context() as m, pytest.raises(KeyboardInterrupt):
+        m.setattr(rescore, "_write_counters", crash)
+        rescore.rescore(ble_service.DB_PATH, ble_service.DEFAULT_DETECTOR, chunk_size=97, workers=2)
+
+    # meanwhile: an upload into the middle of that day, and live samples today
+    vals = np.zeros((300, 6), dtype=np.int16)
+    vals[:, 2] = az[:300]
+    ble_service.ingest_bulk(int((base - 30) * 1e6) + np.arange(300, dtype=np.int64) * 20_000, vals)
+    now = time.time() - 60
+    store.append([(int((now + i * 0.02) * 1e6), i * 0.02, 0, 0, int(az[i]), 0, 0, 0) for i in range(200)])
+
+    totals = rescore.rescore(ble_service.DB_PATH, ble_service.DEFAULT_DETECTOR, chunk_size=97, workers=2)
+    assert totals == _expected(ble_service.DEFAULT_DETECTOR)
@@ -0,0 +1,122 @@
+"""Opt-in tracing of samples through the ingest pipeline.
+
+When enabled (BLE_TRACE_RATE, or set_rate() / POST /debug/trace), that
+fraction of BLE notifications is timestamped at each stage and the time
+spent per stage is kept over a recent window:
+
+- decode:  notification received -> samples decoded
+- detect:  slouch detection and posture scores for the batch
+- spool:   per-sample alerts check and spool append
+- fanout:  handing the samples to the live listener queues
+- send:    listener queue -> WebSocket send done (once per connected client)
+
+Those follow each other, so they add up to the end-to-end latency of a
+live sample. Persistence happens off that path in the spool writer thread:
+
+- persist: spool append -> the SQLite commit that contains the sample
+
+A trace follows the last sample of its notification. With tracing off the
+cost is one float comparison per notification.
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List
+
+STAGES = ("decode", "detect", "spool", "fanout", "send", "persist")
+
+RATE = float(os.environ.get("BLE_TRACE_RATE", "0"))
+
+_durations_ms: Dict[str, deque] = {stage: deque(maxlen=1000) for stage in STAGES}
+# traced samples waiting for their WebSocket sends, by id(sample); the
+# sample is kept alive so its id isn't reused meanwhile
+_fanned_out: "OrderedDict[int, tuple[dict, int]]" = OrderedDict()
+_FANNED_OUT_MAX = 256
+# (spool generation, spool end position, append time) of traced batches
+# waiting for the spool writer's commit
+_spooled: deque = deque(maxlen=1000)
+
+
+def set_rate(rate: float) -> None:
+    """Trace this fraction (0..1) of notifications; 0 turns tracing off."""
+    global RATE
+    RATE = min(1.0, max(0.0, rate))
+
+
+def reset() -> None:
+    for values in _durations_ms.values():
+        values.clear()
+    _fanned_out.clear()
+    _spooled.clear()
+
+
+def sampled() -> bool:
+    return RATE > 0 and random.random() < RATE
+
+
+def _record(stage: str, ns: int) -> None:
+    _durations_ms[stage].append(ns / 1e6)
+
+
+class Trace:
+    """Stage timestamps of one traced notification."""
+
+    __slots__ = ("last_ns",)
+
+    def __init__(self, received_ns: int) -> None:
+        self.last_ns = received_ns
+
+    def mark(self, stage: str) -> int:
+        """Close `stage` now; returns the timestamp."""
+        now = time.perf_counter_ns()
+        _record(stage, now - self.last_ns)
+        self.last_ns = now
+        return now
+
+    def spooled(self, generation: int, end_pos: int) -> None:
+        """The batch is in the spool up to `end_pos`; persist ends at its commit."""
+        _spooled.append((generation, end_pos, self.mark("spool")))
+
+    def fanned_out(self, sample: dict) -> None:
+        _fanned_out[id(sample)] = (sample, self.mark("fanout"))
+        while len(_fanned_out) > _FANNED_OUT_MAX:
+            _fanned_out.popitem(last=False)
+
+
+def sent(sample: dict) -> None:
+    """A WebSocket client has sent `sample`."""
+    entry = _fanned_out.get(id(sample))
+    if entry is not None and entry[0] is sample:
+        _record("send", time.perf_counter_ns() - entry[1])
+
+
+def committed(generation: int, pos: int) -> None:
+    """The spool writer committed everything before `pos`."""
+    now = time.perf_counter_ns()
+    while _spooled:
+        gen, end, appended_ns = _spooled[0]
+        if gen == generation and end > pos:
+            break
+        _spooled.popleft()
+        if gen == generation:
+            _record("persist", now - appended_ns)
+
+
+def stats() -> Dict[str, Any]:
+    """Per-stage count and p50/p99/max milliseconds over the recent window."""
+    out: Dict[str, Any] = {"rate": RATE, "stages": {}}
+    for stage in STAGES:
+        data: List[float] = sorted(_durations_ms[stage])
+        if not data:
+            out["stages"][stage] = {"count": 0}
+            continue
+
+        def pct(p: float) -> float:
+            return round(data[min(len(data) - 1, int(p / 100.0 * len(data)))], 3)
+
+        out["stages"][stage] = {"count": len(data), "p50_ms": pct(50), "p99_ms": pct(99), "max_ms": round(data[-1], 3)}
+    return out